@@ -0,0 +1,233 @@
+# --- Process Bootstrap ---
+# One-time setup (sqlite driver for ChromaDB, .env, warm caches); see utils/bootstrap.py.
+from utils.bootstrap import bootstrap, get_bootstrap_status
+bootstrap()
+
+import os
+import time
+import asyncio
+import hashlib
+import datetime
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+from utils.gemini import (
+    generate_response, configure_gemini_headless, QUOTA_ERROR_TEXT, MODEL_UNAVAILABLE_TEXT, MODEL_ERROR_TEXT
+)
+from utils.gemini_async import get_key_limiter, DEFAULT_TIMEOUT_SECONDS
+from utils.rag import get_rag_chain, query_rag, federated_search, list_indexed_contexts
+from utils.pricing import describe_lines
+from utils.answer_cache import get_answer_cache
+from modules import job_summary, invoice_generator, contract_creator, knowledge_search
+
+# --- Headless HTTP API ---
+# JSON endpoints for the AI tools, for programmatic callers (e.g. the dispatch system) that
+# can't drive the Streamlit forms. The endpoints reuse the tools' prompt builders
+# (modules/*: build_*_prompt), the local invoice pricing engine (utils/pricing.py) and the
+# process-wide caches, chains and client pools in utils/.
+# Blocking LLM/RAG calls run in worker threads under the per-API-key limiter of utils/gemini_async.py.
+#
+# Run from the project root:
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 1
+# Limits: at most API_MAX_CONCURRENT_REQUESTS requests are processed at once; a request that waits
+# longer than API_QUEUE_TIMEOUT_SECONDS for a slot gets HTTP 503 (retry later).
+# API_LLM_BACKEND=fake answers with a local fake LLM (fixed latency, no API key) for load tests;
+# see benchmarks/load_test_api.py. The fake backend does not cover endpoints that need embeddings
+# (search, contract), and its answers are not valid invoice price estimates (those items stay unpriced).
+API_MAX_CONCURRENT_REQUESTS = int(os.getenv("API_MAX_CONCURRENT_REQUESTS", "32"))
+API_QUEUE_TIMEOUT_SECONDS = float(os.getenv("API_QUEUE_TIMEOUT_SECONDS", "5"))
+API_LLM_BACKEND = os.getenv("API_LLM_BACKEND", "gemini") # "gemini" or "fake"
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+
+# Fallback texts returned by utils.gemini.generate_response -> HTTP status
+LLM_ERROR_STATUS = {
+    QUOTA_ERROR_TEXT: 429,
+    MODEL_UNAVAILABLE_TEXT: 503,
+    MODEL_ERROR_TEXT: 502,
+}
+
+# --- Concurrency Limit ---
+_request_slots = None
+_stats = {"requests": 0, "rejected": 0, "in_flight": 0}
+
+class RequestSlot:
+    """Holds one of the API_MAX_CONCURRENT_REQUESTS slots; raises HTTP 503 if none frees up in time."""
+
+    async def __aenter__(self):
+        global _request_slots
+        if _request_slots is None:
+            _request_slots = asyncio.Semaphore(API_MAX_CONCURRENT_REQUESTS)
+        try:
+            await asyncio.wait_for(_request_slots.acquire(), timeout=API_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            _stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Server busy, retry later.", headers={"Retry-After": "1"})
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _stats["in_flight"] -= 1
+        _request_slots.release()
+
+# --- LLM / RAG Calls ---
+async def fake_llm(prompt):
+    """Local stand-in for Gemini: fixed latency, deterministic text derived from the prompt."""
+    await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+    return f"[fake-llm {digest}] Generated {len(prompt)}-character prompt response."
+
+async def complete(prompt, temperature, use_cache=False):
+    """Runs one LLM call (bounded per API key, with a timeout); raises HTTPException on failure."""
+    if API_LLM_BACKEND == "fake":
+        return await fake_llm(prompt)
+    try:
+        # The slot stays held until the worker thread finishes, even after a timeout (see utils/gemini_async.py)
+        text = await get_key_limiter().run(generate_response, prompt, use_cache=use_cache, temperature=temperature,
+                                           timeout=DEFAULT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The AI model took too long to respond.")
+    if text in LLM_ERROR_STATUS:
+        raise HTTPException(status_code=LLM_ERROR_STATUS[text], detail=text)
+    return text
+
+async def run_blocking(fn, *args):
+    """Runs a blocking RAG call in a worker thread under the per-API-key limiter."""
+    try:
+        return await get_key_limiter().run(fn, *args, timeout=DEFAULT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The knowledge base search took too long.")
+
+def describe_sources(docs):
+    """JSON-friendly source references for retrieved documents."""
+    return [{
+        "source": os.path.basename(doc.metadata.get("source", "")),
+        "page": doc.metadata.get("page"),
+        "rag_context": doc.metadata.get("rag_context"),
+        "snippet": doc.page_content[:500],
+    } for doc in docs]
+
+def split_lines(value):
+    return value if isinstance(value, list) else [line.strip() for line in value.splitlines() if line.strip()]
+
+# --- Request / Response Models ---
+class JobSummaryRequest(BaseModel):
+    notes: str = Field(min_length=1)
+    style: str = "Standard Invoice Summary"
+    use_cache: bool = False
+
+class InvoiceRequest(BaseModel):
+    customer_name: str = Field(min_length=1)
+    customer_address: str = ""
+    line_items: Union[List[str], str]
+    notes: str = ""
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[datetime.date] = None
+    job_date: Optional[datetime.date] = None
+    estimate_unmatched: bool = True # Ask the LLM to price items that match no standard rate
+
+class ContractRequest(BaseModel):
+    customer_name: str = Field(min_length=1)
+    customer_address: str = ""
+    service_plan: str = contract_creator.SERVICE_PLANS[0]
+    equipment: Union[List[str], str]
+    start_date: Optional[datetime.date] = None
+    contract_price: float = Field(ge=0)
+
+class SearchRequest(BaseModel):
+    query: str = Field(min_length=1)
+    rag_id: str = knowledge_search.RAG_ID
+    all_contexts: bool = False
+    k: int = Field(default=6, ge=1, le=20)
+
+# --- App ---
+@asynccontextmanager
+async def lifespan(app):
+    if API_LLM_BACKEND != "fake":
+        configure_gemini_headless()
+    print(f"API ready (LLM backend: {API_LLM_BACKEND}, max concurrent requests: {API_MAX_CONCURRENT_REQUESTS})")
+    yield
+
+app = FastAPI(title="AC Repair AI Portal API", version="1.0", lifespan=lifespan)
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "llm_backend": API_LLM_BACKEND, "bootstrap": get_bootstrap_status(),
+            "answer_cache": get_answer_cache().stats(), **_stats}
+
+# --- Endpoints ---
+@app.post("/v1/job-summary")
+async def create_job_summary(request: JobSummaryRequest):
+    async with RequestSlot():
+        start = time.perf_counter()
+        try:
+            prompt = job_summary.build_job_summary_prompt(request.notes, request.style)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        summary = await complete(prompt, job_summary.SUMMARY_TEMPERATURE, use_cache=request.use_cache)
+        return {"style": request.style, "summary": summary, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+@app.post("/v1/invoice")
+async def create_invoice(request: InvoiceRequest):
+    async with RequestSlot():
+        start = time.perf_counter()
+        today = datetime.date.today()
+        line_items = split_lines(request.line_items)
+        if not line_items:
+            raise HTTPException(status_code=422, detail="At least one line item is required.")
+        # Priced and rendered locally (same steps as invoice_generator.build_invoice); the LLM is only
+        # called (once) if some items match no standard rate
+        lines, estimate_prompt = invoice_generator.price_invoice_items(line_items)
+        estimate_text = None
+        if estimate_prompt and request.estimate_unmatched:
+            estimate_text = await complete(estimate_prompt, invoice_generator.ESTIMATE_TEMPERATURE)
+        invoice, totals = invoice_generator.finish_invoice(
+            request.invoice_number or f"INV-{today.year}-1001", request.invoice_date or today, request.customer_name,
+            request.customer_address, request.job_date or today, lines, request.notes, estimate_text
+        )
+        return {"invoice": invoice, "lines": describe_lines(lines),
+                "subtotal": str(totals["subtotal"]), "tax": str(totals["tax"]), "total": str(totals["total"]),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+@app.post("/v1/contract")
+async def create_contract(request: ContractRequest):
+    async with RequestSlot():
+        start = time.perf_counter()
+        if request.service_plan not in contract_creator.SERVICE_PLANS:
+            raise HTTPException(status_code=422, detail=f"Unknown service plan. Use one of: {', '.join(contract_creator.SERVICE_PLANS)}.")
+        qa_chain = await asyncio.to_thread(get_rag_chain, contract_creator.RAG_ID)
+        if not qa_chain:
+            raise HTTPException(status_code=503, detail=f"The '{contract_creator.RAG_ID}' knowledge base is not indexed.")
+        template_text, sources = await run_blocking(query_rag, qa_chain, contract_creator.build_template_query(request.service_plan))
+        if not contract_creator.is_valid_template(template_text, sources):
+            raise HTTPException(status_code=502, detail=f"No valid contract template found for '{request.service_plan}'.")
+        prompt = contract_creator.build_contract_prompt(
+            template_text, request.customer_name, request.customer_address, "\n".join(split_lines(request.equipment)),
+            request.start_date or datetime.date.today(), request.contract_price
+        )
+        contract = await complete(prompt, contract_creator.CONTRACT_TEMPERATURE)
+        return {"contract": contract, "sources": describe_sources(sources),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+@app.post("/v1/search")
+async def search(request: SearchRequest):
+    async with RequestSlot():
+        start = time.perf_counter()
+        if request.all_contexts:
+            results = await run_blocking(federated_search, request.query, request.k)
+            if not results:
+                raise HTTPException(status_code=404, detail="No relevant documents were found in any knowledge base.")
+            answer = await complete(knowledge_search.build_federated_prompt(request.query, results),
+                                    knowledge_search.FEDERATED_TEMPERATURE)
+            source_docs = [doc for doc, _ in results]
+        else:
+            # Only open contexts that are already indexed: rag_id ends up in store paths and keys the chain registry
+            if request.rag_id not in await asyncio.to_thread(list_indexed_contexts):
+                raise HTTPException(status_code=422, detail=f"Unknown knowledge base '{request.rag_id}'.")
+            qa_chain = await asyncio.to_thread(get_rag_chain, request.rag_id)
+            if not qa_chain:
+                raise HTTPException(status_code=503, detail=f"The '{request.rag_id}' knowledge base is not indexed.")
+            answer, source_docs = await run_blocking(query_rag, qa_chain, request.query)
+        return {"answer": answer, "sources": describe_sources(source_docs),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
@@ -1,11 +1,7 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
+# --- Process Bootstrap ---
+# One-time setup (sqlite driver for ChromaDB, .env, warm caches); see utils/bootstrap.py.
+from utils.bootstrap import bootstrap
+bootstrap()
 
 # Now you can import your other libraries
 import streamlit as st
@@ -13,21 +9,42 @@ import streamlit as st
 # REMOVED: from langchain.vectorstores import Chroma
 from utils.auth import show_login_form, logout_user, is_authenticated
 from utils.gemini import configure_gemini
-# Import all modules from the 'modules' package
-from modules import (
-    technician_assistant,
-    customer_chatbot,
-    job_summary,
-    predictive_maintenance,
-    scheduling_optimizer,
-    inventory_management,
-    knowledge_search,
-    invoice_generator,       # New
-    contract_creator,        # New
-    rag_manager
-)
+import importlib
 import os # To help construct paths if needed
 
+# --- Module Registry ---
+# Tool modules are imported on first selection, not at startup: the RAG tools pull in LangChain,
+# Chroma and pypdf (via utils.rag), which the login form and non-RAG tools never need.
+# Python caches imported modules (sys.modules), so each module is imported once per process.
+# Entries: title -> (module path, page function, uses RAG, admin only).
+# Profile import cost with `python benchmarks/profile_imports.py`.
+MODULE_REGISTRY = {
+    "Customer Chatbot": ("modules.customer_chatbot", "show_customer_chatbot", False, False),
+    "Technician Assistant": ("modules.technician_assistant", "show_technician_assistant", True, False),
+    "Job Summary Generator": ("modules.job_summary", "show_job_summary", False, False),
+    "Predictive Maintenance": ("modules.predictive_maintenance", "show_predictive_maintenance", False, False),
+    "Scheduling Assistant": ("modules.scheduling_optimizer", "show_scheduling_optimizer", False, False),
+    "Inventory Assistant": ("modules.inventory_management", "show_inventory_management", True, False),
+    "Invoice Generator": ("modules.invoice_generator", "show_invoice_generator", True, False),
+    "Contract Creator": ("modules.contract_creator", "show_contract_creator", True, False),
+    "Knowledge Base Search": ("modules.knowledge_search", "show_knowledge_search", True, False),
+    "Manage Knowledge Base": ("modules.rag_manager", "show_rag_manager", True, True),
+}
+
+def load_module(title):
+    """Imports a tool's module on first use and returns it (None if it fails to import)."""
+    module_path, _, uses_rag, _ = MODULE_REGISTRY[title]
+    try:
+        module = importlib.import_module(module_path)
+    except Exception as e:
+        st.error(f"Could not load the '{title}' tool: {e}")
+        return None
+    if uses_rag:
+        # utils.rag is imported by now; pre-embed frequent search queries (background, once per process)
+        from utils.rag import start_query_cache_warmup
+        start_query_cache_warmup()
+    return module
+
 # --- Page Configuration (Set first) ---
 st.set_page_config(
     page_title="AC Repair AI Portal",
@@ -58,28 +75,14 @@ def display_app():
     # --- Module Selection ---
     st.sidebar.header("Assistant Tools")
 
-    # Define ALL modules and their corresponding functions
-    all_modules = {
-        "Customer Chatbot": customer_chatbot.show_customer_chatbot,
-        "Technician Assistant": technician_assistant.show_technician_assistant,
-        "Job Summary Generator": job_summary.show_job_summary,
-        "Predictive Maintenance": predictive_maintenance.show_predictive_maintenance,
-        "Scheduling Assistant": scheduling_optimizer.show_scheduling_optimizer,
-        "Inventory Assistant": inventory_management.show_inventory_management,
-        "Invoice Generator": invoice_generator.show_invoice_generator,          # New
-        "Contract Creator": contract_creator.show_contract_creator,            # New
-        "Knowledge Base Search": knowledge_search.show_knowledge_search,
-        "Manage Knowledge Base": rag_manager.show_rag_manager,
-    }
-
     # Create a list of modules that the current user can click on.
     # We check if the username is 'admin'.
     is_admin = st.session_state.get('username') == 'admin'
-    enabled_module_keys = list(all_modules.keys())
+    enabled_module_keys = list(MODULE_REGISTRY.keys())
 
     if not is_admin:
-        # If the user is NOT an admin, remove the management tool from the clickable list.
-        enabled_module_keys.remove("Manage Knowledge Base")
+        # If the user is NOT an admin, remove the admin-only tools from the clickable list.
+        enabled_module_keys = [title for title in enabled_module_keys if not MODULE_REGISTRY[title][3]]
 
     # Create the radio button group ONLY with the enabled modules for the current user.
     selected_module_title = st.sidebar.radio(
@@ -103,14 +106,15 @@ def display_app():
         logout_user()
 
     # --- Display Selected Module in Main Area ---
-    # Find the function associated with the selected title from the 'all_modules' dictionary
-    module_function = all_modules.get(selected_module_title)
+    # Import the selected tool's module (first use only) and find its page function
+    module = load_module(selected_module_title) if selected_module_title in MODULE_REGISTRY else None
+    module_function = getattr(module, MODULE_REGISTRY[selected_module_title][1], None) if module else None
 
     if module_function:
         # Display the title of the selected module in the main area
         module_icon = ""
         try:
-            mod_title = getattr(module_function.__module__, 'MODULE_TITLE', selected_module_title)
+            mod_title = getattr(module, 'MODULE_TITLE', selected_module_title)
             if " " in mod_title:
                  icon_part = mod_title.split(" ")[0]
                  if len(icon_part) <= 2 and not icon_part.isalnum():
@@ -0,0 +1,95 @@
+# --- Micro-benchmark: client pool vs. fresh clients ---
+# Measures the per-call overhead of building a Gemini model object (and the LangChain chat /
+# embedding clients) on every call versus reusing them from the process-level pool in utils/gemini.py.
+# No network is used: generate_content is answered by a local stub transport.
+#
+# Run from the project root:
+#   python benchmarks/bench_client_pool.py [--calls 2000]
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "stub-key-for-benchmark")
+os.environ.setdefault("GOOGLE_API_KEY", os.environ["GEMINI_API_KEY"])
+
+import google.generativeai as genai
+from utils import gemini
+
+class _StubPart:
+    text = "Stub response."
+
+class _StubCandidate:
+    finish_reason = None
+
+class _StubResponse:
+    parts = [_StubPart()]
+    candidates = [_StubCandidate()]
+    prompt_feedback = None
+
+def stub_generate_content(self, *args, **kwargs):
+    """Local stub transport: returns a canned response without leaving the process."""
+    return _StubResponse()
+
+def time_calls(fn, calls):
+    """Returns per-call latencies in microseconds."""
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def report(label, samples):
+    print(f"{label:<42} mean {statistics.mean(samples):9.1f} us   p50 {statistics.median(samples):9.1f} us   "
+          f"p95 {sorted(samples)[int(len(samples) * 0.95) - 1]:9.1f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--model", default="gemini-1.5-flash")
+    args = parser.parse_args()
+
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    gemini._process_configured = True
+    genai.GenerativeModel.generate_content = stub_generate_content
+    settings = genai.types.GenerationConfig(**gemini.get_generation_settings())
+
+    def fresh_call():
+        genai.GenerativeModel(args.model).generate_content("ping", generation_config=settings)
+
+    def pooled_call():
+        gemini.get_pooled_client("generative_model", genai.GenerativeModel, model_name=args.model) \
+            .generate_content("ping", generation_config=settings)
+
+    print(f"Gemini model object, {args.calls} calls (stub transport)")
+    fresh = time_calls(fresh_call, args.calls)
+    gemini.clear_client_pool()
+    pooled = time_calls(pooled_call, args.calls)
+    report("fresh GenerativeModel per call", fresh)
+    report("pooled GenerativeModel", pooled)
+    print(f"  -> saved {statistics.mean(fresh) - statistics.mean(pooled):.1f} us per call\n")
+
+    # LangChain clients build their own gRPC client on construction, so they dominate RAG setup cost
+    try:
+        from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+    except ImportError:
+        print("langchain_google_genai not installed; skipping LangChain client benchmark.")
+        return
+    lc_calls = max(1, args.calls // 20)
+    for kind, factory, config in (
+        ("chat_model", ChatGoogleGenerativeAI, {"model": args.model, "temperature": 0.1}),
+        ("embeddings", GoogleGenerativeAIEmbeddings, {"model": "models/embedding-001"}),
+    ):
+        print(f"LangChain {factory.__name__}, {lc_calls} constructions")
+        fresh = time_calls(lambda: factory(**config), lc_calls)
+        gemini.clear_client_pool()
+        pooled = time_calls(lambda: gemini.get_pooled_client(kind, factory, **config), lc_calls)
+        report(f"fresh {factory.__name__}", fresh)
+        report(f"pooled {factory.__name__}", pooled)
+        print(f"  -> saved {statistics.mean(fresh) - statistics.mean(pooled):.1f} us per call\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# --- Benchmark: Chroma vs. NumPy vector backends ---
+# Compares cold-open time, resident memory and query latency of the Chroma stores shipped in
+# `vector_store/` against NumpyVectorStore copies of the same data (float32 and int8).
+# The stored embeddings are copied as-is (no embedding API calls), and query vectors are sampled
+# from the stored embeddings plus noise. Each backend runs in a fresh subprocess so import cost,
+# open time and memory are measured cold. Top-k agreement is reported against exact float32 search.
+#
+# Run from the project root:
+#   python benchmarks/bench_vector_backends.py [--rag-id tech_manuals] [--queries 200] [--k 4]
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import statistics
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+BACKENDS = ("chroma", "numpy", "numpy_int8")
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux /proc, falling back to peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# --- Worker (runs in a subprocess) ---
+def run_worker(backend, store_path, queries_path, k):
+    rss_start = current_rss_mb()
+    start = time.perf_counter()
+    if backend == "chroma":
+        from utils.bootstrap import ensure_sqlite
+        ensure_sqlite()
+        from langchain_chroma import Chroma
+        import_s = time.perf_counter() - start
+        start = time.perf_counter()
+        store = Chroma(persist_directory=store_path)
+    else:
+        from utils.numpy_store import NumpyVectorStore
+        import_s = time.perf_counter() - start
+        start = time.perf_counter()
+        store = NumpyVectorStore(store_path)
+    open_s = time.perf_counter() - start
+
+    queries = np.load(queries_path)
+    start = time.perf_counter()
+    store.similarity_search_by_vector_with_relevance_scores(queries[0].tolist(), k=k)
+    first_query_s = time.perf_counter() - start
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([doc.page_content for doc, _ in hits])
+
+    batch_ms = None
+    if backend != "chroma":
+        start = time.perf_counter()
+        store.batch_search_by_vector(queries, k=k)
+        batch_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "import_s": import_s, "open_s": open_s, "first_query_s": first_query_s,
+        "rss_mb": current_rss_mb() - rss_start,
+        "p50_ms": statistics.median(latencies), "p95_ms": sorted(latencies)[int(len(latencies) * 0.95) - 1],
+        "batch_ms": batch_ms, "results": results,
+    }))
+
+# --- Driver ---
+def export_chroma(store_path):
+    from utils.bootstrap import ensure_sqlite
+    ensure_sqlite()
+    import chromadb
+    collection = chromadb.PersistentClient(path=store_path).get_collection("langchain")
+    return collection.get(include=["embeddings", "documents", "metadatas"])
+
+def build_numpy_store(records, directory, quantization):
+    from utils.numpy_store import NumpyVectorStore
+    store = NumpyVectorStore(directory, quantization=quantization)
+    store.upsert_embeddings(list(records["ids"]), np.asarray(records["embeddings"]), list(records["documents"]), list(records["metadatas"]))
+
+def run_backend(backend, store_path, queries_path, k):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", backend, store_path, queries_path, "--k", str(k)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def agreement(results, reference):
+    """Mean fraction of the reference top-k found in `results` (text is used as the chunk key)."""
+    scores = [len(set(r) & set(ref)) / len(ref) for r, ref in zip(results, reference) if ref]
+    return statistics.mean(scores) if scores else 0.0
+
+def benchmark_context(rag_id, num_queries, k, workdir):
+    chroma_path = os.path.join(PROJECT_ROOT, "vector_store", f"{rag_id}_chroma")
+    records = export_chroma(chroma_path)
+    embeddings = np.asarray(records["embeddings"], dtype=np.float32)
+    if len(embeddings) == 0:
+        print(f"{rag_id}: empty store, skipped")
+        return
+
+    rng = np.random.default_rng(0)
+    queries = embeddings[rng.integers(0, len(embeddings), num_queries)]
+    queries = queries + rng.normal(scale=0.5 * float(np.abs(queries).mean()), size=queries.shape).astype(np.float32)
+    queries_path = os.path.join(workdir, f"{rag_id}_queries.npy")
+    np.save(queries_path, queries)
+
+    paths = {"chroma": chroma_path}
+    for backend, quantization in (("numpy", "none"), ("numpy_int8", "int8")):
+        paths[backend] = os.path.join(workdir, f"{rag_id}_{backend}")
+        build_numpy_store(records, paths[backend], quantization)
+
+    measured = {backend: run_backend(backend, paths[backend], queries_path, k) for backend in BACKENDS}
+    reference = measured["numpy"]["results"] # Exact search
+    print(f"\n{rag_id}: {len(embeddings)} chunks x {embeddings.shape[1]} dims, {num_queries} queries, k={k}")
+    print(f"{'backend':<12}{'import s':>10}{'open s':>10}{'1st query s':>13}{'RSS MB':>9}{'p50 ms':>9}{'p95 ms':>9}{'batch ms':>10}{'top-k agree':>13}")
+    for backend in BACKENDS:
+        m = measured[backend]
+        batch = f"{m['batch_ms']:.2f}" if m["batch_ms"] is not None else "-"
+        print(f"{backend:<12}{m['import_s']:>10.3f}{m['open_s']:>10.3f}{m['first_query_s']:>13.4f}{m['rss_mb']:>9.1f}"
+              f"{m['p50_ms']:>9.3f}{m['p95_ms']:>9.3f}{batch:>10}{agreement(m['results'], reference):>13.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Chroma and NumPy vector backends on the shipped vector stores.")
+    parser.add_argument("--rag-id", action="append", help="Context to benchmark (repeatable). Default: all shipped stores.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--worker", nargs=3, metavar=("BACKEND", "STORE_PATH", "QUERIES_PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker, k=args.k)
+        return
+
+    from utils.storage_layout import list_per_context_stores
+    rag_ids = args.rag_id or list_per_context_stores()
+    with tempfile.TemporaryDirectory() as workdir:
+        for rag_id in rag_ids:
+            benchmark_context(rag_id, args.queries, args.k, workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# --- Load test: headless HTTP API (api.py) against the local fake LLM ---
+# Starts `uvicorn api:app` with API_LLM_BACKEND=fake (no API key or network calls; each LLM call
+# sleeps FAKE_LLM_LATENCY_MS) and fires job-summary and invoice requests at a fixed client
+# concurrency. Reports throughput, latency percentiles and status codes, so the overhead of the
+# API layer and the effect of API_MAX_CONCURRENT_REQUESTS can be measured without Gemini quota.
+# Pass --url to test an already running server instead (e.g. with the real backend).
+#
+# Needs `pip install fastapi uvicorn httpx`. Run from the project root:
+#   python benchmarks/load_test_api.py [--requests 500] [--concurrency 50] [--latency-ms 300] [--max-concurrent 32]
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+from collections import Counter
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NOTES = ("Arrived 10:15 AM. AC not cooling. Filter extremely dirty, replaced. Condenser coils cleaned. "
+         "Suction pressure slightly low, added 0.5 lbs R410a. Delta T 18 degrees after service. Departed 11:30 AM.")
+PAYLOADS = [
+    ("/v1/job-summary", {"notes": NOTES, "style": "Standard Invoice Summary"}),
+    ("/v1/job-summary", {"notes": NOTES, "style": "Brief Customer Text"}),
+    ("/v1/invoice", {"customer_name": "Jane Doe", "customer_address": "123 Main St",
+                     "line_items": ["Standard Diagnostic Fee", "Replaced run capacitor", "Replaced blower motor"]}),
+]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, latency_ms, max_concurrent):
+    env = {**os.environ, "API_LLM_BACKEND": "fake", "FAKE_LLM_LATENCY_MS": str(latency_ms),
+           "API_MAX_CONCURRENT_REQUESTS": str(max_concurrent)}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env
+    )
+
+async def wait_until_ready(client, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("API server did not become ready.")
+
+async def run_load(client, total, concurrency):
+    latencies, statuses = [], Counter()
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(PAYLOADS[i % len(PAYLOADS)])
+
+    async def worker():
+        while True:
+            try:
+                path, payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                status = (await client.post(path, json=payload)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+async def main_async(args):
+    server = None
+    url = args.url
+    if not url:
+        port = free_port()
+        server = start_server(port, args.latency_ms, args.max_concurrent)
+        url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+            await wait_until_ready(client)
+            await run_load(client, min(args.concurrency, args.requests), args.concurrency) # Warm-up
+            elapsed, latencies, statuses = await run_load(client, args.requests, args.concurrency)
+            health = (await client.get("/health")).json()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    backend = f"fake LLM latency {args.latency_ms:.0f} ms, server limit {args.max_concurrent}" if server else f"server {url}"
+    print(f"{args.requests} requests, client concurrency {args.concurrency}, {backend}")
+    print(f"  throughput: {args.requests / elapsed:.1f} req/s ({elapsed:.2f}s total)")
+    print(f"  latency ms: p50 {statistics.median(latencies):.1f}  p95 {percentile(latencies, 0.95):.1f}  "
+          f"p99 {percentile(latencies, 0.99):.1f}  max {max(latencies):.1f}")
+    print(f"  status codes: {dict(statuses)}")
+    print(f"  server: {health.get('requests')} served, {health.get('rejected')} rejected (503)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the headless API against the local fake LLM.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent client connections.")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Fake LLM latency per call.")
+    parser.add_argument("--max-concurrent", type=int, default=32, help="Server API_MAX_CONCURRENT_REQUESTS.")
+    parser.add_argument("--url", help="Test a running server instead of starting one with the fake LLM.")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
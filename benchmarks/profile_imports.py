@@ -0,0 +1,92 @@
+# --- Profile: import time of the app's entry points and tool modules ---
+# Imports each target in a fresh interpreter with `python -X importtime` and reports the
+# cumulative import time of the target (everything it pulls in) plus its slowest dependencies.
+# "startup" is what app.py imports before the login form renders; each tool module is what
+# the lazy module registry imports when that tool is first selected (on top of startup).
+#
+# Run from the project root:
+#   python benchmarks/profile_imports.py [--target modules.knowledge_search] [--top 10] [--repeat 3] [--json out.json]
+# Compare --json outputs between commits to catch startup regressions.
+import os
+import sys
+import ast
+import json
+import argparse
+import statistics
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_IMPORTS = ("streamlit", "utils.auth", "utils.gemini")
+
+def default_targets():
+    """Tool modules from app.py's MODULE_REGISTRY (read with ast: importing app.py would render the page)."""
+    with open(os.path.join(PROJECT_ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "MODULE_REGISTRY" for t in node.targets):
+            return [entry[0] for entry in ast.literal_eval(node.value).values()]
+    return []
+
+def parse_importtime(stderr):
+    """Returns {module: cumulative_us} from `-X importtime` output (first occurrence wins)."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative.setdefault(name.strip(), int(cumulative_us))
+    return cumulative
+
+def profile_import(statement):
+    """Runs `statement` in a fresh interpreter; returns {module: cumulative_ms}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return {name: us / 1000 for name, us in parse_importtime(result.stderr).items()}
+
+def profile_target(target, repeat):
+    """Cumulative ms of `target` on top of the startup imports, median over `repeat` runs."""
+    preload = "; ".join(f"import {name}" for name in STARTUP_IMPORTS)
+    statement = preload if target == "startup" else f"{preload}; import {target}"
+    runs = [profile_import(statement) for _ in range(repeat)]
+    names = set().union(*runs)
+    timings = {name: statistics.median(run.get(name, 0.0) for run in runs) for name in names}
+    top_level = STARTUP_IMPORTS if target == "startup" else (target,)
+    total = sum(timings.get(name, 0.0) for name in top_level)
+    return total, timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-module cumulative import time for the app.")
+    parser.add_argument("--target", action="append", help="Module to profile (repeatable). Default: startup + every tool module.")
+    parser.add_argument("--top", type=int, default=8, help="Slowest dependencies to list per target.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    targets = args.target or ["startup"] + default_targets()
+    report = {}
+    print(f"{'target':<36}{'cumulative ms':>15}")
+    for target in targets:
+        try:
+            total, timings = profile_target(target, args.repeat)
+        except RuntimeError as e:
+            print(f"{target:<36}{'failed':>15}  ({e})")
+            continue
+        report[target] = {"cumulative_ms": round(total, 1),
+                          "modules": {name: round(ms, 1) for name, ms in timings.items()}}
+        print(f"{target:<36}{total:>15.1f}")
+        slowest = sorted(((ms, name) for name, ms in timings.items() if name != target), reverse=True)[:args.top]
+        for ms, name in slowest:
+            print(f"    {name:<44}{ms:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
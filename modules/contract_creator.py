@@ -1,30 +1,56 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
 import streamlit as st
-from utils.gemini import generate_response
-from utils.rag import setup_rag_chain, query_rag, BASE_DOC_DIR
+from utils.gemini import generate_response_stream, render_stream, is_interrupted_response
+from utils.rag import get_rag_chain, query_rag, BASE_DOC_DIR
 import os
 import datetime
 
 MODULE_TITLE = "📄 Contract Creator"
 RAG_ID = "contract_templates"
 
+# --- Prompt Building (no Streamlit; also used by api.py) ---
+SERVICE_PLANS = ("Basic Annual Plan", "Premium Semi-Annual Plan")
+CONTRACT_TEMPERATURE = 0.0 # Use 0 temp for precise replacement
+
+def build_template_query(service_plan):
+    """RAG query that retrieves the full template text for a service plan."""
+    return f"Retrieve the complete and unmodified text for the '{service_plan} Template'. Include everything from 'START OF' to 'END OF' the template."
+
+def is_valid_template(template_text, sources):
+    """A template answer is usable if it is not an error fallback and came from retrieved documents."""
+    return "Error" not in template_text and bool(sources)
+
+def build_contract_prompt(template_text, customer_name, customer_address, equipment_list, start_date,
+                          contract_price, current_date=None):
+    """Builds the prompt that fills a contract template; dates are datetime.date objects."""
+    return f"""
+    You are a legal document assistant. Your task is to populate a contract template with specific customer information.
+    Do not alter the legal language of the template. Only replace the placeholder values.
+
+    **Contract Template to Use:**
+    ---
+    {template_text}
+    ---
+
+    **Data to Insert:**
+    - [CUSTOMER_NAME]: {customer_name}
+    - [CUSTOMER_ADDRESS]: {customer_address}
+    - [EQUIPMENT_LIST]: {equipment_list}
+    - [START_DATE]: {start_date.strftime('%B %d, %Y')}
+    - [CONTRACT_PRICE]: {contract_price:.2f}
+    - [CURRENT_DATE]: {(current_date or datetime.date.today()).strftime('%B %d, %Y')}
+
+    **Instructions:**
+    Carefully replace every placeholder in the template (e.g., `[CUSTOMER_NAME]`, `[CONTRACT_PRICE]`) with the corresponding data provided above.
+    Present the final, completed contract text. Do not include any of your own commentary or headers.
+    """
+
 def show_contract_creator():
     st.subheader(MODULE_TITLE)
     st.caption("Select a service plan and enter customer details to generate a service agreement.")
     st.markdown("---")
 
-    # Initialize or get the RAG chain specific to this context
-    chain_key = f'rag_chain_{RAG_ID}'
-    if chain_key not in st.session_state or st.session_state[chain_key] is None:
-        st.write(f"Initializing knowledge base for '{RAG_ID}'...")
-        st.session_state[chain_key] = setup_rag_chain(rag_id=RAG_ID)
-
-    qa_chain = st.session_state.get(chain_key)
+    # Get the process-wide RAG chain for this context (shared by all sessions)
+    qa_chain = get_rag_chain(rag_id=RAG_ID)
 
     if not qa_chain:
         st.error(f"Could not initialize the contract templates knowledge base.")
@@ -41,7 +67,7 @@ def show_contract_creator():
 
         service_plan = st.selectbox(
             "Select Service Plan",
-            ("Basic Annual Plan", "Premium Semi-Annual Plan"),
+            SERVICE_PLANS,
             help="This selection will be used to find the correct template from the knowledge base."
         )
         equipment_list = st.text_area(
@@ -59,37 +85,21 @@ def show_contract_creator():
         if submitted:
             # Step 1: Query RAG to get the base contract template
             with st.spinner(f"Retrieving template for '{service_plan}'..."):
-                template_query = f"Retrieve the complete and unmodified text for the '{service_plan} Template'. Include everything from 'START OF' to 'END OF' the template."
-                template_text, sources = query_rag(qa_chain, template_query)
+                template_text, sources = query_rag(qa_chain, build_template_query(service_plan))
 
-                if "Error" in template_text or not sources:
+                if not is_valid_template(template_text, sources):
                     st.error(f"Failed to retrieve a valid contract template for '{service_plan}'. Please check the knowledge base.")
                     st.stop()
 
             # Step 2: Use LLM to fill in the template with user data
-            with st.spinner("Populating contract with customer details..."):
-                fill_prompt = f"""
-                You are a legal document assistant. Your task is to populate a contract template with specific customer information.
-                Do not alter the legal language of the template. Only replace the placeholder values.
-
-                **Contract Template to Use:**
-                ---
-                {template_text}
-                ---
-
-                **Data to Insert:**
-                - [CUSTOMER_NAME]: {customer_name}
-                - [CUSTOMER_ADDRESS]: {customer_address}
-                - [EQUIPMENT_LIST]: {equipment_list}
-                - [START_DATE]: {start_date.strftime('%B %d, %Y')}
-                - [CONTRACT_PRICE]: {contract_price:.2f}
-                - [CURRENT_DATE]: {datetime.date.today().strftime('%B %d, %Y')}
-
-                **Instructions:**
-                Carefully replace every placeholder in the template (e.g., `[CUSTOMER_NAME]`, `[CONTRACT_PRICE]`) with the corresponding data provided above.
-                Present the final, completed contract text. Do not include any of your own commentary or headers.
-                """
-                final_contract = generate_response(fill_prompt, temperature=0.0) # Use 0 temp for precise replacement
+            fill_prompt = build_contract_prompt(template_text, customer_name, customer_address, equipment_list, start_date, contract_price)
 
             st.markdown("#### Generated Service Agreement:")
-            st.text_area("Contract Text (copy this)", value=final_contract, height=500)
\ No newline at end of file
+            # Stream the populated contract as it is generated, then swap in the copyable text area
+            contract_placeholder = st.empty()
+            final_contract = render_stream(generate_response_stream(fill_prompt, temperature=CONTRACT_TEMPERATURE), contract_placeholder)
+            if is_interrupted_response(final_contract):
+                # Never offer a truncated contract for copying
+                st.error("The contract is incomplete because generation was interrupted. Please generate it again.")
+            else:
+                contract_placeholder.text_area("Contract Text (copy this)", value=final_contract, height=500)
\ No newline at end of file
@@ -1,15 +1,5 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
-# Now you can import your other libraries
 import streamlit as st
-from utils.gemini import generate_response
+from utils.gemini import generate_response_stream, render_stream
 
 MODULE_TITLE = "💬 Customer Service Chatbot"
 
@@ -85,9 +75,11 @@ def show_customer_chatbot():
 
         # Generate assistant response and display it
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                # Pass the full prompt to the LLM
-                response = generate_response(full_prompt, temperature=0.5) # Lower temp for more factual chat
-                st.markdown(response)
-                # Add assistant response to history
-                st.session_state.customer_chat_messages.append({"role": "assistant", "content": response})
\ No newline at end of file
+            # Pass the full prompt to the LLM and render the reply as it streams in
+            # Opening questions ("AC not cooling") repeat constantly, so the first turn (no prior
+            # user messages) is served from the response cache, matched exactly on the normalized question.
+            is_first_turn = sum(1 for msg in st.session_state.customer_chat_messages if msg["role"] == "user") == 1
+            response = render_stream(generate_response_stream(full_prompt, temperature=0.5, # Lower temp for more factual chat
+                                                              use_cache=is_first_turn, cache_text=prompt))
+            # Add assistant response to history (an interrupted reply keeps its marker, so it is never shown as complete)
+            st.session_state.customer_chat_messages.append({"role": "assistant", "content": response})
\ No newline at end of file
@@ -1,16 +1,6 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
-# Now you can import your other libraries
 import streamlit as st
 from utils.gemini import generate_response
-from utils.rag import setup_rag_chain, query_rag, BASE_DOC_DIR # Optional RAG usage
+from utils.rag import open_context_store, retrieve_context, format_context, streamlit_reporter, BASE_DOC_DIR # Optional RAG usage
 import os
 
 MODULE_TITLE = "📦 Inventory Assistant (Conceptual)"
@@ -25,16 +15,12 @@ def show_inventory_management():
 
     use_rag = st.checkbox(f"Augment suggestions with knowledge from `{RAG_ID_PARTS}` documents? (Requires indexing)", value=False, key="inv_use_rag")
 
-    qa_chain_parts = None
+    parts_store = None
     if use_rag:
         st.caption(f"Using RAG on documents in: `{os.path.join(BASE_DOC_DIR, RAG_ID_PARTS)}`")
-        chain_key = f'rag_chain_{RAG_ID_PARTS}'
-        if chain_key not in st.session_state or st.session_state[chain_key] is None:
-            st.write(f"Initializing knowledge base for '{RAG_ID_PARTS}'...")
-            st.session_state[chain_key] = setup_rag_chain(rag_id=RAG_ID_PARTS)
-
-        qa_chain_parts = st.session_state.get(chain_key)
-        if not qa_chain_parts:
+        # Retrieved chunks go straight into the suggestion prompt, so only the vector store is needed
+        parts_store = open_context_store(rag_id=RAG_ID_PARTS, report=streamlit_reporter())
+        if not parts_store:
             st.error(f"Could not initialize the '{RAG_ID_PARTS}' knowledge base. Ensure documents are present and indexed via 'Manage Knowledge Base'. Proceeding without RAG.")
             use_rag = False # Fallback to non-RAG mode
 
@@ -59,15 +45,12 @@ def show_inventory_management():
     if st.button("Suggest Potential Parts", key="inv_suggest_button"):
         if user_input:
             rag_context_info = ""
-            if use_rag and qa_chain_parts:
-                # Perform a RAG query first to get context
+            if use_rag and parts_store:
+                # Retrieve relevant parts chunks first (retrieval only, no separate LLM answer)
                 with st.spinner("Searching parts knowledge base..."):
-                     rag_answer, rag_sources = query_rag(qa_chain_parts, f"What are common parts or issues related to: {user_input}?")
-                     if rag_answer and rag_answer != "Error: RAG system not available.":
-                          rag_context_info = f"\n\n**Information from Knowledge Base ({RAG_ID_PARTS}):**\n{rag_answer}"
-                          if rag_sources:
-                               source_files = list(set([os.path.basename(s.metadata.get('source','')) for s in rag_sources]))
-                               rag_context_info += f"\n(Sources: {', '.join(source_files)})"
+                     rag_results = retrieve_context(RAG_ID_PARTS, user_input, k=4, report=streamlit_reporter())
+                     if rag_results:
+                          rag_context_info = f"\n\n**Information from Knowledge Base ({RAG_ID_PARTS}):**\n{format_context(rag_results)}"
 
 
             # Construct the main prompt for the LLM
@@ -1,49 +1,195 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
 import streamlit as st
-from utils.gemini import generate_response
-from utils.rag import setup_rag_chain, query_rag, BASE_DOC_DIR
+from utils.gemini import generate_response, is_error_response
+from utils.pricing import (
+    load_rate_table, price_line_items, compute_totals, build_estimate_prompt, apply_estimates, render_invoice,
+    BILLING_INFO_DIR
+)
+from utils.rate_limit import TokenBucket
+from utils.batch_runner import (
+    load_batch_rows, get_batch_output_path, load_batch_results, run_batch, export_batch_results,
+    BatchInputError, STATUS_DONE, STATUS_FAILED
+)
 import os
+import re
 import datetime
 
 MODULE_TITLE = "🧾 Invoice Generator"
-RAG_ID = "billing_info" # RAG context for standard rates
+RAG_ID = "billing_info" # Knowledge base folder holding the standard rate sheet (see utils/pricing.py)
+# Batch mode: concurrent invoices, and Gemini calls per minute for estimating unmatched items
+# (invoices whose items all match the rate sheet make no LLM call and are not rate-limited)
+BATCH_MAX_WORKERS = int(os.getenv("INVOICE_BATCH_WORKERS", "4"))
+BATCH_ESTIMATE_RATE_PER_MINUTE = float(os.getenv("INVOICE_BATCH_ESTIMATE_RATE_PER_MINUTE", "60"))
+BATCH_MAX_RETRIES = int(os.getenv("INVOICE_BATCH_MAX_RETRIES", "4"))
+BATCH_EXPORT_FIELDS = ("invoice_number", "customer_name", "subtotal", "tax", "total", "unpriced_items", "estimated_items")
+
+# --- Invoice Building (no Streamlit; also used by api.py and batch mode) ---
+# Company Info (can be hardcoded or moved to a config file)
+COMPANY_INFO = {
+    "name": "CoolBreeze AC Repair",
+    "address": "456 Service Rd, Maple County, 12345",
+    "phone": "555-COOL (555-2665)",
+    "email": "billing@coolbreezeac.com"
+}
+ESTIMATE_TEMPERATURE = 0.2
+
+def parse_line_items(line_items_text):
+    """Splits the line-items text area into non-empty lines (a batch cell may also separate items with ';')."""
+    return [item.strip() for item in re.split(r"[\n;]", line_items_text) if item.strip()]
+
+def estimate_with_gemini(prompt):
+    """Gemini call for unmatched-item estimates. Raises RuntimeError on a fallback text (quota errors are retryable)."""
+    text = generate_response(prompt, temperature=ESTIMATE_TEMPERATURE)
+    if is_error_response(text):
+        raise RuntimeError(text)
+    return text
+
+# build_invoice() runs both steps with a blocking estimate call; async callers (api.py) await the
+# LLM call between price_invoice_items() and finish_invoice() instead.
+def price_invoice_items(line_items):
+    """Prices line items from the rate sheet. Returns (lines, estimate_prompt); the prompt is None if every item matched."""
+    lines = price_line_items(line_items)
+    return lines, build_estimate_prompt(lines)
+
+def finish_invoice(invoice_num, invoice_date, customer_name, customer_address, job_date, lines, notes="",
+                   estimate_text=None):
+    """Applies the LLM's answer to the estimate prompt (if any) and renders the invoice; dates are
+    datetime.date objects. Returns (invoice_text, totals)."""
+    if estimate_text:
+        apply_estimates(lines, estimate_text)
+    totals = compute_totals(lines)
+    invoice_text = render_invoice(COMPANY_INFO, invoice_num, invoice_date, job_date, customer_name, customer_address,
+                                  lines, totals, notes)
+    return invoice_text, totals
+
+def build_invoice(invoice_num, invoice_date, customer_name, customer_address, job_date, line_items, notes="",
+                  estimate=None):
+    """Prices line items from the rate sheet and renders the invoice; dates are datetime.date objects.
+
+    `estimate(prompt) -> str` is called once, only if some items match no rate, to estimate their
+    prices (None: leave them unpriced). Returns (invoice_text, lines, totals)."""
+    lines, prompt = price_invoice_items(line_items)
+    estimate_text = estimate(prompt) if prompt and estimate else None
+    invoice_text, totals = finish_invoice(invoice_num, invoice_date, customer_name, customer_address, job_date, lines,
+                                          notes, estimate_text)
+    return invoice_text, lines, totals
+
+def _parse_date(value, default):
+    try:
+        return datetime.date.fromisoformat(str(value).strip()) if value else default
+    except ValueError:
+        return default
+
+def build_batch_invoice(row, estimate=None, today=None):
+    """Builds the invoice for one batch row (see show_batch_invoices for the columns); returns a batch result dict."""
+    fields, today = row["fields"], today or datetime.date.today()
+    invoice_num = str(fields.get("invoice_number") or fields.get("invoice_num") or f"INV-{today.year}-{1000 + row['row']}")
+    customer_name = str(fields.get("customer_name") or fields.get("customer") or "")
+    invoice_text, lines, totals = build_invoice(
+        invoice_num, _parse_date(fields.get("invoice_date"), today), customer_name,
+        str(fields.get("customer_address") or fields.get("address") or ""),
+        _parse_date(fields.get("job_date"), today), parse_line_items(row["text"]), str(fields.get("notes") or ""),
+        estimate
+    )
+    return {
+        "output": invoice_text, "invoice_number": invoice_num, "customer_name": customer_name,
+        "subtotal": str(totals["subtotal"]), "tax": str(totals["tax"]), "total": str(totals["total"]),
+        "unpriced_items": sum(1 for line in lines if line.unit_price is None),
+        "estimated_items": sum(1 for line in lines if line.source == "llm_estimate"),
+    }
+
+# --- Batch Mode ---
+def show_batch_invoices():
+    """Generates invoices for an uploaded CSV/JSONL of jobs; results stream into a resumable JSONL file."""
+    st.write("**Upload Jobs (CSV or JSONL):**")
+    st.caption("One invoice per row with `customer_name`, `customer_address` and `line_items` (items separated by "
+               "`;` or new lines), plus optional `invoice_number`, `invoice_date`, `job_date` (YYYY-MM-DD) and `notes`. "
+               "Invoices are saved as they complete; if the run stops, start it again to resume with the remaining rows.")
+    uploaded_file = st.file_uploader("Jobs file", type=["csv", "jsonl"], key="invoice_batch_file")
+    estimate_unmatched = st.checkbox("Estimate prices for items not on the rate sheet (uses Gemini)", value=True,
+                                     key="invoice_batch_estimate")
+    if not uploaded_file:
+        return
+
+    try:
+        rows = load_batch_rows(uploaded_file.name, uploaded_file.getvalue(), text_columns=("line_items", "items"),
+                               id_columns=("invoice_number", "invoice_num", "id", "job_id"))
+    except BatchInputError as e:
+        st.error(f"Could not read '{uploaded_file.name}': {e}")
+        return
+    output_path = get_batch_output_path(rows, {"kind": "invoice", "estimate": estimate_unmatched,
+                                               "rates": [(r.name, str(r.price)) for r in load_rate_table().rates]})
+    previous = load_batch_results(output_path)
+    done_before = sum(1 for record in previous.values() if record["status"] == STATUS_DONE)
+    st.write(f"Found **{len(rows)}** job(s) in `{uploaded_file.name}`"
+             f"{f' ({done_before} already invoiced in an earlier run)' if done_before else ''}.")
+
+    label = "Resume Batch" if previous else "Generate Invoices"
+    if st.button(label, key="generate_batch_invoices_button"):
+        progress_bar = st.progress(0.0, text="Starting...")
+        status = st.empty()
+        estimate = None
+        if estimate_unmatched:
+            # Only rows with unmatched items call Gemini, so the rate limit applies to those calls, not to rows
+            estimate_bucket = TokenBucket(BATCH_ESTIMATE_RATE_PER_MINUTE, capacity=BATCH_MAX_WORKERS)
+
+            def estimate(prompt):
+                estimate_bucket.acquire()
+                return estimate_with_gemini(prompt)
+
+        def on_progress(stats, record):
+            progress_bar.progress(stats.completed / max(stats.total, 1),
+                                  text=f"{stats.completed}/{stats.total} invoice(s) completed")
+            status.write(f"Done: {stats.done + stats.resumed} | Failed: {stats.failed} | Skipped: {stats.skipped} | "
+                         f"Rate-limit retries: {stats.retries} | {stats.elapsed_s:.0f}s elapsed")
+
+        stats = run_batch(
+            rows, lambda row: build_batch_invoice(row, estimate), output_path,
+            max_workers=BATCH_MAX_WORKERS, rate_per_minute=None, max_retries=BATCH_MAX_RETRIES, on_progress=on_progress
+        )
+        progress_bar.progress(1.0, text=f"{stats.completed}/{stats.total} invoice(s) completed")
+        if stats.failed:
+            st.warning(f"{stats.failed} invoice(s) failed. Click **Resume Batch** to retry only those rows.")
+        else:
+            st.success(f"Batch complete: {stats.done} new invoices in {stats.elapsed_s:.1f}s"
+                       f"{f', {stats.resumed} from the earlier run' if stats.resumed else ''}.")
+        previous = load_batch_results(output_path)
+
+    if previous:
+        failed = [record for record in previous.values() if record["status"] == STATUS_FAILED]
+        if failed:
+            with st.expander(f"Failed rows ({len(failed)})"):
+                for record in failed:
+                    st.write(f"- Row {record['row']} (`{record['id']}`): {record['error']}")
+        needs_price = [record for record in previous.values() if record.get("unpriced_items")]
+        if needs_price:
+            st.info(f"{len(needs_price)} invoice(s) have items without a price (marked TBD / Quote required).")
+        base_name = os.path.splitext(uploaded_file.name)[0]
+        cols = st.columns(2)
+        cols[0].download_button("⬇️ Download Invoices (CSV)", export_batch_results(rows, output_path, "csv", BATCH_EXPORT_FIELDS),
+                                file_name=f"{base_name}_invoices.csv", mime="text/csv")
+        cols[1].download_button("⬇️ Download Invoices (JSONL)", export_batch_results(rows, output_path, "jsonl", BATCH_EXPORT_FIELDS),
+                                file_name=f"{base_name}_invoices.jsonl", mime="application/jsonl")
 
 def show_invoice_generator():
     st.subheader(MODULE_TITLE)
-    st.caption("Enter job details to generate a professional invoice. Use the knowledge base for standard rates.")
+    st.caption("Enter job details to generate a professional invoice. Line items are priced from the standard rate sheet.")
     st.markdown("---")
 
-    # Initialize or get the RAG chain specific to this context
-    chain_key = f'rag_chain_{RAG_ID}'
-    if chain_key not in st.session_state:
-        st.session_state[chain_key] = None # Initialize as None
-
-    with st.spinner(f"Loading '{RAG_ID}' knowledge base..."):
-        if st.session_state[chain_key] is None:
-            st.session_state[chain_key] = setup_rag_chain(rag_id=RAG_ID)
+    # Rates are parsed straight from the rate sheet (cached per process), not retrieved from the vector store
+    rate_table = load_rate_table()
+    if not rate_table.rates:
+        st.warning(f"No standard rates found in `{BILLING_INFO_DIR}`. Line items will be priced by AI estimates only.")
 
-    qa_chain = st.session_state.get(chain_key)
-
-    if not qa_chain:
-        st.warning(f"Could not load the '{RAG_ID}' knowledge base. Standard pricing information may be unavailable. Ensure documents are present and indexed via 'Manage Knowledge Base'.")
+    mode = st.radio("Mode:", ("Single Invoice", "Batch (CSV/JSONL)"), key="invoice_mode", horizontal=True)
+    if mode != "Single Invoice":
+        st.markdown("---")
+        show_batch_invoices()
+        return
 
     # --- Invoice Form ---
     with st.form("invoice_form"):
         st.write("**Invoice Details**")
 
-        # Company Info (can be hardcoded or moved to a config file)
-        company_info = {
-            "name": "CoolBreeze AC Repair",
-            "address": "456 Service Rd, Maple County, 12345",
-            "phone": "555-COOL (555-2665)",
-            "email": "billing@coolbreezeac.com"
-        }
-
         cols1 = st.columns(2)
         invoice_num = cols1[0].text_input("Invoice Number", f"INV-{datetime.date.today().year}-1001")
         invoice_date = cols1[1].date_input("Invoice Date", datetime.date.today())
@@ -61,6 +207,7 @@ def show_invoice_generator():
             placeholder="e.g.,\nStandard Diagnostic Fee\nReplaced run capacitor\nAdded 1.5 lbs of R-410A Refrigerant"
         )
         notes = st.text_area("Additional Notes or Recommendations", "Recommended annual maintenance to prevent future issues.")
+        estimate_unmatched = st.checkbox("Estimate prices for items not on the rate sheet (uses Gemini)", value=True)
 
         submitted = st.form_submit_button("Generate Invoice")
 
@@ -68,82 +215,25 @@ def show_invoice_generator():
             if not customer_name or not line_items_input:
                 st.error("Please fill in at least the Customer Name and Line Items.")
             else:
-                billing_context = ""
-                if qa_chain:
-                    with st.spinner("Searching knowledge base for pricing info..."):
-                        # Query RAG with the line items to find relevant pricing
-                        rag_answer, _ = query_rag(qa_chain, f"Provide standard pricing for the following items if available: {line_items_input}")
-                        if rag_answer and "Error" not in rag_answer:
-                            billing_context = f"\n\n**Reference Pricing Information from Knowledge Base:**\n{rag_answer}"
-
-                prompt = f"""
-                Act as a professional billing assistant for 'CoolBreeze AC Repair'. Your task is to generate a clean, formatted invoice based on the provided details.
-
-                **Company Information:**
-                - Name: {company_info['name']}
-                - Address: {company_info['address']}
-                - Phone: {company_info['phone']}
-                - Email: {company_info['email']}
-
-                **Invoice Details:**
-                - Invoice #: {invoice_num}
-                - Invoice Date: {invoice_date.strftime('%Y-%m-%d')}
-                - Date of Service: {job_date.strftime('%Y-%m-%d')}
-
-                **Bill To:**
-                - Customer: {customer_name}
-                - Address: {customer_address}
-
-                **Line Items from Technician:**
-                {line_items_input}
-
-                **Additional Notes:**
-                {notes}
-                {billing_context}
-
-                **Instructions:**
-                1.  Create a professional, well-formatted invoice.
-                2.  Use the "Reference Pricing Information" to assign a plausible price to each line item. If a price isn't listed, estimate a reasonable one based on the item description.
-                3.  Create a clear table for the line items with columns for 'Description', 'Quantity', 'Unit Price', and 'Total'. Assume quantity is 1 unless specified.
-                4.  Calculate a subtotal, a sales tax (assume 7.5%), and a final total amount due.
-                5.  Include a "Thank You" message and payment instructions (e.g., "Payment is due upon receipt.").
-                6.  Output only the formatted invoice text. Do not add any extra commentary.
-
-                **Example Output Format:**
-
-                # INVOICE
-
-                **CoolBreeze AC Repair**
-                456 Service Rd, Maple County, 12345
-                Phone: 555-COOL | billing@coolbreezeac.com
-
-                ---
-                **BILL TO:**
-                Jane Doe
-                123 Main St, Redwood City, 54321
-
-                **Invoice #:** {invoice_num}
-                **Date:** {invoice_date.strftime('%Y-%m-%d')}
-                ---
-
-                | Description                          | Qty | Unit Price | Total   |
-                |--------------------------------------|-----|------------|---------|
-                | Standard Diagnostic Fee              | 1   | $95.00     | $95.00  |
-                | Replaced run capacitor               | 1   | $165.00    | $165.00 |
-                | R-410A Refrigerant (1.5 lbs)         | 1.5 | $85.00     | $127.50 |
-
-                ---
-                **Subtotal:**  $387.50
-                **Sales Tax (7.5%):** $29.06
-                **TOTAL DUE:** **$416.56**
-                ---
-
-                **Notes:**
-                {notes}
-
-                *Thank you for your business! Payment is due upon receipt.*
-                """
-                with st.spinner("Generating invoice..."):
-                    invoice_text = generate_response(prompt, temperature=0.2)
+                with st.spinner("Pricing line items..."):
+                    try:
+                        invoice_text, lines, totals = build_invoice(
+                            invoice_num, invoice_date, customer_name, customer_address, job_date,
+                            parse_line_items(line_items_input), notes, estimate_with_gemini if estimate_unmatched else None
+                        )
+                    except RuntimeError as e:
+                        st.warning(f"Could not estimate prices for unmatched items: {e}")
+                        invoice_text, lines, totals = build_invoice(
+                            invoice_num, invoice_date, customer_name, customer_address, job_date,
+                            parse_line_items(line_items_input), notes
+                        )
+
                 st.markdown("#### Generated Invoice:")
-                st.text_area("Invoice Text (copy this)", value=invoice_text, height=400)
\ No newline at end of file
+                st.markdown(invoice_text)
+                estimated = [line.description for line in lines if line.source == "llm_estimate"]
+                unpriced = [line.description for line in lines if line.unit_price is None]
+                if estimated:
+                    st.info(f"AI-estimated prices (not on the rate sheet): {', '.join(estimated)}")
+                if unpriced:
+                    st.warning(f"Not priced, excluded from the total: {', '.join(unpriced)}")
+                st.text_area("Invoice Text (copy this)", value=invoice_text, height=400)
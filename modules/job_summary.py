@@ -1,23 +1,157 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
-# Now you can import your other libraries
 import streamlit as st
-from utils.gemini import generate_response
+import os
+from utils.gemini import (
+    generate_response, generate_response_stream, render_stream, is_error_response, is_interrupted_response
+)
+from utils.gemini_async import generate_response_async, run_concurrently
+from utils.batch_runner import (
+    load_batch_rows, get_batch_output_path, load_batch_results, run_batch, export_batch_results,
+    BatchInputError, STATUS_DONE, STATUS_FAILED
+)
 
 MODULE_TITLE = "✍️ Automated Job Summary Generator"
+SUMMARY_TEMPERATURE = 0.3 # Slightly lower temperature for more factual summary generation
+ALL_STYLES_OPTION = "All Formats"
+# Batch mode: concurrent generations and Gemini calls per minute
+BATCH_MAX_WORKERS = int(os.getenv("JOB_SUMMARY_BATCH_WORKERS", "4"))
+BATCH_RATE_PER_MINUTE = float(os.getenv("JOB_SUMMARY_BATCH_RATE_PER_MINUTE", "60"))
+BATCH_MAX_RETRIES = int(os.getenv("JOB_SUMMARY_BATCH_MAX_RETRIES", "4"))
+
+# --- Prompt Building (no Streamlit; also used by api.py and batch mode) ---
+# Prompt instructions for each summary style
+SUMMARY_STYLES = {
+    "Standard Invoice Summary": """
+    Generate a concise, professional job summary suitable for a customer invoice. Focus on:
+    1. Customer Reported Issue
+    2. Diagnosis/Findings (briefly)
+    3. Work Performed (clearly list actions taken)
+    4. Parts Used (if mentioned)
+    5. Final System Status
+    Keep it factual and customer-friendly. Avoid excessive technical jargon.
+    """,
+    "Detailed Internal Log": """
+    Generate a detailed job summary for internal records. Include:
+    1. Arrival/Departure Times (if mentioned)
+    2. Customer Details (if mentioned)
+    3. Detailed Customer Complaint
+    4. Step-by-step Diagnostic Process
+    5. Specific Findings (including measurements like pressures, temps if noted)
+    6. Detailed Work Performed
+    7. Parts Used (including quantities if noted)
+    8. Recommendations Given to Customer
+    9. Any observations about system condition (age, rust, etc. if mentioned)
+    10. Final System Status & Tests Performed
+    Be thorough and capture all relevant technical details from the notes.
+    """,
+    "Brief Customer Text": """
+    Generate a very brief, friendly text message summary for the customer.
+    Include:
+    1. Confirmation the job is complete.
+    2. The main issue found and fixed (simply put).
+    3. Confirmation the AC is working now.
+    Example: "Hi [Customer Name if possible], just letting you know we've finished the AC repair. We found a [main issue like dirty filter/low charge] and fixed it. Your AC is cooling again! - CoolBreeze AC"
+    Adapt based on the notes. If no name, use a general greeting.
+    """,
+}
+
+def build_job_summary_prompt(notes, summary_style="Standard Invoice Summary"):
+    """Builds the job summary prompt for raw technician notes. Raises ValueError for an unknown style."""
+    if summary_style not in SUMMARY_STYLES:
+        raise ValueError(f"Unknown summary style '{summary_style}'. Use one of: {', '.join(SUMMARY_STYLES)}.")
+    return f"""
+    **Task:** Transform the following raw technician notes into a specific job summary format.
+
+    **Format Required:** {summary_style}
+
+    **Instructions:**
+    {SUMMARY_STYLES[summary_style]}
+
+    **Raw Technician Notes:**
+    ---
+    {notes}
+    ---
+
+    **Generated Summary:**
+    """
+
+def summarize_notes(notes, summary_style="Standard Invoice Summary"):
+    """Generates one summary (no Streamlit output). Raises RuntimeError if Gemini returns a fallback text,
+    so batch retries see quota errors ("...quota limit reached.") as retryable."""
+    summary = generate_response(build_job_summary_prompt(notes, summary_style), temperature=SUMMARY_TEMPERATURE)
+    if is_error_response(summary):
+        raise RuntimeError(summary)
+    return summary
+
+# --- Batch Mode ---
+def show_batch_job_summary(summary_style):
+    """Summarizes an uploaded CSV/JSONL of technician notes; results stream into a resumable JSONL file."""
+    st.write("**Upload Technician Notes (CSV or JSONL):**")
+    st.caption("One job per row, with the notes in a `notes` column/key (optional `id` or `job_id`). "
+               "Summaries are saved as they complete; if the run stops, start it again to resume with the remaining rows.")
+    uploaded_file = st.file_uploader("Notes file", type=["csv", "jsonl"], key="job_summary_batch_file")
+    if not uploaded_file:
+        return
+
+    try:
+        rows = load_batch_rows(uploaded_file.name, uploaded_file.getvalue())
+    except BatchInputError as e:
+        st.error(f"Could not read '{uploaded_file.name}': {e}")
+        return
+    output_path = get_batch_output_path(rows, {"style": summary_style, "temperature": SUMMARY_TEMPERATURE})
+    previous = load_batch_results(output_path)
+    done_before = sum(1 for record in previous.values() if record["status"] == STATUS_DONE)
+    st.write(f"Found **{len(rows)}** row(s) in `{uploaded_file.name}`"
+             f"{f' ({done_before} already summarized in an earlier run)' if done_before else ''}.")
+
+    label = "Resume Batch" if previous else "Generate Summaries"
+    if st.button(f"{label} ({summary_style})", key="generate_batch_summaries_button"):
+        progress_bar = st.progress(0.0, text="Starting...")
+        status = st.empty()
+
+        def on_progress(stats, record):
+            progress_bar.progress(stats.completed / max(stats.total, 1),
+                                  text=f"{stats.completed}/{stats.total} row(s) completed")
+            status.write(f"Done: {stats.done + stats.resumed} | Failed: {stats.failed} | Skipped: {stats.skipped} | "
+                         f"Rate-limit retries: {stats.retries} | {stats.elapsed_s:.0f}s elapsed")
+
+        stats = run_batch(
+            rows, lambda row: summarize_notes(row["text"], summary_style), output_path,
+            max_workers=BATCH_MAX_WORKERS, rate_per_minute=BATCH_RATE_PER_MINUTE, max_retries=BATCH_MAX_RETRIES,
+            on_progress=on_progress
+        )
+        progress_bar.progress(1.0, text=f"{stats.completed}/{stats.total} row(s) completed")
+        if stats.failed:
+            st.warning(f"{stats.failed} row(s) failed. Click **Resume Batch** to retry only those rows.")
+        else:
+            st.success(f"Batch complete: {stats.done} new summaries in {stats.elapsed_s:.1f}s"
+                       f"{f', {stats.resumed} from the earlier run' if stats.resumed else ''}.")
+        previous = load_batch_results(output_path)
+
+    if previous:
+        failed = [record for record in previous.values() if record["status"] == STATUS_FAILED]
+        if failed:
+            with st.expander(f"Failed rows ({len(failed)})"):
+                for record in failed:
+                    st.write(f"- Row {record['row']} (`{record['id']}`): {record['error']}")
+        base_name = os.path.splitext(uploaded_file.name)[0]
+        cols = st.columns(2)
+        cols[0].download_button("⬇️ Download Summaries (CSV)", export_batch_results(rows, output_path, "csv"),
+                                file_name=f"{base_name}_summaries.csv", mime="text/csv")
+        cols[1].download_button("⬇️ Download Summaries (JSONL)", export_batch_results(rows, output_path, "jsonl"),
+                                file_name=f"{base_name}_summaries.jsonl", mime="application/jsonl")
 
 def show_job_summary():
     st.subheader(MODULE_TITLE)
     st.caption("Enter raw technician notes below to generate a structured summary for invoices or records.")
     st.markdown("---")
 
+    mode = st.radio("Mode:", ("Single Note", "Batch (CSV/JSONL)"), key="job_summary_mode", horizontal=True)
+    if mode != "Single Note":
+        summary_style = st.radio("Choose Format:", tuple(SUMMARY_STYLES), key="batch_summary_style", horizontal=True)
+        st.markdown("---")
+        show_batch_job_summary(summary_style)
+        return
+
     notes_placeholder = """Example:
 Arrived 10:15 AM. Customer: Jane Doe, 123 Main St. Complaint: AC not cooling, blowing warm air.
 Checked thermostat - set correctly.
@@ -39,73 +173,38 @@ Departed 11:30 AM.
     st.write("Select Summary Style:")
     summary_style = st.radio(
         "Choose Format:",
-        ("Standard Invoice Summary", "Detailed Internal Log", "Brief Customer Text"),
+        (*SUMMARY_STYLES, ALL_STYLES_OPTION),
         key="summary_style",
         horizontal=True
     )
 
     if st.button("Generate Summary", key="generate_summary_button"):
-        if notes:
-            # Tailor the prompt based on the selected style
-            if summary_style == "Standard Invoice Summary":
-                prompt_instructions = """
-                Generate a concise, professional job summary suitable for a customer invoice. Focus on:
-                1. Customer Reported Issue
-                2. Diagnosis/Findings (briefly)
-                3. Work Performed (clearly list actions taken)
-                4. Parts Used (if mentioned)
-                5. Final System Status
-                Keep it factual and customer-friendly. Avoid excessive technical jargon.
-                """
-            elif summary_style == "Detailed Internal Log":
-                prompt_instructions = """
-                Generate a detailed job summary for internal records. Include:
-                1. Arrival/Departure Times (if mentioned)
-                2. Customer Details (if mentioned)
-                3. Detailed Customer Complaint
-                4. Step-by-step Diagnostic Process
-                5. Specific Findings (including measurements like pressures, temps if noted)
-                6. Detailed Work Performed
-                7. Parts Used (including quantities if noted)
-                8. Recommendations Given to Customer
-                9. Any observations about system condition (age, rust, etc. if mentioned)
-                10. Final System Status & Tests Performed
-                Be thorough and capture all relevant technical details from the notes.
-                """
-            else: # Brief Customer Text
-                prompt_instructions = """
-                Generate a very brief, friendly text message summary for the customer.
-                Include:
-                1. Confirmation the job is complete.
-                2. The main issue found and fixed (simply put).
-                3. Confirmation the AC is working now.
-                Example: "Hi [Customer Name if possible], just letting you know we've finished the AC repair. We found a [main issue like dirty filter/low charge] and fixed it. Your AC is cooling again! - CoolBreeze AC"
-                Adapt based on the notes. If no name, use a general greeting.
-                """
-
-            full_prompt = f"""
-            **Task:** Transform the following raw technician notes into a specific job summary format.
-
-            **Format Required:** {summary_style}
-
-            **Instructions:**
-            {prompt_instructions}
-
-            **Raw Technician Notes:**
-            ---
-            {notes}
-            ---
-
-            **Generated Summary:**
-            """
-
-            with st.spinner("Generating Summary..."):
-                # Use a slightly lower temperature for more factual summary generation
-                summary = generate_response(full_prompt, temperature=0.3)
+        if notes and summary_style == ALL_STYLES_OPTION:
+            # The formats are independent calls: generate them concurrently (latency ~ the slowest one)
+            with st.spinner(f"Generating {len(SUMMARY_STYLES)} summaries..."):
+                summaries = run_concurrently(*[
+                    generate_response_async(build_job_summary_prompt(notes, style), temperature=SUMMARY_TEMPERATURE)
+                    for style in SUMMARY_STYLES
+                ])
+            for style, summary in zip(SUMMARY_STYLES, summaries):
+                st.markdown(f"#### Generated {style}:")
+                if is_error_response(summary):
+                    st.error(summary)
+                else:
+                    st.text_area("Summary Output:", value=summary, height=200, key=f"summary_output_{style}",
+                                 help="You can copy this text.")
+        elif notes:
+            full_prompt = build_job_summary_prompt(notes, summary_style)
 
             st.markdown(f"#### Generated {summary_style}:")
-            st.text_area("Summary Output:", value=summary, height=200, key="summary_output", help="You can copy this text.")
+            # Stream the summary as it is generated, then swap in the copyable text area
+            output_placeholder = st.empty()
+            summary = render_stream(generate_response_stream(full_prompt, temperature=SUMMARY_TEMPERATURE), output_placeholder)
+            if is_interrupted_response(summary):
+                st.error("The summary is incomplete because generation was interrupted. Please generate it again.")
+            else:
+                output_placeholder.text_area("Summary Output:", value=summary, height=200, key="summary_output", help="You can copy this text.")
             # st.success(summary) # Alternative display using success box
 
         else:
-            st.warning("Please enter technician notes first.")
\ No newline at end of file
+            st.warning("Please enter technician notes first.")
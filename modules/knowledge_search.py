@@ -1,15 +1,8 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
-# Now you can import your other libraries
 import streamlit as st
-from utils.rag import setup_rag_chain, query_rag, BASE_DOC_DIR
+from utils.rag import (
+    get_rag_chain, query_rag, federated_search, format_context, list_indexed_contexts, streamlit_reporter, BASE_DOC_DIR
+)
+from utils.gemini import generate_response_stream, render_stream
 import os
 
 # Define the specific RAG context for this module (e.g., company policies, general FAQs)
@@ -17,28 +10,53 @@ import os
 RAG_ID = "company_policies" # Or "general_knowledge", "hr_documents" etc.
 MODULE_TITLE = "🧠 Knowledge Base Search"
 
+# --- Prompt Building (no Streamlit; also used by api.py) ---
+# Prompt used when searching across all knowledge bases (federated search)
+FEDERATED_PROMPT = """You are a helpful assistant for an AC repair company.
+Answer the question using ONLY the context below, which was retrieved from several company knowledge bases.
+Each context block is labeled with its knowledge base and source document. Mention which source you used.
+If the context does not contain the answer, say so.
+
+Context:
+{context}
+
+Question: {query}
+
+Answer:"""
+FEDERATED_TEMPERATURE = 0.1
+
+def build_federated_prompt(query, results):
+    """Builds the answer prompt from federated_search results ((Document, score) pairs)."""
+    return FEDERATED_PROMPT.format(context=format_context(results), query=query)
+
 def show_knowledge_search():
     st.subheader(MODULE_TITLE)
     st.caption(f"Search indexed company documents (e.g., policies, procedures) in: `{os.path.join(BASE_DOC_DIR, RAG_ID)}`")
     st.markdown("---")
 
-    # Initialize or get the RAG chain specific to this context
-    chain_key = f'rag_chain_{RAG_ID}'
-    if chain_key not in st.session_state or st.session_state[chain_key] is None:
-        st.write(f"Initializing knowledge base for '{RAG_ID}'...")
-        st.session_state[chain_key] = setup_rag_chain(rag_id=RAG_ID)
-        # Consider a rerun if setup gives feedback, use cautiously
-        # st.rerun()
+    search_scope = st.radio(
+        "Search in:",
+        [f"This knowledge base ({RAG_ID})", "All knowledge bases"],
+        key="knowledge_search_scope",
+        horizontal=True
+    )
+    search_all = search_scope == "All knowledge bases"
 
-    qa_chain = st.session_state.get(chain_key)
+    qa_chain = None
+    if not search_all:
+        # Get the process-wide RAG chain for this context (shared by all sessions)
+        qa_chain = get_rag_chain(rag_id=RAG_ID)
 
-    if not qa_chain:
-        st.error(f"Could not initialize the knowledge base for '{RAG_ID}'.")
-        st.warning(f"Please ensure you have placed relevant documents (PDF, TXT) into the `{os.path.join(BASE_DOC_DIR, RAG_ID)}` folder and then use the 'Manage Knowledge Base' tool to **index** this context.")
+        if not qa_chain:
+            st.error(f"Could not initialize the knowledge base for '{RAG_ID}'.")
+            st.warning(f"Please ensure you have placed relevant documents (PDF, TXT) into the `{os.path.join(BASE_DOC_DIR, RAG_ID)}` folder and then use the 'Manage Knowledge Base' tool to **index** this context, or search all knowledge bases instead.")
+            return
+    elif not list_indexed_contexts():
+        st.warning("No knowledge bases have been indexed yet. Use the 'Manage Knowledge Base' tool to index one.")
         return
 
     # --- Query Input ---
-    query_placeholder = f"Ask questions about content in the '{RAG_ID}' documents..."
+    query_placeholder = "Ask questions about content in any indexed documents..." if search_all else f"Ask questions about content in the '{RAG_ID}' documents..."
     query = st.text_area(
         "Enter your search query:",
         key=f"knowledge_query_{RAG_ID}",
@@ -48,10 +66,21 @@ def show_knowledge_search():
 
     if st.button(f"Search Knowledge Base", key=f"knowledge_submit_{RAG_ID}"):
         if query:
-            answer, source_docs = query_rag(qa_chain, query)
-
             st.markdown("#### Search Result:")
-            st.info(answer)
+            if search_all:
+                with st.spinner("Searching all knowledge bases..."):
+                    results = federated_search(query, report=streamlit_reporter())
+                if not results:
+                    st.warning("No relevant documents were found in any knowledge base.")
+                    return
+                prompt = build_federated_prompt(query, results)
+                answer_placeholder = st.empty()
+                answer = render_stream(generate_response_stream(prompt, temperature=FEDERATED_TEMPERATURE), answer_placeholder)
+                answer_placeholder.info(answer)
+                source_docs = [doc for doc, _ in results]
+            else:
+                answer, source_docs = query_rag(qa_chain, query)
+                st.info(answer)
 
             if source_docs:
                 st.markdown("---")
@@ -61,6 +90,8 @@ def show_knowledge_search():
                     display_source = os.path.basename(source_name)
                     page_num = doc.metadata.get('page', None)
                     source_label = f"Source {i+1}: {display_source}"
+                    if doc.metadata.get('rag_context'):
+                        source_label += f" [{doc.metadata['rag_context']}]"
                     if page_num is not None:
                         source_label += f" (Page {page_num + 1})"
 
@@ -72,4 +103,4 @@ def show_knowledge_search():
                  st.warning("No specific documents were retrieved to support this answer.")
 
         else:
-            st.warning("Please enter a search query.")
\ No newline at end of file
+            st.warning("Please enter a search query.")
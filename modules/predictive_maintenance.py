@@ -1,15 +1,5 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
-# Now you can import your other libraries
 import streamlit as st
-from utils.gemini import generate_response
+from utils.gemini import generate_response_stream, render_stream
 import datetime
 
 MODULE_TITLE = "🔮 Predictive Maintenance Suggestions"
@@ -42,6 +32,10 @@ def show_predictive_maintenance():
             if ac_age < 0:
                 st.error("Please enter a valid age for the unit (0 or greater).")
             else:
+                # Service history is bucketed to whole years; the prompt uses only this bucket (not the exact
+                # date), so a cached answer for the same unit profile never quotes another unit's date.
+                service_gap = (f"about {round(years_since_service)} year(s) ago" if years_since_service is not None
+                               else "Unknown")
                 # Construct prompt for Gemini
                 prompt = f"""
                 Act as an experienced HVAC technician providing preventative maintenance advice based *only* on the provided information and general knowledge of common AC component lifespans and failure modes.
@@ -51,7 +45,7 @@ def show_predictive_maintenance():
                 **Unit Information:**
                 - Model: {ac_model if ac_model else 'Not Specified'}
                 - Age: {ac_age} years old
-                - Last Known Service: {last_service_date.strftime('%Y-%m-%d') if last_service_date else 'Unknown'} ({f'{years_since_service:.1f} years ago' if years_since_service is not None else 'Unknown'})
+                - Last Known Service: {service_gap}
                 - Known Issues/Observations: {known_issues if known_issues else 'None reported'}
                 - Usage Pattern: {usage_pattern}
 
@@ -68,9 +62,20 @@ def show_predictive_maintenance():
                 Provide only the bulleted list of suggestions and their brief justifications.
                 """
 
-                with st.spinner("Analyzing unit profile and generating suggestions..."):
-                    # Slightly higher temperature might allow for more nuanced suggestions
-                    suggestions = generate_response(prompt, temperature=0.6)
+                # Common unit profiles repeat, so match the cache on the profile rather than the full prompt.
+                # It holds every variable in the prompt, so the date picker default doesn't defeat the cache.
+                unit_profile = (
+                    f"model: {ac_model or 'not specified'} | age: {ac_age} years | "
+                    f"last service: {service_gap} | "
+                    f"issues: {known_issues or 'none'} | usage: {usage_pattern}"
+                )
 
                 st.markdown("#### AI-Generated Maintenance Suggestions:")
-                st.info(suggestions) # Display suggestions in an info box
\ No newline at end of file
+                # Stream suggestions as they are generated, then show them in an info box
+                suggestions_placeholder = st.empty()
+                # Slightly higher temperature might allow for more nuanced suggestions
+                suggestions = render_stream(
+                    generate_response_stream(prompt, temperature=0.6, use_cache=True, cache_text=unit_profile),
+                    suggestions_placeholder
+                )
+                suggestions_placeholder.info(suggestions) # Display suggestions in an info box
\ No newline at end of file
@@ -1,17 +1,9 @@
-# --- FIX for ChromaDB on Streamlit Sharing ---
-# This is a "monkey patch" to use a more modern version of SQLite
-# that is required by ChromaDB.
-# See: https://docs.trychroma.com/troubleshooting#sqlite
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-# --- END FIX ---
-
-# Now you can import your other libraries
 import streamlit as st
 import os
-import shutil
-from utils.rag import load_documents, split_documents, create_or_load_vector_store, BASE_DOC_DIR, BASE_VECTOR_STORE_DIR
+import time
+from utils.rag import rebuild_vector_store, update_vector_store_incremental, invalidate_rag_context, get_persist_directory, vector_store_exists, delete_vector_store, BASE_DOC_DIR
+from utils.storage_layout import get_storage_layout
+from utils.index_jobs import submit_index_job, active_job, list_jobs
 
 MODULE_TITLE = "📚 Manage Knowledge Base (RAG)"
 
@@ -29,6 +21,82 @@ def get_available_rag_contexts():
         st.error(f"Error listing document contexts: {e}")
         return []
 
+# --- Background Indexing ---
+JOB_POLL_SECONDS = 2
+JOB_STATUS_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌", "interrupted": "⚠️", "superseded": "⏭️"}
+
+def make_index_job(rag_id, index_fn, release_first=False, **kwargs):
+    """Wraps an indexing function as a background job body `fn(report)`."""
+    def run(report):
+        if release_first:
+            # Release the shared store before it is overwritten
+            invalidate_rag_context(rag_id)
+        vector_store = index_fn(rag_id=rag_id, report=report, **kwargs)
+        # Invalidate so every session reloads the new index on next use
+        generation = invalidate_rag_context(rag_id)
+        report("write", f"Shared RAG chain for '{rag_id}' invalidated for all sessions (generation {generation}).")
+        return vector_store is not None
+    return run
+
+def start_index_job(rag_id, kind, index_fn, release_first=False, **kwargs):
+    # release_first marks a full re-index: it replaces the context's queued jobs. An identical queued
+    # job, or a queued full re-index, is reused instead (it reads the documents when it starts)
+    job = submit_index_job(rag_id, kind, make_index_job(rag_id, index_fn, release_first=release_first, **kwargs),
+                           args=kwargs, full=release_first)
+    st.info(f"Indexing job `{job['id']}` for '{rag_id}' is {job['status']}. Progress is shown below; you can keep using the app.")
+
+def render_job(job):
+    """Shows one job record: status, per-stage durations, counters and recent messages."""
+    icon = JOB_STATUS_ICONS.get(job["status"], "")
+    elapsed = job["duration_s"] if job["duration_s"] is not None else (
+        time.time() - job["started"] if job["started"] else 0.0)
+    st.write(f"{icon} **{job['kind']}** job `{job['id']}`: **{job['status']}** ({elapsed:.1f}s)")
+    counts = job["counts"]
+    if counts.get("files_total"):
+        st.progress(min(counts.get("files_done", 0) / counts["files_total"], 1.0),
+                    text=f"{counts.get('files_done', 0)}/{counts['files_total']} file(s) loaded")
+    if job["progress"]:
+        st.caption(job["progress"])
+    if job["stages"]:
+        st.caption(" → ".join(
+            f"{stage['name']} ({stage['duration_s']:.1f}s)" if stage["duration_s"] is not None else f"{stage['name']} (running)"
+            for stage in job["stages"]))
+    if job["error"]:
+        st.error(job["error"])
+    with st.expander("Job messages", expanded=False):
+        for message in job["messages"]:
+            getattr(st, message["level"], st.write)(message["message"])
+
+def show_index_jobs(rag_id):
+    """Current job and recent history for a context."""
+    jobs = list_jobs(rag_id=rag_id, limit=5)
+    if not jobs:
+        st.caption(f"No indexing jobs have run for '{rag_id}' yet.")
+        return
+    render_job(jobs[0])
+    if len(jobs) > 1:
+        with st.expander("Earlier jobs", expanded=False):
+            for job in jobs[1:]:
+                render_job(job)
+
+def show_index_jobs_polling(rag_id):
+    """Re-renders the job panel every JOB_POLL_SECONDS while this context has an active job."""
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    polling = active_job(rag_id) is not None
+    if fragment is None:
+        # Older Streamlit: no partial reruns, so refresh on demand
+        show_index_jobs(rag_id)
+        if polling:
+            st.button("🔃 Refresh job progress", key=f"refresh_jobs_{rag_id}")
+        return
+
+    @fragment(run_every=JOB_POLL_SECONDS if polling else None)
+    def job_panel():
+        show_index_jobs(rag_id)
+        if polling and active_job(rag_id) is None:
+            st.rerun() # Job finished: rerun the page so the buttons and index status update
+    job_panel()
+
 def show_rag_manager():
     st.subheader(MODULE_TITLE)
     st.caption("Upload documents and create/update searchable knowledge bases (Vector Stores) for different AI tools.")
@@ -50,10 +118,10 @@ def show_rag_manager():
         key="rag_manager_context_select"
         )
     context_doc_path = os.path.join(BASE_DOC_DIR, selected_context)
-    context_vector_store_path = os.path.join(BASE_VECTOR_STORE_DIR, f"{selected_context}_chroma")
+    context_vector_store_path = get_persist_directory(selected_context)
     st.write(f"**Managing Context:** `{selected_context}`")
     st.write(f" - Document Source: `{context_doc_path}`")
-    st.write(f" - Vector Store: `{context_vector_store_path}`")
+    st.write(f" - Vector Store: `{context_vector_store_path}` (layout: `{get_storage_layout()}`)")
     st.markdown("---")
 
 
@@ -68,6 +136,7 @@ def show_rag_manager():
 
     if uploaded_files:
         file_status = []
+        saved_filenames = []
         # Ensure the target document directory exists
         os.makedirs(context_doc_path, exist_ok=True)
         for uploaded_file in uploaded_files:
@@ -76,6 +145,7 @@ def show_rag_manager():
                 with open(file_path, "wb") as f:
                     f.write(uploaded_file.getbuffer())
                 file_status.append(f"✅ Successfully saved: `{uploaded_file.name}`")
+                saved_filenames.append(uploaded_file.name)
             except Exception as e:
                 file_status.append(f"❌ Error saving `{uploaded_file.name}`: {e}")
         # Display status messages
@@ -84,7 +154,9 @@ def show_rag_manager():
                 st.success(status)
             else:
                 st.error(status)
-        st.info(f"**Important:** After uploading, you must **Re-Index** the '{selected_context}' knowledge base below to include the new documents in searches.")
+        st.info(f"**Important:** Uploaded documents are not searchable until they are indexed. Index just the uploaded files now, or **Re-Index** the '{selected_context}' knowledge base below.")
+        if saved_filenames and st.button(f"⚡ Index Uploaded Files Now ({len(saved_filenames)})", key=f"index_uploads_{selected_context}"):
+            start_index_job(selected_context, "upload", update_vector_store_incremental, filenames=saved_filenames)
         # Clear the uploader state after processing to avoid re-uploading on rerun
         # This can be tricky with Streamlit's execution model; often simpler to let user clear manually.
 
@@ -123,49 +195,38 @@ def show_rag_manager():
     # --- Indexing Actions ---
     st.markdown("---")
     st.write(f"**Index Documents for '{selected_context}':**")
-    st.warning("Re-indexing processes all documents in the selected context folder. This can take time for large collections and will overwrite the existing index for this context.")
+    st.warning("Re-indexing processes all documents in the selected context folder and will overwrite the existing index for this context.")
+    st.caption("Chunk embeddings are cached on disk, so only new or changed text is sent to the embedding API. "
+               "**Update Changed Files** only processes files that were added, modified or removed since the last index.")
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
 
-    # Button to Re-Index
+    # Button to Re-Index (runs as a background job; see utils/index_jobs.py)
     if col1.button(f"🔄 Create / Re-Index '{selected_context}' Knowledge Base", key=f"index_{selected_context}"):
-        with st.spinner(f"Processing and indexing documents for '{selected_context}'... Please wait."):
-            st.write("Step 1: Loading documents...")
-            docs = load_documents(rag_id=selected_context)
-            if not docs:
-                st.error("No documents were loaded. Indexing cannot proceed. Check the document folder and file types.")
-            else:
-                st.write("Step 2: Splitting documents into chunks...")
-                splits = split_documents(docs)
-                if not splits:
-                    st.error("Document splitting failed. Cannot proceed with indexing.")
-                else:
-                    st.write("Step 3: Creating/Updating vector store and embeddings...")
-                    # Force recreate = True ensures we overwrite the old index
-                    vector_store = create_or_load_vector_store(splits, rag_id=selected_context, force_recreate=True)
-                    if vector_store:
-                        st.success(f"✅ Knowledge base '{selected_context}' was successfully indexed!")
-                        st.info("AI tools using this context will now use the updated information.")
-                        # Clear the cached RAG chain for this context so it forces a reload on next use
-                        chain_key = f'rag_chain_{selected_context}'
-                        if chain_key in st.session_state:
-                            del st.session_state[chain_key]
-                            st.write(f"(Cleared cached RAG chain for '{selected_context}')")
-                    else:
-                        st.error(f"❌ Failed to create or update the vector store for '{selected_context}'. Check logs/errors above.")
+        start_index_job(selected_context, "reindex", rebuild_vector_store, release_first=True)
+
+    # Button for an incremental update driven by the index manifest
+    if col2.button(f"⚡ Update Changed Files in '{selected_context}'", key=f"update_index_{selected_context}"):
+        start_index_job(selected_context, "update", update_vector_store_incremental)
 
     # Button to Delete Index (Use with extreme caution)
-    if os.path.exists(context_vector_store_path):
-         if col2.button(f"🗑️ Delete Index for '{selected_context}'", key=f"delete_index_{selected_context}", help="WARNING: This permanently deletes the indexed data (vector store) for this context. Documents remain, but searchability is removed until re-indexed."):
+    running_job = active_job(selected_context)
+    if running_job:
+         col3.info(f"Deleting is disabled while an indexing job for '{selected_context}' is {running_job['status']}.")
+    elif vector_store_exists(selected_context):
+         if col3.button(f"🗑️ Delete Index for '{selected_context}'", key=f"delete_index_{selected_context}", help="WARNING: This permanently deletes the indexed data (vector store) for this context. Documents remain, but searchability is removed until re-indexed."):
               try:
-                   shutil.rmtree(context_vector_store_path)
+                   # Drop the shared store/chains for every session before removing the files
+                   invalidate_rag_context(selected_context)
+                   delete_vector_store(selected_context)
                    st.success(f"Successfully deleted the index/vector store for '{selected_context}'.")
-                   # Clear any cached chain too
-                   chain_key = f'rag_chain_{selected_context}'
-                   if chain_key in st.session_state:
-                         del st.session_state[chain_key]
                    st.rerun() # Rerun to update UI reflecting deletion
               except Exception as e:
-                   st.error(f"Error deleting index directory '{context_vector_store_path}': {e}")
+                   st.error(f"Error deleting index for '{selected_context}' ('{context_vector_store_path}'): {e}")
     else:
-         col2.info(f"No index found for '{selected_context}' to delete.")
\ No newline at end of file
+         col3.info(f"No index found for '{selected_context}' to delete.")
+
+    # --- Indexing Jobs ---
+    st.markdown("---")
+    st.write(f"**Indexing Jobs for '{selected_context}':**")
+    show_index_jobs_polling(selected_context)
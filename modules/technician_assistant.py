@@ -1,7 +1,5 @@
-
-# Now you can import your other libraries
 import streamlit as st
-from utils.rag import setup_rag_chain, query_rag, BASE_DOC_DIR # Import BASE_DOC_DIR for display
+from utils.rag import get_rag_chain, query_rag, BASE_DOC_DIR # Import BASE_DOC_DIR for display
 import os
 
 # Define the specific RAG context for this module
@@ -13,16 +11,8 @@ def show_technician_assistant():
     st.caption(f"Powered by RAG on documents in: `{os.path.join(BASE_DOC_DIR, RAG_ID)}`")
     st.markdown("---")
 
-    # Initialize or get the RAG chain specific to tech manuals from session state
-    chain_key = f'rag_chain_{RAG_ID}'
-    if chain_key not in st.session_state or st.session_state[chain_key] is None:
-        # Attempt to setup the chain if not already done or if setup failed previously
-        st.write(f"Initializing knowledge base for '{RAG_ID}'...")
-        st.session_state[chain_key] = setup_rag_chain(rag_id=RAG_ID)
-        # Rerun slightly to update the state if setup_rag_chain provides feedback
-        # st.rerun() # Use cautiously, might cause loops if setup fails repeatedly
-
-    qa_chain = st.session_state.get(chain_key)
+    # Get the process-wide RAG chain for tech manuals (shared by all sessions, rebuilt after re-indexing)
+    qa_chain = get_rag_chain(rag_id=RAG_ID)
 
     if not qa_chain:
         st.error(f"Could not initialize the knowledge base for '{RAG_ID}'.")
@@ -0,0 +1,71 @@
+import pytest
+import utils.answer_cache as answer_cache
+from utils.answer_cache import AnswerCache, make_answer_key
+from utils.index_manifest import get_index_version, bump_index_version
+
+# --- RAG answer cache (utils/answer_cache.py): keys and index-version invalidation ---
+# Run from the project root: pytest -q
+
+SOURCES = [{"page_content": "Replace the capacitor.", "metadata": {"source": "manual.pdf"}}]
+
+@pytest.fixture(autouse=True)
+def no_periodic_saves(monkeypatch):
+    monkeypatch.setattr(answer_cache, "SAVE_INTERVAL_SECONDS", float("inf"))
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(path=str(tmp_path / "answer_cache.json"))
+
+def key(rag_id, version, query="Why is my AC humming?"):
+    return make_answer_key(rag_id, version, query, "gemini-1.5-flash", 4)
+
+def test_key_normalizes_query_and_includes_version_and_options():
+    assert key("manuals", 1, "Why is my AC  humming?") == key("manuals", 1, "why is my ac humming?")
+    assert key("manuals", 1) != key("manuals", 2)
+    assert key("manuals", 1) != make_answer_key("manuals", 1, "Why is my AC humming?", "gemini-1.5-flash", 8)
+    assert key("manuals", 1) != make_answer_key("manuals", 1, "Why is my AC humming?", "gemini-1.5-flash", 4, "mmr")
+
+def test_hit_returns_answer_and_sources(cache):
+    cache.put(key("manuals", 1), "manuals", 1, "Likely the capacitor.", SOURCES)
+    assert cache.get(key("manuals", 1), "manuals", 1) == ("Likely the capacitor.", SOURCES)
+    assert cache.stats() == {"hits": 1, "misses": 0, "stale_purged": 0, "entries": 1}
+
+def test_new_index_version_invalidates_only_that_context(cache):
+    cache.put(key("manuals", 1), "manuals", 1, "old answer", SOURCES)
+    cache.put(key("manuals", 1, "E10 code?"), "manuals", 1, "old answer 2", SOURCES)
+    cache.put(key("parts", 3), "parts", 3, "parts answer", SOURCES)
+
+    assert cache.get(key("manuals", 2), "manuals", 2) is None
+    assert cache.stats()["stale_purged"] == 2
+    assert cache.get(key("parts", 3), "parts", 3) == ("parts answer", SOURCES)
+    # The stale entries are gone even when asked for under their old version
+    assert cache.get(key("manuals", 1), "manuals", 1) is None
+
+def test_bumped_index_version_misses_after_reload(tmp_path):
+    base = str(tmp_path / "vector_store")
+    path = str(tmp_path / "answer_cache.json")
+    version = get_index_version(base, "manuals")
+    cache = AnswerCache(path=path)
+    cache.put(key("manuals", version), "manuals", version, "answer", SOURCES)
+    cache.save()
+
+    new_version = bump_index_version(base, "manuals")
+    assert new_version == version + 1
+    reloaded = AnswerCache(path=path)
+    assert reloaded.get(key("manuals", version), "manuals", version) == ("answer", SOURCES)
+    assert reloaded.get(key("manuals", new_version), "manuals", new_version) is None
+    assert reloaded.stats()["entries"] == 0
+
+def test_entries_expire_after_ttl(cache, monkeypatch):
+    cache.ttl_seconds = 60
+    cache.put(key("manuals", 1), "manuals", 1, "answer", SOURCES)
+    created = cache._entries[key("manuals", 1)]["created"]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: created + 61)
+    assert cache.get(key("manuals", 1), "manuals", 1) is None
+
+def test_clear_one_context(cache):
+    cache.put(key("manuals", 1), "manuals", 1, "a", SOURCES)
+    cache.put(key("parts", 1), "parts", 1, "b", SOURCES)
+    cache.clear("manuals")
+    assert cache.get(key("manuals", 1), "manuals", 1) is None
+    assert cache.get(key("parts", 1), "parts", 1) == ("b", SOURCES)
@@ -0,0 +1,82 @@
+import json
+import threading
+import pytest
+import utils.rate_limit
+from utils.batch_runner import (
+    load_batch_rows, load_batch_results, run_batch, export_batch_results,
+    BatchInputError, STATUS_DONE, STATUS_FAILED, STATUS_SKIPPED
+)
+
+# --- Batch row processing (utils/batch_runner.py): retries, resume and export ---
+# Run from the project root: pytest -q
+
+CSV_DATA = "job_id,notes\nJ1,Replaced capacitor\nJ2,\nJ3,Cleaned coils\nJ4,Recharged R-410A\n"
+
+@pytest.fixture(autouse=True)
+def no_backoff_sleep(monkeypatch):
+    monkeypatch.setattr(utils.rate_limit, "backoff_delay", lambda *args, **kwargs: 0)
+
+@pytest.fixture
+def rows():
+    return load_batch_rows("notes.csv", CSV_DATA.encode("utf-8"))
+
+class QuotaError(Exception):
+    def __str__(self):
+        return "429 ResourceExhausted: fake quota"
+
+def test_load_batch_rows_picks_text_and_id_columns(rows):
+    assert [(row["row"], row["id"], row["text"]) for row in rows] == [
+        (1, "J1", "Replaced capacitor"), (2, "J2", ""), (3, "J3", "Cleaned coils"), (4, "J4", "Recharged R-410A")]
+    jsonl = load_batch_rows("notes.jsonl", '{"text": "a"}\n\n{"text": "b", "ticket": 7}\n')
+    assert [(row["id"], row["text"]) for row in jsonl] == [("1", "a"), ("7", "b")]
+
+@pytest.mark.parametrize("filename, data", [("notes.txt", "x"), ("notes.csv", "job_id,body\nJ1,x\n"),
+                                            ("notes.jsonl", "{not json}\n"), ("notes.csv", "")])
+def test_load_batch_rows_rejects_bad_input(filename, data):
+    with pytest.raises(BatchInputError):
+        load_batch_rows(filename, data)
+
+def test_quota_errors_are_retried_and_other_errors_fail_the_row(rows, tmp_path):
+    attempts, lock = {}, threading.Lock()
+
+    def process(row):
+        with lock:
+            attempts[row["id"]] = attempts.get(row["id"], 0) + 1
+            count = attempts[row["id"]]
+        if row["id"] == "J3" and count < 3:
+            raise QuotaError()
+        if row["id"] == "J4":
+            raise ValueError("unreadable notes")
+        return row["text"].upper()
+
+    stats = run_batch(rows, process, str(tmp_path / "out.jsonl"), max_workers=2, rate_per_minute=None)
+    assert (stats.done, stats.failed, stats.skipped, stats.retries) == (2, 1, 1, 2)
+    assert attempts == {"J1": 1, "J3": 3, "J4": 1}
+    results = load_batch_results(str(tmp_path / "out.jsonl"))
+    assert {row: record["status"] for row, record in results.items()} == {
+        1: STATUS_DONE, 2: STATUS_SKIPPED, 3: STATUS_DONE, 4: STATUS_FAILED}
+    assert results[4]["error"] == "unreadable notes"
+
+def test_rerun_resumes_with_failed_rows_only(rows, tmp_path):
+    output_path = str(tmp_path / "out.jsonl")
+
+    def first_run(row):
+        if row["id"] == "J3":
+            raise ValueError("service down")
+        return "ok"
+
+    run_batch(rows, first_run, output_path, rate_per_minute=None)
+    seen = []
+    stats = run_batch(rows, lambda row: seen.append(row["id"]) or "ok now", output_path, rate_per_minute=None)
+    assert seen == ["J3"]
+    assert (stats.resumed, stats.done, stats.skipped) == (2, 1, 1)
+    exported = [json.loads(line) for line in export_batch_results(rows, output_path, "jsonl").splitlines()]
+    assert [(record["id"], record["status"], record["output"]) for record in exported] == [
+        ("J1", STATUS_DONE, "ok"), ("J2", STATUS_SKIPPED, ""), ("J3", STATUS_DONE, "ok now"), ("J4", STATUS_DONE, "ok")]
+
+def test_dict_results_add_export_columns(rows, tmp_path):
+    output_path = str(tmp_path / "out.jsonl")
+    run_batch(rows, lambda row: {"output": row["text"], "total": "95.00"}, output_path, rate_per_minute=None)
+    csv_text = export_batch_results(rows, output_path, "csv", extra_fields=("total",))
+    assert csv_text.splitlines()[0] == "row,id,status,total,output,error"
+    assert csv_text.splitlines()[1] == "1,J1,done,95.00,Replaced capacitor,"
@@ -0,0 +1,44 @@
+import time
+import threading
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("google.generativeai")
+from utils.gemini import get_pooled_client, clear_client_pool
+
+# --- Process-wide client pool (utils/gemini.py get_pooled_client) ---
+# Run from the project root: pytest -q
+
+@pytest.fixture(autouse=True)
+def empty_pool():
+    clear_client_pool()
+    yield
+    clear_client_pool()
+
+def test_reuses_client_per_config():
+    first = get_pooled_client("test", lambda **config: object(), name="a")
+    assert get_pooled_client("test", lambda **config: object(), name="a") is first
+    assert get_pooled_client("test", lambda **config: object(), name="b") is not first
+
+def test_slow_factory_only_blocks_its_own_key():
+    release, calls = threading.Event(), []
+
+    def slow_factory(**config):
+        calls.append(config)
+        release.wait(5)
+        return object()
+
+    results = []
+    builders = [threading.Thread(target=lambda: results.append(get_pooled_client("test", slow_factory, name="slow")))
+                for _ in range(3)]
+    for thread in builders:
+        thread.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    get_pooled_client("test", lambda **config: object(), name="fast") # Not stuck behind the slow build
+    assert time.perf_counter() - start < 0.5
+    release.set()
+    for thread in builders:
+        thread.join(5)
+    assert len(calls) == 1 # Concurrent callers for the same key share one build
+    assert len(results) == 3 and all(client is results[0] for client in results)
@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.documents import Document
+from utils.context_processing import merge_adjacent_chunks, pack_context, estimate_tokens
+
+# --- Post-retrieval context processing (utils/context_processing.py) ---
+# Run from the project root: pytest -q
+
+TEXT = "The capacitor helps the compressor start. Replace it if it bulges. Check the contactor next."
+
+def chunk(start, end, source="manual.pdf", page=1):
+    return Document(page_content=TEXT[start:end], metadata={"source": source, "page": page, "start_index": start})
+
+def test_overlapping_chunks_merge_into_one_passage():
+    # Retrieved out of position order; the second hit overlaps the first by 10 characters
+    merged = merge_adjacent_chunks([chunk(30, 70), chunk(0, 40)])
+    assert [doc.page_content for doc in merged] == [TEXT[0:70]]
+    assert merged[0].metadata["start_index"] == 0
+    assert merged[0].metadata["merged_chunks"] == 2
+
+def test_touching_and_contained_chunks_merge():
+    merged = merge_adjacent_chunks([chunk(0, 40), chunk(40, 60), chunk(10, 30)])
+    assert [doc.page_content for doc in merged] == [TEXT[0:60]]
+    assert merged[0].metadata["merged_chunks"] == 3
+
+def test_separate_locations_keep_their_rank_order():
+    docs = [
+        chunk(60, 90),                 # Rank 0
+        chunk(0, 20),                  # Rank 1: same page, not adjacent
+        chunk(0, 20, page=2),          # Rank 2: same offsets on another page
+        chunk(50, 70),                 # Rank 3: overlaps rank 0
+    ]
+    merged = merge_adjacent_chunks(docs)
+    assert [(doc.metadata["page"], doc.metadata["start_index"]) for doc in merged] == [(1, 50), (1, 0), (2, 0)]
+    assert merged[0].page_content == TEXT[50:90]
+    assert "merged_chunks" not in merged[1].metadata
+
+def test_chunks_without_positions_are_deduplicated_only():
+    docs = [Document(page_content="a", metadata={}), Document(page_content="a", metadata={}), chunk(0, 10)]
+    merged = merge_adjacent_chunks(docs)
+    assert [doc.page_content for doc in merged] == ["a", TEXT[0:10]]
+
+def test_input_metadata_is_not_modified():
+    docs = [chunk(0, 40), chunk(30, 70)]
+    merge_adjacent_chunks(docs)
+    assert all("merged_chunks" not in doc.metadata for doc in docs)
+
+def words(n, tag="w"):
+    return " ".join(f"{tag}{i:03d}." for i in range(n)) # 5 characters + space per word
+
+def test_estimate_tokens_rounds_up():
+    assert (estimate_tokens(""), estimate_tokens("abc"), estimate_tokens("abcde")) == (0, 1, 2)
+
+def test_pack_keeps_whole_passages_within_budget():
+    docs = [Document(page_content="a" * 400), Document(page_content="b" * 400), Document(page_content="c" * 400)]
+    packed = pack_context(docs, token_budget=200)
+    assert [doc.page_content for doc in packed] == ["a" * 400, "b" * 400]
+
+def test_pack_truncates_tail_at_a_boundary():
+    docs = [Document(page_content=words(100, "a"), metadata={"source": "a.txt"}),
+            Document(page_content=words(100, "b"), metadata={"source": "b.txt"})]
+    packed = pack_context(docs, token_budget=250, min_tail_tokens=64)
+    assert packed[0] is docs[0]
+    tail = packed[1]
+    assert tail.metadata == {"source": "b.txt", "truncated": True}
+    assert tail.page_content.endswith(". ...")
+    assert docs[1].page_content.startswith(tail.page_content[:-len(" ...")])
+    used = sum(estimate_tokens(doc.page_content) for doc in packed[:1]) + estimate_tokens(tail.page_content[:-len(" ...")])
+    assert used <= 250
+
+def test_pack_drops_tail_below_min_tokens():
+    docs = [Document(page_content="a" * 760), Document(page_content=words(100))]
+    assert len(pack_context(docs, token_budget=200, min_tail_tokens=64)) == 1
+
+def test_pack_uses_the_given_token_counter():
+    docs = [Document(page_content=words(10, "a")), Document(page_content=words(10, "b"))]
+    by_word = lambda text: len(text.split())
+    packed = pack_context(docs, token_budget=15, count_tokens=by_word, min_tail_tokens=3)
+    tail = packed[1].page_content[:-len(" ...")]
+    # Cut on whole words, within the 5 tokens left (the proportional shrink may leave a little spare)
+    assert tail in [words(n, "b") for n in (3, 4, 5)]
@@ -0,0 +1,65 @@
+import time
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("google.generativeai")
+from utils.gemini_async import KeyConcurrencyLimiter, gather_with_concurrency, run_concurrently
+
+# --- Async client helpers (utils/gemini_async.py): per-key limiter, timeouts and gathering ---
+# Run from the project root: pytest -q
+
+def test_run_concurrently_overlaps_calls_and_keeps_order():
+    limiter = KeyConcurrencyLimiter(4)
+
+    async def call(value, delay):
+        return await limiter.run(lambda: time.sleep(delay) or value, timeout=5)
+
+    start = time.perf_counter()
+    results = run_concurrently(call("a", 0.3), call("b", 0.1), call("c", 0.2))
+    assert results == ["a", "b", "c"]
+    assert time.perf_counter() - start < 0.55 # ~ the slowest call, not the sum (0.6s)
+
+def test_limiter_bounds_calls_in_flight():
+    limiter, in_flight, peak, lock = KeyConcurrencyLimiter(2), [0], [0], threading.Lock()
+
+    def work():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(limiter.run(work, timeout=5) for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak[0] == 2
+
+def test_timed_out_call_keeps_its_slot_until_the_thread_finishes():
+    limiter, release = KeyConcurrencyLimiter(1), threading.Event()
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.run(release.wait, 5, timeout=0.05)
+        with pytest.raises(asyncio.TimeoutError): # The abandoned call still holds the only slot
+            await asyncio.wait_for(limiter.acquire(), timeout=0.1)
+        release.set()
+        await asyncio.wait_for(limiter.acquire(), timeout=2)
+        limiter.release()
+
+    asyncio.run(main())
+
+def test_gather_with_concurrency_limits_and_keeps_order():
+    running, peak = [0], [0]
+
+    async def task(value):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01 * (5 - value))
+        running[0] -= 1
+        return value
+
+    assert asyncio.run(gather_with_concurrency(2, *(task(i) for i in range(5)))) == [0, 1, 2, 3, 4]
+    assert peak[0] == 2
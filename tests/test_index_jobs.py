@@ -0,0 +1,105 @@
+import time
+import threading
+import pytest
+import utils.index_jobs as index_jobs
+from utils.index_jobs import submit_index_job, get_job
+
+# --- Background indexing job queue (utils/index_jobs.py): per-context ordering, deduplication of queued jobs ---
+# Run from the project root: pytest -q
+
+@pytest.fixture(autouse=True)
+def job_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_jobs, "INDEX_JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(index_jobs, "is_ready", lambda: True)
+    monkeypatch.setattr(index_jobs, "_jobs", {})
+    monkeypatch.setattr(index_jobs, "_context_queues", {})
+
+@pytest.fixture
+def running_job():
+    """Submits a job that keeps the context busy (so later jobs stay queued) until release() is called."""
+    started, release = threading.Event(), threading.Event()
+
+    def block(report):
+        started.set()
+        return release.wait(10)
+
+    job = submit_index_job("ctx", "update", block)
+    assert started.wait(5)
+    yield release.set
+    release.set()
+    wait_for(job["id"])
+
+def wait_for(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        record = get_job(job_id)
+        if record["status"] not in index_jobs.ACTIVE_STATUSES:
+            return record
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def recorder(calls, name):
+    def run(report):
+        calls.append(name)
+        return True
+    return run
+
+def test_identical_queued_job_is_reused(running_job):
+    calls = []
+    first = submit_index_job("ctx", "upload", recorder(calls, "a"), args={"filenames": ["a.txt"]})
+    second = submit_index_job("ctx", "upload", recorder(calls, "b"), args={"filenames": ["a.txt"]})
+    assert second["id"] == first["id"]
+    running_job()
+    assert wait_for(first["id"])["status"] == index_jobs.STATUS_DONE
+    assert calls == ["a"]
+
+def test_different_queued_jobs_run_in_order(running_job):
+    calls = []
+    upload_a = submit_index_job("ctx", "upload", recorder(calls, "a"), args={"filenames": ["a.txt"]})
+    upload_b = submit_index_job("ctx", "upload", recorder(calls, "b"), args={"filenames": ["b.txt"]})
+    assert upload_b["id"] != upload_a["id"]
+    running_job()
+    assert wait_for(upload_a["id"])["status"] == wait_for(upload_b["id"])["status"] == index_jobs.STATUS_DONE
+    assert sorted(calls) == ["a", "b"]
+
+def test_full_reindex_supersedes_queued_jobs(running_job):
+    calls = []
+    upload = submit_index_job("ctx", "upload", recorder(calls, "upload"), args={"filenames": ["a.txt"]})
+    reindex = submit_index_job("ctx", "reindex", recorder(calls, "reindex"), full=True)
+    assert reindex["id"] != upload["id"]
+    assert get_job(upload["id"])["status"] == index_jobs.STATUS_SUPERSEDED
+    running_job()
+    assert wait_for(reindex["id"])["status"] == index_jobs.STATUS_DONE
+    assert calls == ["reindex"]
+
+def test_queued_full_reindex_covers_later_jobs(running_job):
+    calls = []
+    reindex = submit_index_job("ctx", "reindex", recorder(calls, "reindex"), full=True)
+    upload = submit_index_job("ctx", "upload", recorder(calls, "upload"), args={"filenames": ["a.txt"]})
+    assert upload["id"] == reindex["id"]
+    running_job()
+    wait_for(reindex["id"])
+    assert calls == ["reindex"]
+
+def test_other_contexts_are_not_deduplicated(running_job):
+    calls = []
+    queued = submit_index_job("ctx", "reindex", recorder(calls, "ctx"), full=True)
+    other = submit_index_job("other", "reindex", recorder(calls, "other"), full=True)
+    assert other["id"] != queued["id"]
+    assert get_job(queued["id"])["status"] == index_jobs.STATUS_QUEUED
+    running_job()
+    assert wait_for(queued["id"])["status"] == wait_for(other["id"])["status"] == index_jobs.STATUS_DONE
+    assert sorted(calls) == ["ctx", "other"]
+
+def test_queued_jobs_do_not_hold_pool_workers(running_job):
+    # More queued jobs for a busy context than the pool has workers: another context still runs
+    calls = []
+    queued = [submit_index_job("ctx", "upload", recorder(calls, name), args={"filenames": [name]})
+              for name in ["a.txt", "b.txt", "c.txt"][:index_jobs.DEFAULT_JOB_WORKERS + 1]]
+    other = submit_index_job("other", "update", recorder(calls, "other"))
+    assert wait_for(other["id"])["status"] == index_jobs.STATUS_DONE
+    assert calls == ["other"]
+    assert all(get_job(job["id"])["status"] == index_jobs.STATUS_QUEUED for job in queued)
+    running_job()
+    assert all(wait_for(job["id"])["status"] == index_jobs.STATUS_DONE for job in queued)
+    assert calls[1:] == ["a.txt", "b.txt", "c.txt"][:len(queued)]
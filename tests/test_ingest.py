@@ -0,0 +1,144 @@
+import threading
+import pytest
+import utils.rate_limit
+from utils.ingest import ingest_chunks, vector_store_batch_writer, IngestCheckpoint
+
+# --- Embedding ingestion stage (utils/ingest.py) against a local fake embedding function ---
+# Run from the project root: pytest -q
+
+class FakeChunk:
+    """Stands in for a LangChain Document (ingest_chunks only reads page_content and metadata)."""
+
+    def __init__(self, text):
+        self.page_content = text
+        self.metadata = {"source": "doc.txt"}
+
+class FakeQuotaError(Exception):
+    def __str__(self):
+        return "429 ResourceExhausted: fake quota"
+
+class FakeEmbedder:
+    """Thread-safe fake embed_documents: raises `error` on every `fail_every`-th call (0: never)
+    and on every call after `fail_after` calls (None: never)."""
+
+    def __init__(self, fail_every=0, fail_after=None, error=FakeQuotaError):
+        self.fail_every = fail_every
+        self.fail_after = fail_after
+        self.error = error
+        self.calls = 0
+        self.failures = 0
+        self.embedded_texts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls += 1
+            if (self.fail_every and self.calls % self.fail_every == 0) or \
+                    (self.fail_after is not None and self.calls > self.fail_after):
+                self.failures += 1
+                raise self.error()
+            self.embedded_texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+class MemoryStore:
+    def __init__(self):
+        self.vectors = {}
+
+    def write_batch(self, ids, texts, metadatas, embeddings):
+        self.vectors.update(zip(ids, embeddings))
+
+def make_chunks(n):
+    return [(FakeChunk(f"chunk {i}"), f"doc.txt:abc:{i}") for i in range(n)]
+
+@pytest.fixture(autouse=True)
+def no_backoff_sleep(monkeypatch):
+    monkeypatch.setattr(utils.rate_limit, "backoff_delay", lambda *args, **kwargs: 0)
+
+def test_resumes_from_checkpoint(tmp_path):
+    chunks = make_chunks(1000)
+    checkpoint = IngestCheckpoint(str(tmp_path))
+    checkpoint.record([chunk_id for _, chunk_id in chunks[:300]]) # A previous run stopped here
+    embedder, store = FakeEmbedder(), MemoryStore()
+
+    stats = ingest_chunks(chunks, embedder, store.write_batch, checkpoint=checkpoint,
+                          batch_size=50, max_concurrency=4, rate_per_minute=60000)
+
+    assert (stats.written, stats.skipped, stats.total) == (700, 300, 1000)
+    assert stats.batches == 14
+    assert set(store.vectors) == {chunk_id for _, chunk_id in chunks[300:]}
+    assert sorted(embedder.embedded_texts) == sorted(chunk.page_content for chunk, _ in chunks[300:])
+    assert checkpoint.load() == {chunk_id for _, chunk_id in chunks}
+
+def test_retries_quota_errors_with_backoff(tmp_path):
+    embedder, store = FakeEmbedder(fail_every=3), MemoryStore()
+    retries = []
+
+    stats = ingest_chunks(make_chunks(500), embedder, store.write_batch, checkpoint=IngestCheckpoint(str(tmp_path)),
+                          batch_size=10, max_concurrency=8, rate_per_minute=60000,
+                          on_retry=lambda attempt, delay, error: retries.append(attempt))
+
+    assert stats.written == 500
+    assert len(store.vectors) == 500
+    assert embedder.failures > 0
+    assert stats.retries == embedder.failures == len(retries)
+
+def test_interrupted_run_resumes_without_reembedding(tmp_path):
+    chunks = make_chunks(200)
+    checkpoint = IngestCheckpoint(str(tmp_path))
+    store = MemoryStore()
+
+    with pytest.raises(FakeQuotaError): # Quota keeps failing after 5 batches until retries run out
+        ingest_chunks(chunks, FakeEmbedder(fail_after=5), store.write_batch, checkpoint=checkpoint,
+                      batch_size=20, max_concurrency=1, rate_per_minute=60000, max_retries=2)
+    completed = checkpoint.load()
+    assert completed == {chunk_id for _, chunk_id in chunks[:100]}
+
+    embedder = FakeEmbedder()
+    stats = ingest_chunks(chunks, embedder, store.write_batch, checkpoint=checkpoint,
+                          batch_size=20, max_concurrency=1, rate_per_minute=60000)
+    assert (stats.written, stats.skipped) == (100, 100)
+    assert embedder.embedded_texts == [chunk.page_content for chunk, _ in chunks[100:]]
+    assert len(store.vectors) == 200
+
+def test_non_quota_errors_are_not_retried(tmp_path):
+    embedder = FakeEmbedder(fail_every=1, error=ValueError)
+
+    with pytest.raises(ValueError):
+        ingest_chunks(make_chunks(10), embedder, MemoryStore().write_batch, checkpoint=IngestCheckpoint(str(tmp_path)),
+                      batch_size=10, max_concurrency=1, rate_per_minute=60000)
+    assert embedder.calls == 1
+
+class BufferingStore:
+    """Stands in for a NumpyVectorStore: upserts with flush=False stay in memory until flush()."""
+
+    def __init__(self, flush_every_rows):
+        self.flush_every_rows = flush_every_rows
+        self.buffered, self.stored = {}, {}
+
+    def upsert_embeddings(self, ids, embeddings, documents, metadatas=None, flush=True):
+        self.buffered.update(zip(ids, embeddings))
+        if flush:
+            self.flush()
+
+    def flush_due(self):
+        return len(self.buffered) >= self.flush_every_rows
+
+    def flush(self):
+        self.stored.update(self.buffered)
+        self.buffered.clear()
+
+def test_deferred_writer_checkpoints_only_flushed_batches(tmp_path):
+    chunks = make_chunks(200)
+    checkpoint = IngestCheckpoint(str(tmp_path))
+    store = BufferingStore(flush_every_rows=60)
+
+    with pytest.raises(FakeQuotaError): # Dies after 5 batches; only the first 3 were flushed
+        ingest_chunks(chunks, FakeEmbedder(fail_after=5), vector_store_batch_writer(store), checkpoint=checkpoint,
+                      batch_size=20, max_concurrency=1, rate_per_minute=60000, max_retries=2)
+    assert checkpoint.load() == set(store.stored) == {chunk_id for _, chunk_id in chunks[:60]}
+
+    stats = ingest_chunks(chunks, FakeEmbedder(), vector_store_batch_writer(store), checkpoint=checkpoint,
+                          batch_size=20, max_concurrency=1, rate_per_minute=60000)
+    assert (stats.written, stats.skipped) == (140, 60)
+    assert not store.buffered # The last, partial buffer is flushed when the run ends
+    assert checkpoint.load() == set(store.stored) == {chunk_id for _, chunk_id in chunks}
@@ -0,0 +1,64 @@
+import math
+import pytest
+from utils.lexical_index import BM25Index, tokenize, identifier_terms, reciprocal_rank_fusion
+
+# --- BM25 lexical index (utils/lexical_index.py): tokenization, scoring, persistence, RRF ---
+# Run from the project root: pytest -q
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("Replace CAP-DR-4505-440 now") == ["replace", "cap-dr-4505-440", "cap", "dr", "4505", "440", "now"]
+    assert tokenize("Error E10, fan.") == ["error", "e10", "fan"]
+    assert tokenize(None) == []
+
+def test_identifier_terms_need_letters_and_digits():
+    assert identifier_terms("Unit shows E10 after CAP-DR-4505-440 swap, code 42") == ["e10", "cap-dr-4505-440"]
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(["a", "b", "c"], [
+        "Error code E10 means the compressor overheated.",
+        "Capacitor CAP-DR-4505-440 fits most condensers.",
+        "Clean the condenser coil and check the compressor.",
+    ], [{"source": "a.txt"}, {"source": "b.txt"}, {"source": "c.txt"}])
+    return index
+
+def test_bm25_score_matches_formula(index):
+    [(chunk_id, score)] = index.search("e10", k=1)
+    # One matching chunk of 3: idf = ln(1 + (3 - 1 + 0.5) / (1 + 0.5)); tf = 1
+    n_terms = len(tokenize(index.docs["a"]["text"]))
+    avg_length = sum(len(tokenize(doc["text"])) for doc in index.docs.values()) / 3
+    idf = math.log(1 + 2.5 / 1.5)
+    expected = idf * 1 * (1.5 + 1) / (1 + 1.5 * (1 - 0.75 + 0.75 * n_terms / avg_length))
+    assert chunk_id == "a"
+    assert score == pytest.approx(expected)
+
+def test_rarer_terms_score_higher(index):
+    # "compressor" is in two chunks, "e10" in one: the chunk with both ranks first
+    ranked = index.search("compressor e10", k=3)
+    assert [chunk_id for chunk_id, _ in ranked] == ["a", "c"]
+    assert index.search("4505")[0][0] == "b"
+    assert index.search("unrelated words") == []
+
+def test_remove_and_replace_update_statistics(index):
+    index.remove(["a", "missing"])
+    assert len(index) == 2 and not index.has_term("e10")
+    assert index.search("e10") == []
+    index.add(["b"], ["Now about error E10."])
+    assert len(index) == 2
+    assert index.search("e10")[0][0] == "b"
+    assert index.search("4505") == []
+
+def test_save_load_round_trip(index, tmp_path):
+    path = str(tmp_path / "ctx" / "bm25_index.json")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.docs == index.docs
+    assert loaded.search("compressor e10", k=3) == index.search("compressor e10", k=3)
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60))
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["b"] > fused["a"] > fused["c"]
+    assert fused["d"] == pytest.approx(1 / 62)
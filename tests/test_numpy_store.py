@@ -0,0 +1,79 @@
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+from utils.numpy_store import NumpyVectorStore, EMBEDDINGS_FILENAME, QUANTIZATION_NONE, QUANTIZATION_INT8
+
+# --- NumPy vector store (utils/numpy_store.py): upsert/delete/reload round-trips and deferred flushes ---
+# Run from the project root: pytest -q
+
+VECTORS = {"a": [1.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0], "c": [0.6, 0.8, 0.0]}
+
+def upsert(store, ids, **kwargs):
+    return store.upsert_embeddings(ids, [VECTORS[i] for i in ids], [f"text {i}" for i in ids],
+                                   [{"source": f"{i}.txt"} for i in ids], **kwargs)
+
+def nearest(store, vector, k=3):
+    return [doc.metadata["source"] for doc, _ in store.similarity_search_by_vector_with_relevance_scores(vector, k=k)]
+
+@pytest.fixture(params=[QUANTIZATION_NONE, QUANTIZATION_INT8])
+def store(request, tmp_path):
+    return NumpyVectorStore(str(tmp_path / "store"), quantization=request.param)
+
+def test_upsert_and_reload_round_trip(store):
+    upsert(store, ["a", "b", "c"])
+    reloaded = NumpyVectorStore(store.directory)
+    assert reloaded.quantization == store.quantization
+    assert reloaded.get()["ids"] == ["a", "b", "c"]
+    assert reloaded.get(ids=["c"])["documents"] == ["text c"]
+    assert np.allclose(reloaded.get(include=["embeddings"])["embeddings"], list(VECTORS.values()), atol=0.01)
+    assert nearest(reloaded, [1.0, 0.1, 0.0]) == ["a.txt", "c.txt", "b.txt"]
+
+def test_upsert_replaces_existing_records_in_place(store):
+    upsert(store, ["a", "b"])
+    store.upsert_embeddings(["a", "a"], [[0.0, 0.0, 5.0], [0.0, 1.0, 0.0]], ["old", "new"]) # Last one wins
+    reloaded = NumpyVectorStore(store.directory)
+    assert reloaded.get()["ids"] == ["a", "b"]
+    assert reloaded.get(ids=["a"])["documents"] == ["new"]
+    assert np.allclose(reloaded.get(ids=["a"], include=["embeddings"])["embeddings"], [[0.0, 1.0, 0.0]], atol=0.01)
+
+def test_delete_round_trip(store):
+    upsert(store, ["a", "b", "c"])
+    store.delete(["b", "missing"])
+    reloaded = NumpyVectorStore(store.directory)
+    assert reloaded.get()["ids"] == ["a", "c"]
+    assert nearest(reloaded, [0.0, 1.0, 0.0], k=1) == ["c.txt"]
+    reloaded.delete(["a", "c"])
+    assert len(NumpyVectorStore(store.directory)) == 0
+
+def test_deferred_upserts_are_searchable_but_written_on_flush(store):
+    upsert(store, ["a"])
+    upsert(store, ["b", "c"], flush=False)
+    assert len(store) == 3 and store.unflushed_rows == 2
+    assert nearest(store, [0.0, 1.0, 0.0], k=1) == ["b.txt"]
+    assert NumpyVectorStore(store.directory).get()["ids"] == ["a"]
+    assert store.flush() and not store.flush()
+    assert NumpyVectorStore(store.directory).get()["ids"] == ["a", "b", "c"]
+
+def test_deferred_upserts_do_not_rewrite_the_files(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.numpy_store.MIN_FLUSH_ROWS", 4)
+    store = NumpyVectorStore(str(tmp_path / "store"))
+    rng = np.random.default_rng(0)
+    flushes = 0
+    for batch in range(20):
+        ids = [f"{batch}:{i}" for i in range(2)]
+        store.upsert_embeddings(ids, rng.normal(size=(2, 3)), ids, flush=False)
+        if store.flush_due():
+            store.flush()
+            flushes += 1
+    store.flush()
+    # 40 rows in batches of 2: flushes at 4, 8, 16 and 32 rows instead of once per batch
+    assert flushes == 4
+    assert len(NumpyVectorStore(store.directory)) == 40
+    assert os.path.exists(os.path.join(store.directory, EMBEDDINGS_FILENAME))
+
+def test_dimension_mismatch_is_rejected(store):
+    upsert(store, ["a"])
+    with pytest.raises(ValueError, match="dimension"):
+        store.upsert_embeddings(["d"], [[1.0, 0.0]], ["text d"])
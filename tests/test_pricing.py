@@ -0,0 +1,120 @@
+from decimal import Decimal
+import pytest
+from utils.pricing import (
+    parse_rate_table, RateTable, PricedLine, price_line_items, compute_totals, normalize_line_item, parse_quantity
+)
+
+# --- Local pricing engine (utils/pricing.py) against a fixed copy of the rate sheet ---
+# Run from the project root: pytest -q
+
+RATE_SHEET = """
+## Standard Service Rates ##
+
+# Labor Rates
+Standard Diagnostic Fee: $95.00 (covers first 30 minutes on site)
+Standard Hourly Labor Rate: $125.00/hour
+After-Hours/Emergency Labor Rate: $185.00/hour
+
+# Common Parts
+Run Capacitor (Universal, up to 45 MFD): $165.00 (includes installation)
+Contactor (2-pole): $190.00 (includes installation)
+Thermostat (Basic Digital, Non-Programmable): $150.00 (includes installation)
+Thermostat (Smart/WiFi, e.g., Nest/Ecobee): Quoted per job, starts at $350.00
+
+# Refrigerant
+Refrigerant Leak Search: $150.00 (up to 1 hour)
+R-410A Refrigerant: $85.00 per pound
+R-22 Refrigerant: $175.00 per pound (subject to availability)
+"""
+
+@pytest.fixture(scope="module")
+def rate_table():
+    return RateTable(parse_rate_table(RATE_SHEET))
+
+def price_one(description, rate_table):
+    [line] = price_line_items([description], rate_table)
+    return line
+
+@pytest.mark.parametrize("description, rate_name, quantity", [
+    ("Labor 2 hrs", "Standard Hourly Labor Rate", "2"),
+    ("2 hours labor", "Standard Hourly Labor Rate", "2"),
+    ("Service call - 1 hour labor", "Standard Hourly Labor Rate", "1"),
+    ("Emergency after-hours service call 1.5 hr", "After-Hours/Emergency Labor Rate", "1.5"),
+    ("Capacitor 45 MFD x2", "Run Capacitor (Universal, up to 45 MFD)", "2"),
+    ("Replaced run capacitor", "Run Capacitor (Universal, up to 45 MFD)", "1"),
+    ("R-410A recharge 3 lbs", "R-410A Refrigerant", "3"),
+    ("Added 1.5 lbs R-22", "R-22 Refrigerant", "1.5"),
+    ("Standard Diagnostic Fee", "Standard Diagnostic Fee", "1"),
+    ("45 MFD run capacitor", "Run Capacitor (Universal, up to 45 MFD)", "1"),      # Rating, not a count
+    ("Replaced 2 contactors", "Contactor (2-pole)", "2"),                          # Count mid-line
+    ("Labor: 1 hr 30 min", "Standard Hourly Labor Rate", "1.5"),
+    ("Labor 45 min", "Standard Hourly Labor Rate", "0.75"),
+    ("Labor 1 hr 20 min", "Standard Hourly Labor Rate", "1.33"),
+])
+def test_matches_rate_and_quantity(rate_table, description, rate_name, quantity):
+    line = price_one(description, rate_table)
+    assert (line.rate_name, line.source, line.quantity) == (rate_name, "rate_table", Decimal(quantity))
+
+@pytest.mark.parametrize("description", [
+    "Replaced blower motor",           # Not on the rate sheet
+    "Thermostat wiring repair",        # Mentions a rate but is other work
+    "Refrigerant recharge 3 lbs",      # R-410A or R-22: different prices, left for an estimate
+    "Replaced thermostat",             # Basic or smart thermostat
+])
+def test_unknown_or_ambiguous_items_are_left_unpriced(rate_table, description):
+    line = price_one(description, rate_table)
+    assert (line.source, line.unit_price, line.total) == ("unmatched", None, None)
+
+def test_quoted_rate_is_matched_but_not_priced(rate_table):
+    line = price_one("Installed smart WiFi thermostat", rate_table)
+    assert (line.source, line.unit_price) == ("quote", None)
+    assert line.rate_name.startswith("Thermostat (Smart/WiFi")
+
+def test_normalizes_units_and_counts():
+    assert normalize_line_item("Labor 2 hrs") == "Labor hour"
+    assert normalize_line_item("Added 1.5 lbs R-22") == "Added pound R-22"
+    assert normalize_line_item("Capacitor 45 MFD x2") == "Capacitor 45 MFD"
+    assert normalize_line_item("Replaced 2 contactors") == "Replaced contactors"
+    assert normalize_line_item("45 MFD run capacitor") == "45 MFD run capacitor"
+
+@pytest.mark.parametrize("description, unit, quantity", [
+    ("5 ton unit tune-up", "system", "1"),
+    ("5 ton unit tune-up", "each", "1"),
+    ("Replaced 2 contactors 40 amp", "each", "2"),
+    ("R-22 leak repair", "each", "1"),
+    ("3 filters", "each", "3"),
+    ("Labor 90 min", "hour", "1.5"),
+])
+def test_parse_quantity(description, unit, quantity):
+    assert parse_quantity(description, unit) == Decimal(quantity)
+
+def test_line_totals_use_exact_cents(rate_table):
+    lines = price_line_items(["Labor 2 hrs", "R-410A 2.5 lbs", "Capacitor 45 MFD x2"], rate_table)
+    assert [line.total for line in lines] == [Decimal("250.00"), Decimal("212.50"), Decimal("330.00")]
+
+@pytest.mark.parametrize("description, total", [
+    ("45 MFD run capacitor", "165.00"),
+    ("Replaced 2 contactors", "380.00"),
+    ("Labor: 1 hr 30 min", "187.50"),
+])
+def test_sizes_counts_and_minutes_are_billed_correctly(rate_table, description, total):
+    assert price_one(description, rate_table).total == Decimal(total)
+
+def test_compute_totals_rounds_tax_half_up():
+    lines = [PricedLine("Diagnostic", Decimal(1), Decimal("95.00"))]
+    totals = compute_totals(lines, tax_rate=Decimal("0.075"))
+    # 95.00 * 0.075 = 7.125 -> 7.13 (half-up, not banker's rounding)
+    assert (totals["subtotal"], totals["tax"], totals["total"]) == (Decimal("95.00"), Decimal("7.13"), Decimal("102.13"))
+
+def test_compute_totals_excludes_unpriced_lines():
+    lines = [
+        PricedLine("Labor", Decimal("2.5"), Decimal("125.00")),
+        PricedLine("Blower motor", Decimal(1), source="unmatched"),
+        PricedLine("Smart thermostat", Decimal(1), source="quote"),
+    ]
+    totals = compute_totals(lines, tax_rate=Decimal("0.075"))
+    assert (totals["subtotal"], totals["tax"], totals["total"]) == (Decimal("312.50"), Decimal("23.44"), Decimal("335.94"))
+
+def test_compute_totals_of_no_priced_lines_is_zero():
+    totals = compute_totals([PricedLine("Blower motor", Decimal(1), source="unmatched")], tax_rate=Decimal("0.075"))
+    assert (totals["subtotal"], totals["tax"], totals["total"]) == (Decimal("0.00"), Decimal("0.00"), Decimal("0.00"))
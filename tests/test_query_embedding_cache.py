@@ -0,0 +1,38 @@
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+import utils.query_embedding_cache as query_embedding_cache
+from utils.query_embedding_cache import QueryEmbeddingCache
+
+# --- Query log of the query embedding cache (utils/query_embedding_cache.py): cap and retention ---
+# Run from the project root: pytest -q
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "query_embeddings.json")
+
+def test_full_log_drops_least_frequent_queries_in_a_batch(cache_path):
+    cache = QueryEmbeddingCache(path=cache_path, max_logged_queries=10)
+    for _ in range(3):
+        cache.record_query("AC not cooling")
+    for i in range(10):
+        cache.record_query(f"error code E{i}")
+    # 11 queries > 10: pruned to 9, keeping the frequent one and the newest rare ones
+    assert cache.stats()["logged_queries"] == 9
+    assert cache.top_queries(1) == ["AC not cooling"]
+    assert "error code E9" in cache.top_queries(9)
+    assert "error code E0" not in cache.top_queries(9)
+
+def test_queries_past_retention_are_not_saved_or_loaded(cache_path, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(query_embedding_cache.time, "time", lambda: now)
+    cache = QueryEmbeddingCache(path=cache_path, log_retention_days=1)
+    cache.record_query("old question")
+    now += 2 * 24 * 3600
+    cache.record_query("new question")
+    cache.save()
+    assert QueryEmbeddingCache(path=cache_path, log_retention_days=1).top_queries(10) == ["new question"]
+    # Entries already on disk expire on load too
+    now += 2 * 24 * 3600
+    assert QueryEmbeddingCache(path=cache_path, log_retention_days=1).top_queries(10) == []
@@ -0,0 +1,108 @@
+import pytest
+import utils.rate_limit as rate_limit
+from utils.rate_limit import TokenBucket, is_rate_limit_error, backoff_delay, retry_with_backoff
+
+# --- Rate limiting & backoff helpers (utils/rate_limit.py) on a fake clock ---
+# Run from the project root: pytest -q
+
+class FakeClock:
+    """Replaces time.monotonic/time.sleep in utils.rate_limit; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, "sleep", clock.sleep)
+    return clock
+
+class FakeQuotaError(Exception):
+    def __str__(self):
+        return "429 ResourceExhausted: fake quota"
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now += 1.0 # One token per second
+    assert bucket.try_acquire() and not bucket.try_acquire()
+    clock.now += 100.0 # Refill is capped at capacity
+    assert sum(bucket.try_acquire() for _ in range(5)) == 3
+
+def test_acquire_sleeps_until_a_token_is_due(clock):
+    bucket = TokenBucket(rate_per_minute=30, capacity=1) # One token every 2 seconds
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(2.0)]
+
+def test_default_capacity_is_one_second_of_tokens():
+    assert TokenBucket(rate_per_minute=600).capacity == 10
+    assert TokenBucket(rate_per_minute=6).capacity == 1
+
+@pytest.mark.parametrize("error, expected", [
+    (FakeQuotaError(), True),
+    (type("ResourceExhausted", (Exception,), {})("out of tokens"), True),
+    (RuntimeError("Error: API quota limit reached."), True),
+    (ValueError("bad input"), False),
+])
+def test_is_rate_limit_error(error, expected):
+    assert is_rate_limit_error(error) is expected
+
+def test_is_rate_limit_error_follows_the_cause():
+    try:
+        try:
+            raise FakeQuotaError()
+        except FakeQuotaError as e:
+            raise RuntimeError("embedding failed") from e
+    except RuntimeError as wrapped:
+        assert is_rate_limit_error(wrapped)
+
+def test_backoff_delay_is_capped_exponential_jitter(monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: high)
+    assert [backoff_delay(attempt, base_delay=1.0, max_delay=10.0) for attempt in range(6)] == [1, 2, 4, 8, 10, 10]
+
+def test_retry_with_backoff_retries_quota_errors(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda low, high: high)
+    calls, retries = [], []
+
+    def flaky(value):
+        calls.append(value)
+        if len(calls) < 3:
+            raise FakeQuotaError()
+        return value * 2
+
+    assert retry_with_backoff(flaky, 21, on_retry=lambda attempt, delay, error: retries.append((attempt, delay))) == 42
+    assert retries == [(1, 1.0), (2, 2.0)]
+    assert clock.sleeps == [1.0, 2.0]
+
+def test_retry_with_backoff_gives_up(clock):
+    calls = []
+
+    def always_quota():
+        calls.append(1)
+        raise FakeQuotaError()
+
+    with pytest.raises(FakeQuotaError):
+        retry_with_backoff(always_quota, max_retries=2)
+    assert len(calls) == 3
+
+def test_non_retryable_errors_are_raised_at_once(clock):
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        retry_with_backoff(broken)
+    assert len(calls) == 1 and clock.sleeps == []
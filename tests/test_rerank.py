@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+from langchain_core.documents import Document
+from utils.rerank import LexicalOverlapReranker, rerank
+
+# --- Reranking (utils/rerank.py) with the local lexical scorer ---
+# Run from the project root: pytest -q
+
+def make_docs(shared_metadata):
+    texts = ["Replace the run capacitor if it is bulging.", "Check the thermostat wiring.",
+             "A weak run capacitor makes the compressor hum."]
+    return [Document(page_content=text, metadata=shared_metadata[i]) for i, text in enumerate(texts)]
+
+def test_keeps_the_best_matches_in_score_order():
+    docs = make_docs([{"source": f"doc{i}.txt"} for i in range(3)])
+    kept = rerank("run capacitor hum", docs, LexicalOverlapReranker(), top_n=2)
+    assert [doc.metadata["source"] for doc in kept] == ["doc2.txt", "doc0.txt"]
+    assert kept[0].metadata["rerank_score"] >= kept[1].metadata["rerank_score"]
+
+def test_does_not_modify_shared_metadata():
+    shared = [{"source": f"doc{i}.txt"} for i in range(3)] # e.g. dicts owned by a cached index
+    docs = make_docs(shared)
+    kept = rerank("run capacitor", docs, LexicalOverlapReranker(), top_n=2)
+    assert all("rerank_score" in doc.metadata for doc in kept)
+    assert all("rerank_score" not in metadata for metadata in shared)
+    assert all("rerank_score" not in doc.metadata for doc in docs)
@@ -0,0 +1,93 @@
+import json
+import time
+import pytest
+import utils.response_cache as response_cache
+from utils.response_cache import ResponseCache, make_config_key
+
+# --- Gemini response cache (utils/response_cache.py): TTLs, LRU byte bound, persistence, counters ---
+# Run from the project root: pytest -q
+
+CONFIG = make_config_key("gemini-1.5-flash", {"temperature": 0.5})
+
+@pytest.fixture(autouse=True)
+def no_periodic_saves(monkeypatch):
+    # put() saves at most every SAVE_INTERVAL_SECONDS; tests save explicitly
+    monkeypatch.setattr(response_cache, "SAVE_INTERVAL_SECONDS", float("inf"))
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "response_cache.json")
+
+def test_hit_is_exact_on_normalized_text(cache_path):
+    cache = ResponseCache(path=cache_path)
+    cache.put("AC not  cooling", CONFIG, "Check the filter.")
+    assert cache.get("ac not cooling", CONFIG) == "Check the filter."
+    assert cache.get("AC cooling but noisy", CONFIG) is None
+    assert cache.get("AC not cooling", make_config_key("gemini-1.5-flash", {"temperature": 0.9})) is None
+
+def test_counters_and_hit_rate(cache_path):
+    cache = ResponseCache(path=cache_path)
+    assert cache.get("q", CONFIG) is None
+    cache.put("q", CONFIG, "a")
+    assert cache.get("q", CONFIG) == "a"
+    assert cache.get("q", CONFIG) == "a"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+def test_entries_expire_after_ttl(cache_path, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(response_cache.time, "time", lambda: now)
+    cache = ResponseCache(path=cache_path, ttl_seconds=60)
+    cache.put("q", CONFIG, "a")
+    now += 59
+    assert cache.get("q", CONFIG) == "a"
+    now += 2
+    assert cache.get("q", CONFIG) is None
+    stats = cache.stats()
+    assert (stats["expirations"], stats["entries"], stats["bytes"]) == (1, 0, 0)
+
+def test_lru_evicts_least_recently_used_over_byte_bound(cache_path):
+    entry_size = ResponseCache._entry_size({"config_key": CONFIG, "response": "x" * 100})
+    cache = ResponseCache(path=cache_path, max_bytes=2 * entry_size)
+    cache.put("a", CONFIG, "x" * 100)
+    cache.put("b", CONFIG, "x" * 100)
+    assert cache.get("a", CONFIG) is not None # "b" is now least recently used
+    cache.put("c", CONFIG, "x" * 100)
+    assert cache.get("b", CONFIG) is None
+    assert cache.get("a", CONFIG) is not None and cache.get("c", CONFIG) is not None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (1, 2, 2 * entry_size)
+
+def test_persistence_round_trip(cache_path):
+    cache = ResponseCache(path=cache_path)
+    cache.put("q1", CONFIG, "first")
+    cache.put("q2", CONFIG, "second")
+    cache.save()
+    reloaded = ResponseCache(path=cache_path)
+    assert (reloaded.get("q1", CONFIG), reloaded.get("q2", CONFIG)) == ("first", "second")
+    assert reloaded.stats()["bytes"] == cache.stats()["bytes"]
+
+def test_load_skips_expired_entries_and_old_embeddings(cache_path, monkeypatch):
+    cache = ResponseCache(path=cache_path, ttl_seconds=60)
+    cache.put("old", CONFIG, "stale")
+    cache.put("new", CONFIG, "fresh")
+    cache.save()
+    with open(cache_path, encoding="utf-8") as f:
+        stored = json.load(f)
+    for key, entry in stored["entries"]:
+        entry["embedding"] = [0.1, 0.2] # Field written by older versions
+        if entry["response"] == "stale":
+            entry["created"] -= 120
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+
+    reloaded = ResponseCache(path=cache_path, ttl_seconds=60)
+    assert reloaded.get("old", CONFIG) is None
+    assert reloaded.get("new", CONFIG) == "fresh"
+    assert reloaded.stats()["bytes"] == ResponseCache._entry_size({"config_key": CONFIG, "response": "fresh"})
+
+def test_unreadable_file_starts_empty(cache_path):
+    with open(cache_path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert ResponseCache(path=cache_path).stats()["entries"] == 0
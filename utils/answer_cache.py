@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from .response_cache import normalize_prompt
+
+# --- RAG Answer Cache ---
+# Persistent cache for utils.rag.query_rag answers, keyed by (rag_id, index version, normalized
+# query, model, k, other chain options). A cached entry stores the answer and its source
+# document references, so a repeat question returns without any embedding or LLM call.
+# Re-indexing or deleting a context bumps its index version (utils/index_manifest.py), which
+# makes all of that context's entries unreachable; they are purged on the next lookup.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANSWER_CACHE_PATH = os.path.join(PROJECT_ROOT, "cache", "answer_cache.json")
+ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE", "1") != "0"
+DEFAULT_MAX_ENTRIES = int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "2000"))
+DEFAULT_TTL_SECONDS = int(os.getenv("RAG_ANSWER_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+SAVE_INTERVAL_SECONDS = 30
+
+def make_answer_key(rag_id, index_version, query, model_name, k_results, options_key=""):
+    """Returns the cache key for a RAG question."""
+    raw = json.dumps([rag_id, index_version, normalize_prompt(query), model_name, k_results, options_key])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    """Thread-safe LRU of RAG answers (with source references), persisted to a JSON file."""
+
+    def __init__(self, path=ANSWER_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> {"rag_id", "index_version", "answer", "sources", "created"}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self.counters = {"hits": 0, "misses": 0, "stale_purged": 0}
+        self.load()
+
+    def get(self, key, rag_id, index_version):
+        """Returns (answer, sources) or None. Drops entries of older index versions of `rag_id`."""
+        now = time.time()
+        with self._lock:
+            stale = [k for k, entry in self._entries.items()
+                     if entry["rag_id"] == rag_id and entry["index_version"] != index_version]
+            for k in stale:
+                del self._entries[k]
+            if stale:
+                self.counters["stale_purged"] += len(stale)
+                self._dirty = True
+            entry = self._entries.get(key)
+            if entry is None or now - entry["created"] >= self.ttl_seconds:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry["answer"], entry["sources"]
+
+    def put(self, key, rag_id, index_version, answer, sources):
+        """Stores an answer; `sources` is a list of {"page_content", "metadata"} dicts."""
+        with self._lock:
+            self._entries[key] = {"rag_id": rag_id, "index_version": index_version, "answer": answer,
+                                  "sources": sources, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        self.maybe_save()
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries)}
+
+    def clear(self, rag_id=None):
+        with self._lock:
+            for k in [k for k, entry in self._entries.items() if rag_id is None or entry["rag_id"] == rag_id]:
+                del self._entries[k]
+            self._dirty = True
+        self.save()
+
+    # --- Persistence ---
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Answer cache: could not load {self.path} ({e}); starting empty.")
+            return
+        with self._lock:
+            for key, entry in stored.get("entries", [])[-self.max_entries:]:
+                self._entries[key] = entry
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {"entries": [[key, entry] for key, entry in self._entries.items()]}
+            self._dirty = False
+            self._last_save = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def maybe_save(self):
+        """Saves at most every SAVE_INTERVAL_SECONDS (and always at process exit)."""
+        if time.time() - self._last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+# --- Process-wide Instance ---
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """Returns the process-wide AnswerCache, creating it on first use."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+            atexit.register(_answer_cache.save)
+        return _answer_cache
@@ -0,0 +1,199 @@
+import os
+import io
+import csv
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .rate_limit import TokenBucket, retry_with_backoff
+
+# --- Batch Row Processing ---
+# Runs a per-row function (e.g. one LLM generation) over an uploaded CSV/JSONL file on a bounded
+# thread pool. Each call takes a token from a rate-limit bucket (unless the caller rate-limits its
+# own LLM calls, e.g. invoices priced locally) and retries quota errors with backoff. Results are appended to a JSONL output file as they complete (one line per attempt;
+# the last line for a row wins), so a run that stops partway through resumes from that file:
+# rows already marked "done" are skipped, failed and missing rows are processed again.
+# The output file is named after a hash of the input data + run options, so re-uploading the
+# same file with the same options resumes the same batch.
+# NOTE: No Streamlit here; progress is reported through a callback on the calling thread.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_OUTPUT_DIR = os.path.join(PROJECT_ROOT, "cache", "batches")
+TEXT_COLUMNS = ("notes", "technician_notes", "note", "text")
+ID_COLUMNS = ("id", "job_id", "job", "ticket")
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+class BatchInputError(ValueError):
+    """The uploaded file could not be read as a batch (unknown format or no text column)."""
+
+def _pick_column(columns, candidates):
+    lowered = {column.strip().lower(): column for column in columns}
+    return next((lowered[c] for c in candidates if c in lowered), None)
+
+def load_batch_rows(filename, data, text_columns=TEXT_COLUMNS, id_columns=ID_COLUMNS):
+    """Parses an uploaded CSV or JSONL file into [{"row", "id", "text", "fields"}] (row numbers start at 1).
+
+    The text comes from the first of `text_columns` present (default notes/technician_notes/note/text);
+    the row ID from `id_columns` (default id/job_id/job/ticket, else the row number). "fields" holds
+    the whole record."""
+    content = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        records = list(csv.DictReader(io.StringIO(content)))
+        columns = records[0].keys() if records else []
+    elif extension in (".jsonl", ".ndjson", ".json"):
+        records = []
+        for line_number, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise BatchInputError(f"Line {line_number} is not valid JSON: {e}")
+            records.append(record if isinstance(record, dict) else {"notes": str(record)})
+        columns = {key for record in records for key in record}
+    else:
+        raise BatchInputError(f"Unsupported file type '{extension}'. Upload a .csv or .jsonl file.")
+    if not records:
+        raise BatchInputError("The file contains no rows.")
+
+    text_column = _pick_column(columns, text_columns)
+    if text_column is None:
+        raise BatchInputError(f"No {text_columns[0]} column found. Name it one of: {', '.join(text_columns)}.")
+    id_column = _pick_column(columns, id_columns)
+    rows = []
+    for number, record in enumerate(records, start=1):
+        row_id = record.get(id_column) if id_column else None
+        text = record.get(text_column) or ""
+        rows.append({"row": number, "id": str(row_id) if row_id not in (None, "") else str(number),
+                     "text": "\n".join(map(str, text)) if isinstance(text, list) else str(text).strip(),
+                     "fields": {str(key).strip().lower(): value for key, value in record.items() if key is not None}})
+    return rows
+
+def get_batch_output_path(rows, options):
+    """Output file for a batch: keyed by the rows and the run options (e.g. the summary style)."""
+    digest = hashlib.sha256(json.dumps([rows, options], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(BATCH_OUTPUT_DIR, f"batch_{digest}.jsonl")
+
+def load_batch_results(output_path):
+    """Returns {row number: latest result record} from an output file (missing file -> {})."""
+    results = {}
+    if not os.path.exists(output_path):
+        return results
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # Partially written last line of an interrupted run
+            results[record["row"]] = record
+    return results
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0
+    resumed: int = 0  # Rows already done in a previous run
+    retries: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def completed(self):
+        return self.done + self.failed + self.skipped + self.resumed
+
+def run_batch(rows, process_row, output_path, max_workers=4, rate_per_minute=60, max_retries=4,
+              on_progress=None):
+    """Runs `process_row(row) -> str | dict` for every row not yet done in `output_path`.
+
+    - Calls run on a thread pool (at most `max_workers` at once), each taking a token from a
+      `rate_per_minute` bucket (None: no bucket) and retrying quota errors with backoff; other
+      errors fail the row. A dict result must have "output"; its other keys are stored with the record.
+    - Each result is appended to `output_path` (JSONL) on the calling thread as soon as it completes.
+    - `on_progress(stats, record)` runs on the calling thread after every row.
+    Returns a BatchStats."""
+    start = time.perf_counter()
+    previous = load_batch_results(output_path)
+    stats = BatchStats(total=len(rows))
+    pending = []
+    for row in rows:
+        if previous.get(row["row"], {}).get("status") == STATUS_DONE:
+            stats.resumed += 1
+        else:
+            pending.append(row)
+    bucket = TokenBucket(rate_per_minute, capacity=max_workers) if rate_per_minute else None
+
+    retry_lock = threading.Lock()
+
+    def retry_callback(attempt, delay, error):
+        with retry_lock: # Runs on worker threads
+            stats.retries += 1
+
+    def run_row(row):
+        record = {"row": row["row"], "id": row["id"]}
+        if not row["text"]:
+            return {**record, "status": STATUS_SKIPPED, "output": "", "error": "Empty input."}
+        row_start = time.perf_counter()
+        try:
+            if bucket:
+                bucket.acquire()
+            result = retry_with_backoff(process_row, row, max_retries=max_retries, on_retry=retry_callback)
+            if isinstance(result, dict):
+                record.update(result)
+            else:
+                record["output"] = result
+            record.update(status=STATUS_DONE, error=None)
+        except Exception as e:
+            record.update(status=STATUS_FAILED, output="", error=str(e))
+        record["elapsed_ms"] = round((time.perf_counter() - row_start) * 1000, 1)
+        return record
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        remaining = iter(pending)
+        in_flight = {executor.submit(run_row, row) for row in _take(remaining, max_workers * 2)}
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                record["finished"] = time.time()
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if record["status"] == STATUS_DONE:
+                    stats.done += 1
+                elif record["status"] == STATUS_FAILED:
+                    stats.failed += 1
+                else:
+                    stats.skipped += 1
+                stats.elapsed_s = time.perf_counter() - start
+                if on_progress:
+                    on_progress(stats, record)
+                in_flight.update(executor.submit(run_row, row) for row in _take(remaining, 1))
+    stats.elapsed_s = time.perf_counter() - start
+    return stats
+
+def _take(iterator, n):
+    return [row for _, row in zip(range(n), iterator)]
+
+def export_batch_results(rows, output_path, fmt="csv", extra_fields=()):
+    """Returns the latest result of every row (in input order) as CSV or JSONL text, for download.
+    `extra_fields` are result keys (from dict results of process_row) exported as extra columns."""
+    results = load_batch_results(output_path)
+    records = []
+    for row in rows:
+        result = results.get(row["row"], {})
+        records.append({"row": row["row"], "id": row["id"], "status": result.get("status", "pending"),
+                        **{name: result.get(name, "") for name in extra_fields},
+                        "output": result.get("output", ""), "error": result.get("error") or ""})
+    if fmt == "jsonl":
+        return "".join(json.dumps(record) + "\n" for record in records)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["row", "id", "status", *extra_fields, "output", "error"])
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
@@ -0,0 +1,121 @@
+import sys
+import threading
+
+# --- Process Bootstrap ---
+# One-time, per-process setup shared by the Streamlit app, background jobs, the API and scripts:
+#   1. sqlite driver: ChromaDB needs SQLite >= 3.35. Hosts with an older system library (e.g.
+#      Streamlit Community Cloud) get `pysqlite3-binary` installed as `sqlite3`; hosts with a
+#      recent enough stdlib sqlite3 keep it.
+#   2. Environment: `.env` is loaded for local development.
+#   3. Warm caches: the persistent response and answer caches are loaded from disk on a background
+#      thread, so startup (and the first page render) does not wait on their JSON files; a request
+#      that needs a cache before then just loads it itself.
+# Every step is idempotent and guarded by a lock, so any entry point (or module imported
+# standalone, e.g. in a worker) can call bootstrap() / ensure_sqlite() without swapping drivers
+# mid-process. is_ready() tells tools and workers whether the process has been bootstrapped.
+MIN_SQLITE_VERSION = (3, 35, 0) # Required by chromadb
+
+_bootstrap_lock = threading.RLock()
+_state = {"sqlite_driver": None, "sqlite_version": None, "environment": False, "caches": False, "errors": []}
+_warm_thread = None
+
+def _version_tuple(version):
+    return tuple(int(part) for part in version.split(".")[:3])
+
+def ensure_sqlite():
+    """Makes `import sqlite3` resolve to a driver new enough for ChromaDB (once per process).
+
+    Returns the driver name ('sqlite3' or 'pysqlite3')."""
+    with _bootstrap_lock:
+        if _state["sqlite_driver"]:
+            return _state["sqlite_driver"]
+        stdlib = sys.modules.get("sqlite3")
+        if stdlib is None:
+            try:
+                import sqlite3 as stdlib
+            except ImportError: # Python built without the _sqlite3 extension
+                stdlib = None
+        if stdlib is not None and _version_tuple(stdlib.sqlite_version) >= MIN_SQLITE_VERSION:
+            driver = stdlib
+        else:
+            try:
+                import pysqlite3
+            except ImportError:
+                if stdlib is None:
+                    raise
+                print(f"Bootstrap: SQLite {stdlib.sqlite_version} is older than ChromaDB needs and "
+                      "pysqlite3-binary is not installed; vector stores may fail to open.")
+                driver = stdlib
+            else:
+                # Alias (rather than pop) so later `import pysqlite3` calls still work
+                sys.modules["sqlite3"] = pysqlite3
+                sys.modules["sqlite3.dbapi2"] = pysqlite3.dbapi2
+                driver = pysqlite3
+        _state["sqlite_driver"] = driver.__name__
+        _state["sqlite_version"] = driver.sqlite_version
+        return _state["sqlite_driver"]
+
+def load_environment():
+    """Loads `.env` into os.environ (existing variables win). Optional python-dotenv."""
+    with _bootstrap_lock:
+        if _state["environment"]:
+            return
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
+        _state["environment"] = True
+
+def warm_caches():
+    """Loads the persistent response and answer caches from disk, so the first request does not pay for it."""
+    if _state["caches"]:
+        return
+    # Not under _bootstrap_lock: the cache getters have their own locks, and loading can take a while
+    from .response_cache import get_response_cache
+    from .answer_cache import get_answer_cache
+    get_response_cache()
+    get_answer_cache()
+    with _bootstrap_lock:
+        _state["caches"] = True
+
+def start_cache_warmup():
+    """Runs warm_caches on a daemon thread (once per process). Returns the thread, or None if already warm."""
+    global _warm_thread
+    with _bootstrap_lock:
+        if _state["caches"]:
+            return None
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_run_step, args=(warm_caches,), name="cache-warmup", daemon=True)
+            _warm_thread.start()
+        return _warm_thread
+
+def _run_step(step):
+    try:
+        step()
+    except Exception as e:
+        message = f"{step.__name__}: {e}"
+        with _bootstrap_lock:
+            if message not in _state["errors"]:
+                _state["errors"].append(message)
+        print(f"Bootstrap step failed: {message}") # Log to console
+
+def bootstrap(warm=True):
+    """Runs the one-time process setup; safe to call from every entry point. Returns is_ready().
+
+    With warm=True the caches are warmed in the background (see start_cache_warmup)."""
+    with _bootstrap_lock:
+        for step in (ensure_sqlite, load_environment):
+            _run_step(step)
+        if warm:
+            start_cache_warmup()
+        return is_ready()
+
+def is_ready():
+    """True once the sqlite driver and environment are set up in this process."""
+    return bool(_state["sqlite_driver"]) and _state["environment"]
+
+def get_bootstrap_status():
+    """Snapshot of the bootstrap state (driver, SQLite version, completed steps, errors)."""
+    with _bootstrap_lock:
+        return {**_state, "errors": list(_state["errors"]), "ready": is_ready()}
@@ -0,0 +1,104 @@
+import os
+from langchain_core.documents import Document
+
+# --- Post-Retrieval Context Processing ---
+# Steps that run between the retriever and the prompt. Each takes the retrieved Documents in
+# relevance order and returns the Documents to put into the prompt.
+
+def _chunk_span(doc):
+    start = doc.metadata.get('start_index')
+    if start is None:
+        return None
+    return start, start + len(doc.page_content)
+
+def merge_adjacent_chunks(docs):
+    """Merges retrieved chunks that overlap or touch in the same file/page into single passages.
+
+    Chunks are split with an overlap, so neighbouring hits repeat text. Positions come from the
+    `start_index` metadata (added at split time). A merged passage takes the rank of its best chunk
+    and records how many chunks it covers in `merged_chunks`. Chunks without `start_index` are kept
+    as they are, minus exact duplicates."""
+    passages, seen_texts = [], set()
+    by_location = {}
+    for rank, doc in enumerate(docs):
+        span = _chunk_span(doc)
+        if span is None:
+            if doc.page_content not in seen_texts:
+                seen_texts.add(doc.page_content)
+                passages.append((rank, doc))
+            continue
+        by_location.setdefault((doc.metadata.get('source'), doc.metadata.get('page')), []).append((span, rank, doc))
+
+    for chunks in by_location.values():
+        chunks.sort(key=lambda item: item[0])
+        current = None # [start, end, best_rank, text, metadata, count]
+        for (start, end), rank, doc in chunks:
+            if current and start <= current[1]:
+                if end > current[1]:
+                    current[3] += doc.page_content[current[1] - start:]
+                    current[1] = end
+                current[2] = min(current[2], rank)
+                current[5] += 1
+                continue
+            if current:
+                passages.append(_passage(current))
+            current = [start, end, rank, doc.page_content, dict(doc.metadata), 1]
+        if current:
+            passages.append(_passage(current))
+
+    passages.sort(key=lambda item: item[0])
+    return [doc for _, doc in passages]
+
+def _passage(current):
+    start, _, rank, text, metadata, count = current
+    metadata['start_index'] = start
+    if count > 1:
+        metadata['merged_chunks'] = count
+    return rank, Document(page_content=text, metadata=metadata)
+
+# --- Token-Budgeted Context Packing ---
+# The "stuff" chain puts every retrieved chunk into the prompt. Packing caps the context at a token
+# budget: passages are added in relevance order, the first one that no longer fits is truncated to
+# the remaining budget (if enough is left to be useful), and the rest are dropped.
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+MIN_TAIL_TOKENS = 64 # Don't bother including a truncated tail shorter than this
+CHARS_PER_TOKEN = 4  # Rough average for Gemini tokenizers on English text
+
+def estimate_tokens(text):
+    """Local token estimate (no API call)."""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN) if text else 0
+
+def _truncate_to_tokens(text, max_tokens, count_tokens):
+    """Returns the longest prefix of `text` (cut at a sentence/word boundary) within `max_tokens`."""
+    cut = len(text)
+    for _ in range(8): # Shrink proportionally until it fits; converges in 1-2 steps for near-linear counters
+        tokens = count_tokens(text[:cut])
+        if tokens <= max_tokens:
+            break
+        cut = int(cut * max_tokens / tokens * 0.95)
+    prefix = text[:cut]
+    if cut < len(text):
+        boundary = max(prefix.rfind(". "), prefix.rfind("\n"))
+        if boundary < len(prefix) // 2:
+            boundary = prefix.rfind(" ")
+        if boundary > 0:
+            prefix = prefix[:boundary + 1]
+    return prefix.rstrip()
+
+def pack_context(docs, token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, count_tokens=estimate_tokens, min_tail_tokens=MIN_TAIL_TOKENS):
+    """Keeps Documents (in relevance order) until `token_budget` is used up; truncates the tail passage.
+
+    A truncated passage is marked with metadata 'truncated': True."""
+    packed, remaining = [], token_budget
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if tokens <= remaining:
+            packed.append(doc)
+            remaining -= tokens
+            continue
+        if remaining >= min_tail_tokens:
+            text = _truncate_to_tokens(doc.page_content, remaining, count_tokens)
+            if text:
+                packed.append(Document(page_content=text + " ...", metadata={**doc.metadata, 'truncated': True}))
+        break
+    return packed
@@ -0,0 +1,89 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# --- Parallel Load/Split Pipeline ---
+# Parsing PDFs and splitting text is CPU-bound, so large corpora are processed on a process pool:
+# each worker loads and splits one file and sends back only its chunks. At most
+# `max_workers * 2` files are in flight, and callers consume chunks file-by-file, so the whole
+# corpus is never held in memory at once.
+# NOTE: This module must not import streamlit; it is imported by the pool's worker processes.
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 150
+
+def get_default_loader_workers():
+    """Number of loader processes, configurable via the RAG_LOADER_WORKERS environment variable."""
+    try:
+        return max(1, int(os.getenv("RAG_LOADER_WORKERS", "0")) or (os.cpu_count() or 1))
+    except ValueError:
+        return os.cpu_count() or 1
+
+def load_file(filepath):
+    """Loads a single supported file into Documents. Returns None for unsupported file types."""
+    file_ext = os.path.splitext(filepath)[1].lower()
+    if file_ext == '.pdf':
+        return PyPDFLoader(filepath).load()
+    elif file_ext == '.txt':
+        return TextLoader(filepath, encoding='utf-8', autodetect_encoding=True).load()
+    # Add elif for other supported extensions here (e.g., .csv, .docx)
+    # Requires installing additional libraries (e.g., `unstructured`, `python-docx`)
+    # elif file_ext == '.docx':
+    #     from langchain_community.document_loaders import UnstructuredWordDocumentLoader
+    #     return UnstructuredWordDocumentLoader(filepath).load()
+    return None
+
+def get_text_splitter(chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """Returns the text splitter used for all RAG contexts."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        add_start_index=True, # Helpful for locating source text
+        is_separator_regex=False,
+    )
+
+def load_and_split_file(filepath, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """Worker task: loads and splits one file.
+
+    Returns (filename, chunks, error). `chunks` is None for unsupported file types and
+    `error` is the error message (str) if loading/splitting failed."""
+    filename = os.path.basename(filepath)
+    try:
+        docs = load_file(filepath)
+        if docs is None:
+            return filename, None, None
+        return filename, get_text_splitter(chunk_size, chunk_overlap).split_documents(docs), None
+    except Exception as e:
+        return filename, [], str(e)
+
+def iter_file_chunks(filepaths, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, max_workers=None):
+    """Yields load_and_split_file() results as files finish, using a bounded process pool.
+
+    Runs inline (no pool) when there is a single worker or a single file."""
+    filepaths = list(filepaths)
+    max_workers = max_workers or get_default_loader_workers()
+    if max_workers <= 1 or len(filepaths) <= 1:
+        for filepath in filepaths:
+            yield load_and_split_file(filepath, chunk_size, chunk_overlap)
+        return
+
+    # "spawn" avoids forking the (multi-threaded) Streamlit server process
+    mp_context = multiprocessing.get_context("spawn")
+    max_in_flight = max_workers * 2
+    pending_paths = iter(filepaths)
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(filepaths)), mp_context=mp_context) as executor:
+        in_flight = set()
+        for filepath in pending_paths:
+            in_flight.add(executor.submit(load_and_split_file, filepath, chunk_size, chunk_overlap))
+            if len(in_flight) >= max_in_flight:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                # Keep the pool busy without queueing the whole corpus at once
+                next_path = next(pending_paths, None)
+                if next_path is not None:
+                    in_flight.add(executor.submit(load_and_split_file, next_path, chunk_size, chunk_overlap))
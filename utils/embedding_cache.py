@@ -0,0 +1,34 @@
+import os
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+
+# --- Embedding Cache Configuration ---
+# Chunk embeddings are cached on local disk, next to the vector stores, keyed by
+# (embedding model, hash of the chunk text). Re-indexing a context only calls the
+# embedding API for chunks that have never been embedded with that model before.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_CACHE_DIR = os.path.join(PROJECT_ROOT, "embedding_cache")
+
+def get_embedding_cache_namespace(model_name):
+    """Returns the cache namespace for an embedding model (e.g. 'models/embedding-001')."""
+    # Keep the namespace a single, filesystem-safe path segment
+    return model_name.replace("/", "_") + "/"
+
+def get_cached_embeddings(underlying_embeddings, model_name):
+    """Wraps an embeddings client so document embeddings are read from/written to the disk cache."""
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    store = LocalFileStore(EMBEDDING_CACHE_DIR)
+    return CacheBackedEmbeddings.from_bytes_store(
+        underlying_embeddings,
+        store,
+        namespace=get_embedding_cache_namespace(model_name)
+    )
+
+def clear_embedding_cache(model_name=None):
+    """Removes cached embeddings for one model, or the whole cache if no model is given."""
+    import shutil
+    target = EMBEDDING_CACHE_DIR
+    if model_name:
+        target = os.path.join(EMBEDDING_CACHE_DIR, get_embedding_cache_namespace(model_name).rstrip("/"))
+    if os.path.exists(target):
+        shutil.rmtree(target)
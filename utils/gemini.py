@@ -1,8 +1,12 @@
 import streamlit as st
 import google.generativeai as genai
+import google.api_core.exceptions # For ResourceExhausted (quota) errors
 import os
 from dotenv import load_dotenv
 import time # For potential rate limiting
+import threading # Guards the process-level client pool
+import functools
+from .response_cache import get_response_cache, make_config_key
 
 # Load environment variables from .env file if it exists (for local development)
 load_dotenv()
@@ -12,10 +16,18 @@ load_dotenv()
 if 'gemini_configured' not in st.session_state:
     st.session_state['gemini_configured'] = False
 
+# genai.configure() is process-global and resets genai's cached clients (and their channels),
+# so it runs once per process rather than once per session.
+_process_configured = False
+
 def configure_gemini():
     """Configures the Gemini API using the key from st.secrets or environment."""
+    global _process_configured
     if st.session_state.get('gemini_configured', False):
         return True # Already configured
+    if _process_configured:
+        st.session_state['gemini_configured'] = True
+        return True # Configured by another session in this process
 
     api_key = st.secrets.get("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -24,12 +36,8 @@ def configure_gemini():
         return False # Stop execution if key is missing
 
     try:
-        genai.configure(api_key=api_key)
-        # Optional: Test connectivity lightly (listing models can consume quota)
-        # models = genai.list_models()
-        # print("Available Gemini Models:", [m.name for m in models])
+        configure_gemini_headless(api_key)
         st.session_state['gemini_configured'] = True
-        print("Gemini configured successfully.") # Log to console
         return True
     except Exception as e:
         st.error(f"Fatal Error configuring Gemini: {e}")
@@ -37,9 +45,69 @@ def configure_gemini():
         st.stop() # Stop execution on configuration failure
         return False
 
+def configure_gemini_headless(api_key=None):
+    """Configures genai for the process without Streamlit (API server, scripts). Raises on a missing key."""
+    global _process_configured
+    if _process_configured:
+        return True
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY is not set.")
+    genai.configure(api_key=api_key)
+    # Optional: Test connectivity lightly (listing models can consume quota)
+    # models = genai.list_models()
+    # print("Available Gemini Models:", [m.name for m in models])
+    _process_configured = True
+    print("Gemini configured successfully.") # Log to console
+    return True
+
+def is_gemini_configured():
+    """True once genai has been configured in this process (by any session)."""
+    return _process_configured
+
+# --- Client Pool ---
+# Model objects and LangChain clients are created once per process, keyed by kind + model name
+# + config, and reused across calls and sessions. Reusing the client objects also reuses their
+# underlying HTTP/gRPC channels instead of setting up a new connection for every request.
+_client_pool = {}
+_client_pool_lock = threading.Lock() # Guards the dicts only; held briefly
+_client_build_locks = {} # key -> Lock held while that client is created
+
+def _freeze(value):
+    """Turns config values (dicts/lists) into a hashable pool key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def get_pooled_client(kind, factory, **config):
+    """Returns the pooled client for (kind, config), creating it with factory(**config) on first use.
+
+    A slow factory (e.g. a Chroma client or a cross-encoder load) only blocks lookups of the same key."""
+    key = (kind, _freeze(config))
+    with _client_pool_lock:
+        client = _client_pool.get(key)
+        if client is not None:
+            return client
+        build_lock = _client_build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        with _client_pool_lock:
+            client = _client_pool.get(key) # Created by another thread while we waited
+        if client is None:
+            client = factory(**config)
+            with _client_pool_lock:
+                _client_pool[key] = client
+        return client
+
+def clear_client_pool():
+    """Drops all pooled clients (e.g., after changing the API key)."""
+    with _client_pool_lock:
+        _client_pool.clear()
+
 def get_gemini_model(model_name="gemini-1.5-flash"):
-    """Initializes and returns a specific Gemini model."""
-    if not st.session_state.get('gemini_configured', False):
+    """Returns the pooled Gemini model object for `model_name`, creating it on first use."""
+    if not (_process_configured or st.session_state.get('gemini_configured', False)):
         if not configure_gemini(): # Attempt to configure if not already
              return None # Return None if configuration fails
 
@@ -51,8 +119,10 @@ def get_gemini_model(model_name="gemini-1.5-flash"):
         #     {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         #     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
         # ]
-        model = genai.GenerativeModel(
-            model_name
+        model = get_pooled_client(
+            "generative_model",
+            genai.GenerativeModel,
+            model_name=model_name
             # safety_settings=safety_settings
         )
         return model
@@ -60,11 +130,63 @@ def get_gemini_model(model_name="gemini-1.5-flash"):
         st.error(f"Error initializing Gemini model ({model_name}): {e}")
         return None
 
-def generate_response(prompt, model_name="gemini-1.5-flash", **kwargs):
-    """Generates a response from the Gemini model with error handling."""
+# --- Token Counting ---
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text, model_name="gemini-1.5-flash"):
+    """Counts tokens with the model's own tokenizer (an API call; results are memoized per text)."""
+    model = get_gemini_model(model_name)
+    if model is None:
+        raise RuntimeError("Gemini model not available for token counting.")
+    return model.count_tokens(text).total_tokens
+
+# Fallback texts: generate_response returns (and generate_response_stream yields) these instead of raising
+MODEL_UNAVAILABLE_TEXT = "AI Model could not be initialized. Check configuration and API key."
+QUOTA_ERROR_TEXT = "Error: API quota limit reached."
+MODEL_ERROR_TEXT = "An error occurred while contacting the AI model."
+NO_CONTENT_TEXT = "No content was generated by the AI. This might be due to safety filters or an unexpected issue."
+TIMEOUT_ERROR_TEXT = "Error: the AI model took too long to respond." # Async calls only (utils/gemini_async.py)
+BLOCKED_TEXT_PREFIX = "Blocked due to:"
+# Last chunk of generate_response_stream when the stream breaks partway through
+STREAM_INTERRUPTED_MARKER = "\n\n**[Response interrupted: the AI model stopped before finishing. Please try again.]**"
+
+def is_error_response(text):
+    """True if `text` is one of generate_response's fallback texts rather than generated content."""
+    return text in (MODEL_UNAVAILABLE_TEXT, QUOTA_ERROR_TEXT, MODEL_ERROR_TEXT, NO_CONTENT_TEXT, TIMEOUT_ERROR_TEXT) or \
+        text.startswith(BLOCKED_TEXT_PREFIX)
+
+def is_interrupted_response(text):
+    """True if a streamed response broke off partway (it ends with STREAM_INTERRUPTED_MARKER) and is incomplete."""
+    return text.endswith(STREAM_INTERRUPTED_MARKER)
+
+def get_generation_settings(**kwargs):
+    """Returns the generation parameters used by generate_response (also part of the cache key)."""
+    return {
+        "max_output_tokens": kwargs.get('max_output_tokens', 2048),
+        "temperature": kwargs.get('temperature', 0.7), # Default temp
+        "top_p": kwargs.get('top_p', None),
+        "top_k": kwargs.get('top_k', None),
+    }
+
+def generate_response(prompt, model_name="gemini-1.5-flash", use_cache=False, cache_text=None, **kwargs):
+    """Generates a response from the Gemini model with error handling.
+
+    With use_cache=True, successful responses are served from / stored in the response cache.
+    `cache_text` is the text used for matching (defaults to the prompt); pass just the variable part
+    (e.g., the user's question) when the prompt wraps it in a long fixed template; everything else
+    in the prompt must then be fixed or determined by it, since matches are exact on that text."""
+    settings = get_generation_settings(**kwargs)
+    cache = None
+    match_text = cache_text if cache_text is not None else prompt
+    if use_cache:
+        cache = get_response_cache()
+        config_key = make_config_key(model_name, settings)
+        cached_response = cache.get(match_text, config_key)
+        if cached_response is not None:
+            return cached_response
+
     model = get_gemini_model(model_name)
     if not model:
-        return "AI Model could not be initialized. Check configuration and API key."
+        return MODEL_UNAVAILABLE_TEXT
 
     # Basic rate limiting check (example, adjust as needed)
     # last_call_time = st.session_state.get('last_gemini_call', 0)
@@ -77,10 +199,7 @@ def generate_response(prompt, model_name="gemini-1.5-flash", **kwargs):
         generation_config = genai.types.GenerationConfig(
             # candidate_count=1, # Default is 1
             # stop_sequences=['\n'],
-             max_output_tokens=kwargs.get('max_output_tokens', 2048),
-             temperature=kwargs.get('temperature', 0.7), # Default temp
-             top_p=kwargs.get('top_p', None),
-             top_k=kwargs.get('top_k', None),
+            **settings
         )
 
         response = model.generate_content(
@@ -90,38 +209,125 @@ def generate_response(prompt, model_name="gemini-1.5-flash", **kwargs):
             )
 
         # More robust checking of response structure
-        if response.parts:
+        # (.parts raises on a response without candidates, e.g. a blocked prompt, so check those first)
+        if response.candidates and response.parts:
             # Handle potential multi-part responses if necessary, usually just take text
-            return "".join(part.text for part in response.parts if hasattr(part, 'text'))
-        elif response.prompt_feedback and response.prompt_feedback.block_reason:
-            block_reason = response.prompt_feedback.block_reason.name
-            block_message = f"Content blocked due to: {block_reason}."
-            # Optionally include details about ratings if available
-            safety_ratings = response.prompt_feedback.safety_ratings
-            if safety_ratings:
-                 block_message += f" Ratings: { {rating.category.name: rating.probability.name for rating in safety_ratings} }"
-            st.warning(block_message)
-            return f"Blocked due to: {block_reason}. Please adjust your input."
+            text = _response_text(response)
+            if cache and text.strip():
+                # Only successful generations are cached (never blocks or errors)
+                cache.put(match_text, config_key, text)
+            return text
         else:
-            # Handle cases where generation finishes without error but yields no parts (rare)
-            finish_reason = response.candidates[0].finish_reason.name if response.candidates else "UNKNOWN"
-            st.warning(f"No content generated. Finish Reason: {finish_reason}")
-            return "No content was generated by the AI. This might be due to safety filters or an unexpected issue."
+            return _describe_empty_response(response)
 
     except google.api_core.exceptions.ResourceExhausted as e:
          st.error(f"API Quota Exceeded: {e}. Please check your Gemini usage limits or try again later.")
-         return "Error: API quota limit reached."
+         return QUOTA_ERROR_TEXT
     except Exception as e:
         st.error(f"Error generating response from Gemini: {e}")
         # Log the full error for debugging if needed
         # print(f"Gemini Error Traceback: {traceback.format_exc()}")
-        return "An error occurred while contacting the AI model."
+        return MODEL_ERROR_TEXT
+
+def _response_text(response):
+    """Joins the text parts of a (possibly partial/streamed) response."""
+    return "".join(part.text for part in response.parts if hasattr(part, 'text'))
+
+def _describe_empty_response(response, warn=True):
+    """Warns about (on the page, unless warn=False) and explains a response without content (blocked prompt or no parts)."""
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        block_reason = response.prompt_feedback.block_reason.name
+        block_message = f"Content blocked due to: {block_reason}."
+        # Optionally include details about ratings if available
+        safety_ratings = response.prompt_feedback.safety_ratings
+        if safety_ratings:
+             block_message += f" Ratings: { {rating.category.name: rating.probability.name for rating in safety_ratings} }"
+        if warn:
+            st.warning(block_message)
+        return f"{BLOCKED_TEXT_PREFIX} {block_reason}. Please adjust your input."
+    else:
+        # Handle cases where generation finishes without error but yields no parts (rare)
+        finish_reason = response.candidates[0].finish_reason.name if response.candidates else "UNKNOWN"
+        if warn:
+            st.warning(f"No content generated. Finish Reason: {finish_reason}")
+        return NO_CONTENT_TEXT
+
+# --- Streaming ---
+def generate_response_stream(prompt, model_name="gemini-1.5-flash", use_cache=False, cache_text=None, **kwargs):
+    """Streaming variant of generate_response: yields text chunks as Gemini produces them.
+
+    Blocked prompts, empty responses and API errors produce the same warnings and the same
+    fallback text as generate_response (yielded as a single chunk). Cache hits are yielded whole.
+    If the stream breaks after some text, STREAM_INTERRUPTED_MARKER is yielded last (see
+    is_interrupted_response) and the partial text is not cached."""
+    settings = get_generation_settings(**kwargs)
+    cache = None
+    match_text = cache_text if cache_text is not None else prompt
+    if use_cache:
+        cache = get_response_cache()
+        config_key = make_config_key(model_name, settings)
+        cached_response = cache.get(match_text, config_key)
+        if cached_response is not None:
+            yield cached_response
+            return
+
+    model = get_gemini_model(model_name)
+    if not model:
+        yield MODEL_UNAVAILABLE_TEXT
+        return
+
+    streamed = []
+    try:
+        response = model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(**settings),
+            stream=True,
+            )
+        for chunk in response:
+            if chunk.candidates and chunk.parts:
+                text = _response_text(chunk)
+                if text:
+                    streamed.append(text)
+                    yield text
+    except google.api_core.exceptions.ResourceExhausted as e:
+         st.error(f"API Quota Exceeded: {e}. Please check your Gemini usage limits or try again later.")
+         yield QUOTA_ERROR_TEXT
+         return
+    except Exception as e:
+        if streamed:
+            # The stream broke partway through: keep what was shown, but mark it as incomplete
+            st.error(f"Response stream from Gemini was interrupted: {e}")
+            yield STREAM_INTERRUPTED_MARKER
+            return
+        st.error(f"Error generating response from Gemini: {e}")
+        yield MODEL_ERROR_TEXT
+        return
+
+    if not streamed:
+        yield _describe_empty_response(response)
+        return
+    full_text = "".join(streamed)
+    if cache and full_text.strip():
+        cache.put(match_text, config_key, full_text)
+
+def render_stream(chunks, placeholder=None, cursor="▌"):
+    """Renders streamed text chunks incrementally in a Streamlit placeholder and returns the full text.
+
+    The placeholder ends up showing the final text as markdown; callers may replace it with
+    another element (e.g., a text area) once streaming is done."""
+    placeholder = placeholder or st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text + cursor)
+    placeholder.markdown(text)
+    return text
 
 # Example Usage (can be tested independently)
 if __name__ == "__main__":
     # To run this directly:
     # 1. Make sure .env file exists with GEMINI_API_KEY or set it as env var
-    # 2. Run `python utils/gemini.py`
+    # 2. Run `python -m utils.gemini` from the project root
     print("Testing Gemini Connection...")
     test_prompt = "Explain the basic function of an AC expansion valve in one sentence."
     response = generate_response(test_prompt)
@@ -0,0 +1,166 @@
+import os
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import google.generativeai as genai
+import google.api_core.exceptions # For ResourceExhausted (quota) errors
+from .gemini import (
+    get_gemini_model, get_generation_settings, _response_text, _describe_empty_response,
+    MODEL_UNAVAILABLE_TEXT, QUOTA_ERROR_TEXT, MODEL_ERROR_TEXT, TIMEOUT_ERROR_TEXT
+)
+
+# --- Async Gemini Client ---
+# asyncio counterparts to generate_response / query_rag / retrieve_context, so a module can run
+# independent LLM and RAG calls concurrently and gather the results (end-to-end latency ~ the
+# slowest call), plus the per-API-key limiter the HTTP API (api.py) runs its blocking calls under.
+# Each call runs in a worker thread under a process-wide, per-API-key limit on in-flight requests,
+# and the caller stops waiting once the call exceeds its timeout.
+# The async helpers write no Streamlit output (they may run off the script thread): failures come
+# back as the usual fallback texts (utils.gemini.is_error_response) or empty results for the
+# caller to show, and are logged to the console.
+# NOTE: The blocking client calls run in worker threads rather than through the libraries' native
+# async gRPC clients: those bind to the first event loop that uses them. A thread can't be
+# cancelled, so on timeout the caller gets an error immediately but the call keeps running in the
+# background; it holds its per-key slot until it actually finishes, so abandoned calls still count
+# against the limit. The threads come from a process-wide pool rather than the event loop's default
+# executor, so shutting down a loop doesn't wait for abandoned calls.
+DEFAULT_MAX_CONCURRENT_REQUESTS = int(os.getenv("GEMINI_MAX_CONCURRENT_REQUESTS", "8"))
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_REQUEST_TIMEOUT_SECONDS", "60"))
+BLOCKING_CALL_WORKERS = int(os.getenv("GEMINI_BLOCKING_CALL_WORKERS", "32"))
+
+_blocking_executor = None
+_blocking_executor_lock = threading.Lock()
+
+def get_blocking_executor():
+    """Returns the process-wide thread pool for blocking client calls (created on first use)."""
+    global _blocking_executor
+    with _blocking_executor_lock:
+        if _blocking_executor is None:
+            _blocking_executor = ThreadPoolExecutor(
+                max_workers=max(BLOCKING_CALL_WORKERS, DEFAULT_MAX_CONCURRENT_REQUESTS), thread_name_prefix="gemini-call"
+            )
+        return _blocking_executor
+
+class KeyConcurrencyLimiter:
+    """Process-wide limit on in-flight requests for one API key, usable from any event loop.
+
+    Streamlit sessions each run their own event loop (asyncio.run per script run), so a plain
+    asyncio.Semaphore can't be shared between them; this wraps a thread-safe semaphore instead."""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    async def acquire(self):
+        delay = 0.005
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def release(self):
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    async def run(self, fn, *args, timeout=DEFAULT_TIMEOUT_SECONDS, **kwargs):
+        """Runs blocking fn(*args, **kwargs) in a worker thread under a slot of this limiter.
+
+        Raises asyncio.TimeoutError if it takes longer than `timeout`. The slot is released when the
+        thread finishes (not when the caller gives up), so a timed-out call keeps its slot until then."""
+        await self.acquire()
+        try:
+            future = get_blocking_executor().submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release()) # Runs on the worker thread (or here if cancelled before starting)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_key_limiter(api_key=None, max_concurrent=DEFAULT_MAX_CONCURRENT_REQUESTS):
+    """Returns the shared limiter for an API key (defaults to the configured GEMINI_API_KEY)."""
+    api_key = api_key or os.getenv("GEMINI_API_KEY") or "default"
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = KeyConcurrencyLimiter(max_concurrent)
+            _limiters[api_key] = limiter
+        return limiter
+
+async def generate_response_async(prompt, model_name="gemini-1.5-flash", timeout=DEFAULT_TIMEOUT_SECONDS, **kwargs):
+    """Async generate_response (without the response cache): returns the text or a fallback text,
+    TIMEOUT_ERROR_TEXT if the call takes longer than `timeout`."""
+    model = get_gemini_model(model_name)
+    if not model:
+        return MODEL_UNAVAILABLE_TEXT
+    try:
+        generation_config = genai.types.GenerationConfig(**get_generation_settings(**kwargs))
+        response = await get_key_limiter().run(model.generate_content, prompt, generation_config=generation_config,
+                                               timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"Gemini request timed out after {timeout:g}s; its result is discarded.") # Log to console
+        return TIMEOUT_ERROR_TEXT
+    except google.api_core.exceptions.ResourceExhausted as e:
+        print(f"Gemini API quota exceeded: {e}") # Log to console
+        return QUOTA_ERROR_TEXT
+    except Exception as e:
+        print(f"Error generating response from Gemini: {e}") # Log to console
+        return MODEL_ERROR_TEXT
+    if response.candidates and response.parts:
+        return _response_text(response)
+    return _describe_empty_response(response, warn=False)
+
+async def query_rag_async(qa_chain, query, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """Async query_rag (without the answer cache): returns (answer, source_documents); errors come back as
+    an "Error: ..." answer with no sources."""
+    if not qa_chain:
+        return "Error: RAG system not available.", []
+    try:
+        response = await get_key_limiter().run(qa_chain.invoke, {"query": query}, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"RAG query timed out after {timeout:g}s; its result is discarded.") # Log to console
+        return "Error: the knowledge base search took too long.", []
+    except Exception as e:
+        print(f"Error during RAG query: {e}") # Log to console
+        return f"Error: the knowledge base search failed ({e}).", []
+    answer = response.get("result", "No answer could be generated.")
+    if not answer.strip():
+        answer = "The AI generated an empty response, possibly due to filtering or lack of relevant information in the retrieved documents."
+    return answer, response.get("source_documents", [])
+
+async def retrieve_context_async(rag_id, query, k=4, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """Async retrieve_context: returns (Document, score) pairs for `query` without an LLM call ([] on error or timeout)."""
+    from .rag import retrieve_context # Imported lazily: pulls in LangChain/Chroma
+    try:
+        return await get_key_limiter().run(retrieve_context, rag_id, query, k, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"Knowledge base lookup in '{rag_id}' timed out after {timeout:g}s.") # Log to console
+        return []
+
+async def gather_with_concurrency(limit, *awaitables):
+    """Awaits all awaitables with at most `limit` running at once; results keep the input order."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(run(a) for a in awaitables))
+
+def run_concurrently(*awaitables, limit=None):
+    """Runs independent coroutines concurrently from synchronous (Streamlit) code and returns their results in order.
+
+    Example: answer, summary = run_concurrently(query_rag_async(chain, q), generate_response_async(p))"""
+    async def main():
+        if limit:
+            return await gather_with_concurrency(limit, *awaitables)
+        return await asyncio.gather(*awaitables)
+    return asyncio.run(main())
@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .bootstrap import bootstrap, is_ready
+
+# --- Background Indexing Jobs ---
+# Indexing (load -> split -> embed -> keyword index) runs on a process-owned worker pool instead of
+# inside the Streamlit script run, so the page stays responsive and a browser refresh does not
+# abort it. Each job has a record persisted to `cache/index_jobs/<job_id>.json`:
+#   status: "queued" -> "running" -> "done" | "failed" ("interrupted" if the process stopped mid-job,
+#           "superseded" if a full re-index replaced it before it started)
+#   stages: per-stage start time and duration; counts: the latest progress counters;
+#   messages: the most recent report messages; error: the failure reason.
+# Jobs for the same context run one at a time: while one is in the pool, later ones wait in a
+# per-context queue (not in a pool worker, so they never starve other contexts) and each finished
+# job submits the next. Submitting a job that is already
+# queued (same kind and arguments) returns the queued job instead of adding another; a full re-index
+# replaces the context's queued jobs, and any job submitted while a full re-index is queued is
+# covered by it. Other jobs queue behind the context's current one.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_JOBS_DIR = os.path.join(PROJECT_ROOT, "cache", "index_jobs")
+DEFAULT_JOB_WORKERS = int(os.getenv("RAG_INDEX_JOB_WORKERS", "2"))
+MAX_JOB_MESSAGES = 50
+MAX_STORED_JOBS = 200
+SAVE_INTERVAL_SECONDS = 1.0
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_INTERRUPTED = "interrupted"
+STATUS_SUPERSEDED = "superseded"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+class IndexJob:
+    """One indexing job; `report` is the progress callback handed to the indexing functions."""
+
+    def __init__(self, rag_id, kind, args=None, full=False, record=None):
+        self.record = record or {
+            "id": uuid.uuid4().hex[:12], "rag_id": rag_id, "kind": kind, "args": args or {}, "full": full,
+            "status": STATUS_QUEUED,
+            "created": time.time(), "started": None, "finished": None, "duration_s": None,
+            "current_stage": None, "stages": [], "counts": {}, "progress": "", "messages": [], "error": None,
+        }
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @property
+    def id(self):
+        return self.record["id"]
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.record))
+
+    def report(self, level, message="", **details):
+        """Reporter for the indexing pipeline (see utils.rag.streamlit_reporter for the levels)."""
+        now = time.time()
+        with self._lock:
+            record = self.record
+            if level == "stage":
+                self._close_stage(now)
+                record["current_stage"] = details.get("stage")
+                record["stages"].append({"name": details.get("stage"), "started": now, "duration_s": None})
+            else:
+                record["counts"].update(details)
+                if level == "progress":
+                    record["progress"] = message
+                elif message:
+                    record["messages"].append({"level": level, "message": message, "time": now})
+                    del record["messages"][:-MAX_JOB_MESSAGES]
+        self.maybe_save()
+
+    def _close_stage(self, now):
+        stages = self.record["stages"]
+        if stages and stages[-1]["duration_s"] is None:
+            stages[-1]["duration_s"] = round(now - stages[-1]["started"], 3)
+
+    def set_status(self, status, error=None, only_from=None):
+        """Sets the job status; with `only_from`, only if the job currently has that status. Returns whether it changed."""
+        now = time.time()
+        with self._lock:
+            record = self.record
+            if only_from is not None and record["status"] != only_from:
+                return False
+            record["status"] = status
+            if status == STATUS_RUNNING:
+                record["started"] = now
+            elif status not in ACTIVE_STATUSES:
+                self._close_stage(now)
+                record["current_stage"] = None
+                record["finished"] = now
+                record["duration_s"] = round(now - (record["started"] or now), 3)
+                record["error"] = error
+        self.save()
+        return True
+
+    # --- Persistence ---
+    def save(self):
+        snapshot = self.snapshot()
+        self._last_save = time.time()
+        os.makedirs(INDEX_JOBS_DIR, exist_ok=True)
+        path = os.path.join(INDEX_JOBS_DIR, f"{self.id}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def maybe_save(self):
+        """Saves at most every SAVE_INTERVAL_SECONDS (status changes always save)."""
+        if time.time() - self._last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+# --- Process-wide Job Queue ---
+_jobs_lock = threading.Lock()
+_jobs = {}          # job_id -> IndexJob (this process)
+_context_queues = {} # rag_id -> deque of (job, fn) waiting; present while that context has a job in the pool
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DEFAULT_JOB_WORKERS, thread_name_prefix="index-job")
+        atexit.register(_shutdown)
+    return _executor
+
+def _shutdown():
+    """Marks jobs that cannot finish as interrupted (their ingest checkpoints allow resuming)."""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    for job in jobs:
+        if job.record["status"] in ACTIVE_STATUSES:
+            job.set_status(STATUS_INTERRUPTED, error="The app stopped before the job finished. Re-run it to resume.")
+
+def _run_job(job, fn):
+    try:
+        _execute_job(job, fn)
+    finally:
+        _submit_next(job.record["rag_id"])
+
+def _execute_job(job, fn):
+    if not job.set_status(STATUS_RUNNING, only_from=STATUS_QUEUED):
+        return # Superseded while it waited
+    try:
+        if not is_ready():
+            bootstrap(warm=False) # e.g. jobs submitted from a script rather than the app
+        result = fn(job.report)
+    except Exception as e:
+        traceback.print_exc()
+        job.set_status(STATUS_FAILED, error=str(e))
+        return
+    if result:
+        job.set_status(STATUS_DONE)
+    else:
+        errors = [m["message"] for m in job.record["messages"] if m["level"] == "error"]
+        job.set_status(STATUS_FAILED, error=errors[-1] if errors else "Indexing did not produce a vector store.")
+
+def _submit_next(rag_id):
+    """Hands the context's next waiting job to the pool, or marks the context idle."""
+    with _jobs_lock:
+        waiting = _context_queues.get(rag_id)
+        if not waiting:
+            _context_queues.pop(rag_id, None)
+            return
+        job, fn = waiting.popleft()
+    _get_executor().submit(_run_job, job, fn)
+
+def submit_index_job(rag_id, kind, fn, args=None, full=False):
+    """Queues `fn(report)` as an indexing job for `rag_id` and returns the job record.
+
+    `fn` returns a truthy value on success. `args` (JSON-serializable) describes what the job
+    indexes, e.g. {"filenames": [...]}; `full` marks a full re-index, which covers every document
+    of the context. Instead of adding a job, the record of a queued job is returned if it has the
+    same kind and args, or if it is a full re-index (both read the documents when they start).
+    A new full re-index supersedes the context's queued jobs; other jobs run after them."""
+    args = json.loads(json.dumps(args or {}, sort_keys=True))
+    with _jobs_lock:
+        queued = [job for job in _jobs.values()
+                  if job.record["rag_id"] == rag_id and job.record["status"] == STATUS_QUEUED]
+        for job in queued:
+            if job.record["full"] or (job.record["kind"] == kind and job.record["args"] == args):
+                return job.snapshot()
+        job = IndexJob(rag_id, kind, args=args, full=full)
+        _jobs[job.id] = job
+        for old_job in queued if full else []:
+            if old_job.set_status(STATUS_SUPERSEDED, only_from=STATUS_QUEUED): # Unless it just started
+                old_job.report("info", f"Replaced by full re-index job {job.id}.")
+                old_job.save()
+        # Superseded jobs stay in the context queue and are skipped when their turn comes
+        waiting = _context_queues.get(rag_id)
+        if waiting is not None:
+            waiting.append((job, fn))
+        else:
+            _context_queues[rag_id] = deque()
+    job.save()
+    if waiting is None:
+        _get_executor().submit(_run_job, job, fn)
+    return job.snapshot()
+
+def get_job(job_id):
+    """Returns a job record (live for this process's jobs, from disk otherwise) or None."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job.snapshot()
+    return _load_record(os.path.join(INDEX_JOBS_DIR, f"{job_id}.json"))
+
+def _load_record(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _jobs_lock:
+        live = record.get("id") in _jobs
+    if not live and record.get("status") in ACTIVE_STATUSES:
+        # Written by a process that is gone
+        record["status"] = STATUS_INTERRUPTED
+    return record
+
+def list_jobs(rag_id=None, limit=20):
+    """Returns the most recent job records (newest first), optionally for one context."""
+    with _jobs_lock:
+        live = {job_id: job.snapshot() for job_id, job in _jobs.items()}
+    records = dict(live)
+    if os.path.isdir(INDEX_JOBS_DIR):
+        for filename in os.listdir(INDEX_JOBS_DIR):
+            job_id, ext = os.path.splitext(filename)
+            if ext == ".json" and job_id not in records:
+                record = _load_record(os.path.join(INDEX_JOBS_DIR, filename))
+                if record:
+                    records[job_id] = record
+    selected = [r for r in records.values() if rag_id is None or r["rag_id"] == rag_id]
+    selected.sort(key=lambda r: r["created"], reverse=True)
+    _prune_records(records)
+    return selected[:limit]
+
+def _prune_records(records):
+    """Keeps at most MAX_STORED_JOBS finished job files on disk."""
+    finished = sorted((r for r in records.values() if r["status"] not in ACTIVE_STATUSES),
+                      key=lambda r: r["created"], reverse=True)
+    for record in finished[MAX_STORED_JOBS:]:
+        try:
+            os.remove(os.path.join(INDEX_JOBS_DIR, f"{record['id']}.json"))
+        except OSError:
+            pass
+
+def active_job(rag_id):
+    """Returns the queued/running job record for `rag_id` in this process, or None."""
+    with _jobs_lock:
+        jobs = [job.snapshot() for job in _jobs.values() if job.record["rag_id"] == rag_id]
+    active = [r for r in jobs if r["status"] in ACTIVE_STATUSES]
+    return max(active, key=lambda r: r["created"]) if active else None
@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+import threading
+
+# --- Index Manifest ---
+# Each indexed context keeps a manifest (next to its vector store) recording, per source file,
+# its size, mtime, content hash and the IDs of the chunks it produced. Incremental indexing
+# diffs the document folder against the manifest, so only new/changed files are re-chunked
+# and only the chunk IDs of changed/removed files are deleted from the store.
+MANIFEST_FILENAME = "index_manifest.json"
+MANIFEST_VERSION = 1
+
+def get_manifest_path(persist_directory):
+    """Returns the manifest file path for a vector store directory."""
+    return os.path.join(persist_directory, MANIFEST_FILENAME)
+
+def load_manifest(persist_directory):
+    """Loads a context's manifest, or returns None if it is missing/unreadable."""
+    manifest_path = get_manifest_path(persist_directory)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or "files" not in manifest:
+        return None
+    return manifest
+
+def save_manifest(persist_directory, manifest):
+    """Writes the manifest atomically (write to a temp file, then replace)."""
+    os.makedirs(persist_directory, exist_ok=True)
+    manifest_path = get_manifest_path(persist_directory)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def new_manifest(rag_id, embedding_model):
+    """Returns an empty manifest for a context."""
+    return {"version": MANIFEST_VERSION, "rag_id": rag_id, "embedding_model": embedding_model, "files": {}}
+
+def hash_file(filepath, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def list_document_files(doc_path):
+    """Lists the (non-hidden) files in a context's document folder."""
+    if not os.path.isdir(doc_path):
+        return []
+    return sorted(
+        f for f in os.listdir(doc_path)
+        if os.path.isfile(os.path.join(doc_path, f)) and not f.startswith('.')
+    )
+
+def scan_files(doc_path, filenames=None, previous_entries=None):
+    """Returns {filename: {size, mtime, sha256}} for the files in a document folder.
+
+    Files whose size and mtime match the previous manifest entry reuse its hash instead of re-reading."""
+    previous_entries = previous_entries or {}
+    names = list_document_files(doc_path) if filenames is None else filenames
+    entries = {}
+    for filename in names:
+        filepath = os.path.join(doc_path, filename)
+        if not os.path.isfile(filepath):
+            continue
+        stat = os.stat(filepath)
+        previous = previous_entries.get(filename)
+        if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+            sha256 = previous["sha256"]
+        else:
+            sha256 = hash_file(filepath)
+        entries[filename] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+    return entries
+
+def diff_manifest(previous_entries, current_entries, filenames=None):
+    """Compares scanned files to the manifest.
+
+    Returns (added, changed, removed) filename lists. When `filenames` is given, only those
+    files are considered, so files outside the scope are never reported as removed."""
+    scope = set(current_entries) | (set(previous_entries) if filenames is None else set(filenames))
+    added, changed, removed = [], [], []
+    for filename in sorted(scope):
+        previous = previous_entries.get(filename)
+        current = current_entries.get(filename)
+        if current is None:
+            if previous is not None:
+                removed.append(filename)
+        elif previous is None:
+            added.append(filename)
+        elif previous.get("sha256") != current["sha256"]:
+            changed.append(filename)
+    return added, changed, removed
+
+def make_chunk_ids(filename, sha256, count):
+    """Returns deterministic chunk IDs for the chunks of one file version."""
+    return [f"{filename}:{sha256[:16]}:{i}" for i in range(count)]
+
+# --- Index Versions ---
+# A persistent, per-context counter that is bumped whenever a context's index is written or deleted.
+# Anything derived from an index (e.g., cached RAG answers) records the version it was built from,
+# and is ignored once the version moves on. Unlike the in-process registry generation in utils/rag.py,
+# it survives restarts.
+INDEX_VERSIONS_FILENAME = "index_versions.json"
+_index_versions_lock = threading.Lock()
+
+def _index_versions_path(base_directory):
+    return os.path.join(base_directory, INDEX_VERSIONS_FILENAME)
+
+def load_index_versions(base_directory):
+    """Returns {rag_id: version} (empty if no index has been written yet)."""
+    path = _index_versions_path(base_directory)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_index_version(base_directory, rag_id):
+    return load_index_versions(base_directory).get(rag_id, 0)
+
+def bump_index_version(base_directory, rag_id):
+    """Increments and persists a context's index version. Returns the new version."""
+    with _index_versions_lock:
+        versions = load_index_versions(base_directory)
+        versions[rag_id] = versions.get(rag_id, 0) + 1
+        os.makedirs(base_directory, exist_ok=True)
+        path = _index_versions_path(base_directory)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(versions, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        return versions[rag_id]
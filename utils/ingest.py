@@ -0,0 +1,203 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .rate_limit import TokenBucket, retry_with_backoff
+
+# --- Embedding Ingestion Stage ---
+# Embeds chunks in explicit batches with a bounded number of embedding calls in flight,
+# a token-bucket rate limit and exponential backoff on quota errors (ResourceExhausted / 429).
+# Finished batches are written to the store and recorded in a checkpoint file, so an interrupted
+# run resumes where it stopped instead of re-embedding everything.
+# The stage only needs an `embed_documents(texts)` callable and a `write_batch(...)` callable,
+# so it can be exercised with a local fake embedding function (see tests/test_ingest.py).
+DEFAULT_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "100"))         # Gemini batch embed limit
+DEFAULT_EMBED_MAX_CONCURRENCY = int(os.getenv("RAG_EMBED_MAX_CONCURRENCY", "4")) # Embedding calls in flight
+DEFAULT_EMBED_RATE_PER_MINUTE = float(os.getenv("RAG_EMBED_RATE_PER_MINUTE", "120")) # Batch calls per minute
+CHECKPOINT_FILENAME = "ingest_checkpoint.jsonl"
+
+class IngestCheckpoint:
+    """Append-only record of chunk IDs that have been embedded and written to the store."""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CHECKPOINT_FILENAME)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Returns the set of chunk IDs completed by previous (interrupted) runs."""
+        completed = set()
+        if not self.exists():
+            return completed
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    completed.update(json.loads(line))
+                except ValueError:
+                    break # Partially written last line from an interrupted run
+        return completed
+
+    def record(self, ids):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(list(ids)) + "\n")
+
+    def clear(self):
+        if self.exists():
+            os.remove(self.path)
+
+class IngestStats:
+    """Counters reported by ingest_chunks()."""
+
+    def __init__(self):
+        self.written = 0   # Chunks embedded and written in this run
+        self.skipped = 0   # Chunks already completed by a previous run (checkpoint)
+        self.batches = 0
+        self.retries = 0
+
+    @property
+    def total(self):
+        return self.written + self.skipped
+
+def chroma_batch_writer(vector_store):
+    """Returns a write_batch callable that upserts pre-computed embeddings into a LangChain Chroma store."""
+    def write_batch(ids, texts, metadatas, embeddings):
+        # Chroma's public add_documents() would embed again; upsert the vectors we already have
+        vector_store._collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+    return write_batch
+
+def numpy_batch_writer(vector_store):
+    """Returns a deferred write_batch callable for a NumpyVectorStore.
+
+    Batches are buffered in the store and written when vector_store.flush_due() (the store file at
+    least doubles per write), so a bulk load does not rewrite the whole store per batch. It returns
+    the IDs each call made durable, and write_batch.flush() writes (and returns) the rest."""
+    buffered = []
+
+    def flush():
+        vector_store.flush()
+        durable = list(buffered)
+        buffered.clear()
+        return durable
+
+    def write_batch(ids, texts, metadatas, embeddings):
+        vector_store.upsert_embeddings(ids, embeddings, texts, metadatas, flush=False)
+        buffered.extend(ids)
+        return flush() if vector_store.flush_due() else []
+
+    write_batch.flush = flush
+    return write_batch
+
+def vector_store_batch_writer(vector_store):
+    """Returns the write_batch callable for a LangChain vector store (Chroma or NumpyVectorStore)."""
+    if hasattr(vector_store, "upsert_embeddings"):
+        return numpy_batch_writer(vector_store)
+    return chroma_batch_writer(vector_store)
+
+def _iter_batches(chunks_with_ids, batch_size, completed_ids, stats):
+    batch = []
+    for chunk, chunk_id in chunks_with_ids:
+        if chunk_id in completed_ids:
+            stats.skipped += 1
+            continue
+        batch.append((chunk, chunk_id))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_chunks(chunks_with_ids, embed_documents, write_batch, checkpoint=None,
+                  batch_size=DEFAULT_EMBED_BATCH_SIZE, max_concurrency=DEFAULT_EMBED_MAX_CONCURRENCY,
+                  rate_per_minute=DEFAULT_EMBED_RATE_PER_MINUTE, max_retries=6, on_progress=None, on_retry=None):
+    """Embeds and writes an iterable of (Document, chunk_id) pairs.
+
+    - `embed_documents(texts) -> list[vector]` runs on a thread pool, at most `max_concurrency` at once,
+      each call taking a token from a `rate_per_minute` bucket and retrying quota errors with backoff.
+    - `write_batch(ids, texts, metadatas, embeddings)` runs on the calling thread, one batch at a time.
+      It returns None once the batch is stored; a deferred writer instead returns the IDs this call
+      made durable and has a `flush()` that writes and returns the rest (run when all batches are in).
+      Only durable IDs are checkpointed, so a resumed run re-embeds anything that was still buffered.
+    - `on_progress(stats)` / `on_retry(attempt, delay, error)` are optional callbacks; on_progress runs on the calling thread.
+    Chunks recorded in `checkpoint` are skipped. Returns an IngestStats."""
+    stats = IngestStats()
+    completed_ids = checkpoint.load() if checkpoint else set()
+    bucket = TokenBucket(rate_per_minute, capacity=max_concurrency)
+    retry_lock = threading.Lock()
+
+    def retry_callback(attempt, delay, error):
+        with retry_lock: # Runs on worker threads
+            stats.retries += 1
+        if on_retry:
+            on_retry(attempt, delay, error)
+
+    def embed_batch(batch):
+        texts = [chunk.page_content for chunk, _ in batch]
+        bucket.acquire()
+        # NOTE: on_retry runs on the worker thread; keep it thread-safe (no Streamlit calls)
+        vectors = retry_with_backoff(embed_documents, texts, max_retries=max_retries, on_retry=retry_callback)
+        return batch, vectors
+
+    batches = _iter_batches(chunks_with_ids, batch_size, completed_ids, stats)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        in_flight = set()
+        for batch in batches:
+            in_flight.add(executor.submit(embed_batch, batch))
+            if len(in_flight) >= max_concurrency:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, vectors = future.result() # Re-raises once retries are exhausted
+                ids = [chunk_id for _, chunk_id in batch]
+                durable = write_batch(ids, [chunk.page_content for chunk, _ in batch], [chunk.metadata for chunk, _ in batch], vectors)
+                if checkpoint:
+                    _record_durable(checkpoint, ids if durable is None else durable)
+                stats.written += len(batch)
+                stats.batches += 1
+                if on_progress:
+                    on_progress(stats)
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    in_flight.add(executor.submit(embed_batch, next_batch))
+    flush = getattr(write_batch, "flush", None)
+    if flush:
+        durable = flush()
+        if checkpoint:
+            _record_durable(checkpoint, durable)
+    return stats
+
+def _record_durable(checkpoint, ids):
+    if ids:
+        checkpoint.record(ids)
+
+# Example Usage (can be tested independently, no API key needed)
+if __name__ == "__main__":
+    # Run `python -m utils.ingest` from the project root to exercise batching, backoff and resume.
+    import tempfile
+    from langchain_core.documents import Document
+
+    class FakeQuotaError(Exception):
+        def __str__(self):
+            return "429 ResourceExhausted: fake quota"
+
+    calls = {"count": 0}
+    def fake_embed_documents(texts):
+        calls["count"] += 1
+        if calls["count"] % 5 == 0:
+            raise FakeQuotaError()
+        return [[float(len(text)), 1.0] for text in texts]
+
+    store = {}
+    def memory_writer(ids, texts, metadatas, embeddings):
+        store.update(zip(ids, embeddings))
+
+    chunks = [(Document(page_content=f"chunk {i}"), f"doc.txt:abc:{i}") for i in range(1000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = IngestCheckpoint(tmp)
+        checkpoint.record([chunk_id for _, chunk_id in chunks[:300]]) # Pretend a previous run stopped here
+        stats = ingest_chunks(chunks, fake_embed_documents, memory_writer, checkpoint=checkpoint,
+                              batch_size=50, max_concurrency=4, rate_per_minute=6000)
+        print(f"Written: {stats.written}, skipped (resumed): {stats.skipped}, batches: {stats.batches}, retries: {stats.retries}")
+        print(f"Checkpointed IDs: {len(checkpoint.load())}")
@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+
+# --- BM25 Lexical Index ---
+# A small persistent inverted index over the same chunks that are stored in a context's vector
+# store. Part numbers (CAP-DR-4505-440) and error codes (E10) are matched exactly here, where
+# embedding similarity tends to rank them poorly, and lexical search needs no embedding API call.
+LEXICAL_INDEX_FILENAME = "bm25_index.json"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_IDENTIFIER_PATTERN = re.compile(r"^(?=.*\d)(?=.*[a-z])[a-z0-9]+(?:[-_./][a-z0-9]+)*$") # Letters + digits
+
+def tokenize(text):
+    """Lowercases and splits text into terms.
+
+    Compound identifiers are kept whole *and* split into parts, so 'CAP-DR-4505-440' matches both
+    the exact part number and a partial query like '4505'."""
+    terms = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        terms.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+def identifier_terms(query):
+    """Returns the identifier-like terms in a query (part numbers, model numbers, error codes such as 'E10')."""
+    return [token for token in _TOKEN_PATTERN.findall((query or "").lower()) if _IDENTIFIER_PATTERN.match(token)]
+
+class BM25Index:
+    """In-memory BM25 (Okapi) index with JSON persistence, keyed by chunk ID."""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}      # chunk_id -> {"text": str, "metadata": dict}
+        self._tf = {}       # chunk_id -> Counter(term -> count)
+        self._lengths = {}  # chunk_id -> number of terms
+        self._postings = {} # term -> set(chunk_id)
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, ids, texts, metadatas=None):
+        """Adds (or replaces) chunks."""
+        metadatas = metadatas or [{} for _ in ids]
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            if chunk_id in self.docs:
+                self.remove([chunk_id])
+            tf = Counter(tokenize(text))
+            self.docs[chunk_id] = {"text": text, "metadata": metadata or {}}
+            self._tf[chunk_id] = tf
+            self._lengths[chunk_id] = sum(tf.values())
+            self._total_length += self._lengths[chunk_id]
+            for term in tf:
+                self._postings.setdefault(term, set()).add(chunk_id)
+
+    def remove(self, ids):
+        """Removes chunks by ID (unknown IDs are ignored)."""
+        for chunk_id in ids:
+            if chunk_id not in self.docs:
+                continue
+            for term in self._tf[chunk_id]:
+                postings = self._postings.get(term)
+                if postings:
+                    postings.discard(chunk_id)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._lengths.pop(chunk_id)
+            del self._tf[chunk_id]
+            del self.docs[chunk_id]
+
+    def has_term(self, term):
+        return term in self._postings
+
+    def search(self, query, k=4):
+        """Returns up to k (chunk_id, bm25_score) pairs, best first."""
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = self._total_length / n_docs or 1.0
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id in postings:
+                tf = self._tf[chunk_id][term]
+                norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+        return scores.most_common(k)
+
+    # --- Persistence ---
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self.docs}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads an index saved with save(). Term statistics are rebuilt from the stored text."""
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        index = cls(k1=stored.get("k1", 1.5), b=stored.get("b", 0.75))
+        docs = stored.get("docs", {})
+        index.add(list(docs), [doc["text"] for doc in docs.values()], [doc["metadata"] for doc in docs.values()])
+        return index
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """Fuses several ranked lists of keys with RRF. Returns [(key, fused_score)], best first."""
+    scores = Counter()
+    for ranked in ranked_lists:
+        for rank, key in enumerate(ranked):
+            scores[key] += 1.0 / (k + rank + 1)
+    return scores.most_common()
@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import argparse
+from .bootstrap import ensure_sqlite
+ensure_sqlite() # Before chromadb is imported
+import chromadb
+from .storage_layout import (
+    get_collection_name, get_per_context_directory, get_consolidated_context_directory,
+    list_per_context_stores, CONSOLIDATED_CHROMA_DIR, PER_CONTEXT_COLLECTION_NAME
+)
+from .index_manifest import MANIFEST_FILENAME
+from .lexical_index import LEXICAL_INDEX_FILENAME
+from .ingest import CHECKPOINT_FILENAME
+
+# --- Vector Store Migration ---
+# Copies per-context stores (`vector_store/<rag_id>_chroma`) into the consolidated store
+# (one Chroma client, one collection per context). Stored embeddings are copied as-is, so no
+# embedding API calls are made. Re-running is safe (records are upserted by ID).
+#
+# Usage (from the project root):
+#   python -m utils.migrate_vector_store                 # migrate every context
+#   python -m utils.migrate_vector_store --rag-id tech_manuals --remove-source
+# Then start the app with RAG_STORAGE_LAYOUT=consolidated.
+DEFAULT_BATCH_SIZE = 500
+SIDE_FILES = (MANIFEST_FILENAME, LEXICAL_INDEX_FILENAME)
+
+def migrate_context(rag_id, dest_client, batch_size=DEFAULT_BATCH_SIZE, remove_source=False):
+    """Migrates one context. Returns the number of records copied."""
+    source_directory = get_per_context_directory(rag_id)
+    if os.path.exists(os.path.join(source_directory, CHECKPOINT_FILENAME)):
+        print(f"  ! '{rag_id}' has an unfinished indexing run; the copy contains only the chunks written so far.")
+    source_collection = chromadb.PersistentClient(path=source_directory).get_collection(PER_CONTEXT_COLLECTION_NAME)
+    # Keep the source's collection metadata (e.g. the 'hnsw:space' distance function)
+    dest_collection = dest_client.get_or_create_collection(
+        get_collection_name(rag_id), metadata=source_collection.metadata or None
+    )
+
+    copied, offset = 0, 0
+    total = source_collection.count()
+    while offset < total:
+        batch = source_collection.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        dest_collection.upsert(
+            ids=batch["ids"], embeddings=batch["embeddings"],
+            documents=batch["documents"], metadatas=batch["metadatas"]
+        )
+        copied += len(batch["ids"])
+        offset += batch_size
+        print(f"  {rag_id}: {copied}/{total} record(s) copied")
+
+    context_directory = get_consolidated_context_directory(rag_id)
+    os.makedirs(context_directory, exist_ok=True)
+    for filename in SIDE_FILES:
+        source_file = os.path.join(source_directory, filename)
+        if os.path.exists(source_file):
+            shutil.copy2(source_file, os.path.join(context_directory, filename))
+
+    if dest_collection.count() < total:
+        raise RuntimeError(f"'{rag_id}': expected {total} record(s) in the consolidated store, found {dest_collection.count()}.")
+    if remove_source:
+        shutil.rmtree(source_directory)
+        print(f"  Removed {source_directory}")
+    return copied
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate per-context Chroma stores into the consolidated store.")
+    parser.add_argument("--rag-id", action="append", help="Context to migrate (repeatable). Default: all.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--remove-source", action="store_true", help="Delete each per-context directory after a verified copy.")
+    args = parser.parse_args(argv)
+
+    rag_ids = args.rag_id or list_per_context_stores()
+    if not rag_ids:
+        print("No per-context vector stores found.")
+        return 0
+
+    os.makedirs(CONSOLIDATED_CHROMA_DIR, exist_ok=True)
+    dest_client = chromadb.PersistentClient(path=CONSOLIDATED_CHROMA_DIR)
+    failures = 0
+    for rag_id in rag_ids:
+        print(f"Migrating '{rag_id}'...")
+        try:
+            copied = migrate_context(rag_id, dest_client, batch_size=args.batch_size, remove_source=args.remove_source)
+            print(f"  Done: {copied} record(s) in collection '{get_collection_name(rag_id)}'.")
+        except Exception as e:
+            failures += 1
+            print(f"  Failed to migrate '{rag_id}': {e}")
+
+    print(f"Consolidated store: {CONSOLIDATED_CHROMA_DIR}")
+    print("Set RAG_STORAGE_LAYOUT=consolidated to use it.")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
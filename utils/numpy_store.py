@@ -0,0 +1,350 @@
+import os
+import json
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# --- NumPy Vector Store ---
+# An in-process alternative to Chroma for small corpora (a few thousand chunks per context).
+# Files in the store directory:
+#   embeddings.npy        float32 [N, D] L2-normalized rows, opened memory-mapped (cold open reads no vectors)
+#   embeddings_int8.npy   int8 [N, D] + scales.npy float32 [N], instead of the float32 matrix in int8 mode
+#   records.json          columnar {"ids": [...], "documents": [...], "metadatas": [...]}
+#   numpy_store.json      store info (format version, quantization, dimension)
+# Search is a single matrix-vector (or matrix-matrix for batches) dot product plus an argpartition top-k.
+# Scores are cosine similarities; like Chroma, the *_with_score methods return distances (1 - cosine).
+# Writes rewrite the files atomically. Bulk loads pass flush=False to upsert_embeddings: rows are
+# appended to a growable in-memory buffer and written once by flush() (see flush_due() for a
+# schedule that keeps the total write cost linear), instead of rewriting every file per batch.
+EMBEDDINGS_FILENAME = "embeddings.npy"
+QUANTIZED_FILENAME = "embeddings_int8.npy"
+SCALES_FILENAME = "scales.npy"
+RECORDS_FILENAME = "records.json"
+STORE_INFO_FILENAME = "numpy_store.json"
+STORE_FORMAT_VERSION = 1
+QUANTIZATION_NONE = "none"
+QUANTIZATION_INT8 = "int8"
+DEFAULT_QUANTIZATION = os.getenv("RAG_NUMPY_QUANTIZATION", QUANTIZATION_NONE)
+INT8_SEARCH_BLOCK_ROWS = 8192 # int8 rows are upcast per block, bounding the temporary float32 copy
+MIN_FLUSH_ROWS = 1000 # flush_due(): smallest number of buffered rows worth a rewrite
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _quantize_rows(vectors):
+    """Symmetric per-row int8 quantization: row ~= q * scale."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+def _save_npy_atomic(path, array):
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def _save_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+class NumpyVectorStore(VectorStore):
+    """LangChain VectorStore over memory-mapped NumPy embeddings (optionally int8-quantized)."""
+
+    def __init__(self, directory, embedding_function=None, quantization=None):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self._lock = threading.RLock()
+        info = self._read_info()
+        self.quantization = info["quantization"] if info else (quantization or DEFAULT_QUANTIZATION)
+        if self.quantization not in (QUANTIZATION_NONE, QUANTIZATION_INT8):
+            raise ValueError(f"Unknown quantization '{self.quantization}'. Use '{QUANTIZATION_NONE}' or '{QUANTIZATION_INT8}'.")
+        self._load()
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, STORE_INFO_FILENAME))
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- Loading / Persistence ---
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _read_info(self):
+        if not self.exists(self.directory):
+            return None
+        with open(self._path(STORE_INFO_FILENAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load(self):
+        self._ids, self._documents, self._metadatas = [], [], []
+        self._matrix, self._scales = None, None
+        self._buffer, self._scale_buffer = None, None # Writable copies with spare rows (after a deferred upsert)
+        self.unflushed_rows = 0
+        if os.path.exists(self._path(RECORDS_FILENAME)):
+            with open(self._path(RECORDS_FILENAME), "r", encoding="utf-8") as f:
+                records = json.load(f)
+            self._ids, self._documents, self._metadatas = records["ids"], records["documents"], records["metadatas"]
+        if self._ids:
+            if self.quantization == QUANTIZATION_INT8:
+                self._matrix = np.load(self._path(QUANTIZED_FILENAME), mmap_mode="r")
+                self._scales = np.load(self._path(SCALES_FILENAME))
+            else:
+                self._matrix = np.load(self._path(EMBEDDINGS_FILENAME), mmap_mode="r")
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+
+    def _save(self, ids, documents, metadatas, matrix, scales):
+        """Writes all files and reopens the matrix memory-mapped. Caller holds the lock."""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.quantization == QUANTIZATION_INT8:
+            _save_npy_atomic(self._path(QUANTIZED_FILENAME), matrix)
+            _save_npy_atomic(self._path(SCALES_FILENAME), scales)
+        else:
+            _save_npy_atomic(self._path(EMBEDDINGS_FILENAME), matrix)
+        _save_json_atomic(self._path(RECORDS_FILENAME), {"ids": ids, "documents": documents, "metadatas": metadatas})
+        _save_json_atomic(self._path(STORE_INFO_FILENAME), {
+            "version": STORE_FORMAT_VERSION, "quantization": self.quantization,
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        })
+        self._load()
+
+    def _encode(self, vectors):
+        """Returns (rows, scales) in the store's storage format for normalized float32 vectors."""
+        if self.quantization == QUANTIZATION_INT8:
+            return _quantize_rows(vectors)
+        return vectors, None
+
+    def _decoded_matrix(self):
+        if self._matrix is None:
+            return None
+        if self.quantization == QUANTIZATION_INT8:
+            return self._matrix.astype(np.float32) * self._scales[:, None]
+        return np.asarray(self._matrix)
+
+    # --- Writes ---
+    def _reserve(self, rows, new_rows):
+        """Makes the writable buffers hold the current rows plus `new_rows` spare ones (doubling capacity). Caller holds the lock."""
+        count = len(self._ids)
+        if self._buffer is not None and self._buffer.shape[0] >= count + new_rows:
+            return
+        capacity = max(2 * self._buffer.shape[0] if self._buffer is not None else 0, count + new_rows, 16)
+        buffer = np.empty((capacity, rows.shape[1]), dtype=rows.dtype)
+        if count:
+            buffer[:count] = self._matrix
+        self._buffer = buffer
+        if self.quantization == QUANTIZATION_INT8:
+            scale_buffer = np.empty(capacity, dtype=np.float32)
+            if count:
+                scale_buffer[:count] = self._scales
+            self._scale_buffer = scale_buffer
+
+    def upsert_embeddings(self, ids, embeddings, documents, metadatas=None, flush=True):
+        """Inserts or replaces records with precomputed embeddings (no embedding call).
+
+        With flush=False the records are searchable in this store at once but only written to disk
+        by a later flush() (or any flushing write); use it for bulk loads, one flush at the end."""
+        metadatas = metadatas or [{} for _ in ids]
+        latest = {chunk_id: i for i, chunk_id in enumerate(ids)} # Last occurrence wins within a batch
+        order = sorted(latest.values())
+        ids = [ids[i] for i in order]
+        rows, new_scales = self._encode(_normalize_rows([embeddings[i] for i in order]))
+        with self._lock:
+            if self._matrix is not None and self._matrix.shape[1] != rows.shape[1]:
+                raise ValueError(f"Embedding dimension {rows.shape[1]} does not match the store ({self._matrix.shape[1]}).")
+            new = [j for j, chunk_id in enumerate(ids) if chunk_id not in self._positions]
+            self._reserve(rows, len(new))
+            for j, chunk_id in enumerate(ids):
+                position = self._positions.get(chunk_id)
+                if position is None:
+                    position = len(self._ids)
+                    self._positions[chunk_id] = position
+                    self._ids.append(chunk_id)
+                    self._documents.append(documents[order[j]])
+                    self._metadatas.append(metadatas[order[j]] or {})
+                else:
+                    self._documents[position] = documents[order[j]]
+                    self._metadatas[position] = metadatas[order[j]] or {}
+                self._buffer[position] = rows[j]
+                if new_scales is not None:
+                    self._scale_buffer[position] = new_scales[j]
+            self._matrix = self._buffer[:len(self._ids)]
+            self._scales = self._scale_buffer[:len(self._ids)] if self._scale_buffer is not None else None
+            self.unflushed_rows += len(ids)
+            if flush:
+                self.flush()
+        return ids
+
+    def flush(self):
+        """Writes records upserted with flush=False to disk. Returns whether anything was written."""
+        with self._lock:
+            if not self.unflushed_rows:
+                return False
+            self._save(self._ids, self._documents, self._metadatas, self._matrix, self._scales)
+        return True
+
+    def flush_due(self):
+        """True once the buffered rows are at least as many as the rows on disk (and MIN_FLUSH_ROWS).
+
+        Flushing on this schedule makes each rewrite at least double the file, so a bulk load
+        writes O(total rows) in all rather than O(rows x batches)."""
+        with self._lock:
+            return self.unflushed_rows >= max(MIN_FLUSH_ROWS, len(self._ids) - self.unflushed_rows)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        if ids is None:
+            import uuid
+            ids = [str(uuid.uuid4()) for _ in texts]
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.upsert_embeddings(list(ids), embeddings, texts, list(metadatas) if metadatas else None)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return True
+        with self._lock:
+            drop = {self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions}
+            if not drop:
+                return True
+            keep = [i for i in range(len(self._ids)) if i not in drop]
+            if not keep:
+                self.delete_collection()
+                return True
+            self._save(
+                [self._ids[i] for i in keep], [self._documents[i] for i in keep], [self._metadatas[i] for i in keep],
+                np.asarray(self._matrix)[keep], self._scales[keep] if self._scales is not None else None
+            )
+        return True
+
+    def delete_collection(self):
+        """Removes all records and store files (same role as Chroma.delete_collection)."""
+        with self._lock:
+            for filename in (EMBEDDINGS_FILENAME, QUANTIZED_FILENAME, SCALES_FILENAME, RECORDS_FILENAME, STORE_INFO_FILENAME):
+                if os.path.exists(self._path(filename)):
+                    os.remove(self._path(filename))
+            self._load()
+
+    # --- Reads ---
+    def get(self, ids=None, include=None, limit=None, offset=None):
+        """Chroma-style get(): returns {"ids", "documents", "metadatas"[, "embeddings"]}."""
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            positions = [self._positions[i] for i in ids if i in self._positions] if ids is not None else list(range(len(self._ids)))
+            positions = positions[offset or 0:(offset or 0) + limit if limit else None]
+            result = {"ids": [self._ids[p] for p in positions]}
+            if "documents" in include:
+                result["documents"] = [self._documents[p] for p in positions]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[p] for p in positions]
+            if "embeddings" in include:
+                matrix = self._decoded_matrix()
+                result["embeddings"] = matrix[positions].tolist() if matrix is not None else []
+        return result
+
+    # --- Search ---
+    def _filter_mask(self, filter):
+        if not filter:
+            return None
+        return np.array([all(metadata.get(key) == value for key, value in filter.items()) for metadata in self._metadatas])
+
+    def _scores(self, query_vectors):
+        """Cosine similarities, shape [Q, N]."""
+        queries = _normalize_rows(query_vectors)
+        if self.quantization != QUANTIZATION_INT8:
+            return queries @ self._matrix.T
+        scores = np.empty((queries.shape[0], self._matrix.shape[0]), dtype=np.float32)
+        for start in range(0, self._matrix.shape[0], INT8_SEARCH_BLOCK_ROWS):
+            block = self._matrix[start:start + INT8_SEARCH_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + block.shape[0]] = queries @ block.T
+        return scores * self._scales[None, :]
+
+    def _document(self, position):
+        return Document(page_content=self._documents[position], metadata=dict(self._metadatas[position]), id=self._ids[position])
+
+    def _top_positions(self, scores, k, mask=None):
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _top_k(self, scores, k, mask=None):
+        return [(self._document(i), float(1.0 - scores[i])) for i in self._top_positions(scores, k, mask)]
+
+    def batch_search_by_vector(self, embeddings, k=4, filter=None):
+        """Searches several query vectors with one matrix product. Returns a list of [(Document, distance)] per query."""
+        with self._lock:
+            if self._matrix is None:
+                return [[] for _ in embeddings]
+            scores = self._scores(embeddings)
+            mask = self._filter_mask(filter)
+            return [self._top_k(row, k, mask) for row in scores]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        """Returns (Document, distance) pairs like Chroma's method of the same name (lower = more similar)."""
+        return self.batch_search_by_vector([embedding], k=k, filter=filter)[0]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_relevance_scores(self.embedding_function.embed_query(query), k=k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        """MMR over the `fetch_k` most similar records: trades relevance against similarity to already-picked records."""
+        with self._lock:
+            if self._matrix is None:
+                return []
+            scores = self._scores([embedding])[0]
+            candidates = self._top_positions(scores, fetch_k, self._filter_mask(filter))
+            if len(candidates) == 0:
+                return []
+            vectors = self._matrix[candidates].astype(np.float32)
+            if self._scales is not None:
+                vectors = vectors * self._scales[candidates][:, None]
+            relevance = scores[candidates]
+            similarity = vectors @ vectors.T # Rows are (approximately) unit length
+            selected = [0] # The most relevant candidate comes first
+            redundancy = similarity[0].copy()
+            while len(selected) < min(k, len(candidates)):
+                mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+                mmr[selected] = -np.inf
+                best = int(np.argmax(mmr))
+                selected.append(best)
+                redundancy = np.maximum(redundancy, similarity[best])
+            return [self._document(candidates[i]) for i in selected]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+        )
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory=None, quantization=None, **kwargs):
+        if directory is None:
+            raise ValueError("NumpyVectorStore.from_texts() needs a `directory`.")
+        store = cls(directory, embedding_function=embedding, quantization=quantization)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
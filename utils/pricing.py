@@ -0,0 +1,400 @@
+import os
+import re
+import json
+import math
+import difflib
+import threading
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+# --- Local Pricing Engine ---
+# Invoice line items are priced from the company rate sheet(s) in `rag_documents/billing_info`
+# instead of by the LLM: the rate sheet is parsed once into a rate table (reloaded only when a
+# file changes), technician line items are mapped to rates with a fuzzy token matcher, quantities
+# are parsed from the line ("1.5 lbs", "2 hours", "x2"), and totals use exact Decimal math with
+# cents rounded half-up. Only items without a confident match are left for the LLM to estimate.
+# Rate sheet lines look like `Name: $95.00 (note)`, `Name: $125.00/hour`, `Name: $85.00 per pound`;
+# `# Heading` lines set the category, `- ...` lines add notes, and "Quoted per job" items are
+# matched but not priced automatically.
+# NOTE: No Streamlit here; also used by api.py and batch invoicing.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BILLING_INFO_DIR = os.path.join(PROJECT_ROOT, "rag_documents", "billing_info")
+TAX_RATE = Decimal(os.getenv("INVOICE_TAX_RATE", "0.075"))
+MATCH_THRESHOLD = float(os.getenv("INVOICE_MATCH_THRESHOLD", "0.6"))
+MATCH_AMBIGUITY_MARGIN = 0.02 # A runner-up this close with a different price leaves the item for the LLM
+CENTS = Decimal("0.01")
+
+_RATE_LINE_PATTERN = re.compile(r"^(?P<name>[^:#\-][^:]*):\s*(?P<rest>.*\$\s*(?P<price>\d[\d,]*(?:\.\d+)?).*)$")
+_UNIT_PATTERNS = (
+    ("hour", re.compile(r"(/\s*|per\s+)(hour|hr)\b", re.I)),
+    ("pound", re.compile(r"(/\s*|per\s+)(pound|lb)\b", re.I)),
+    ("system", re.compile(r"(/\s*|per\s+)system\b", re.I)),
+)
+# Quantity words in technician line items, by rate unit; minutes are added to the hours ("1 hr 30 min")
+_UNIT_QUANTITY_PATTERNS = {
+    "hour": re.compile(r"(\d+(?:\.\d+)?)\s*(?:hours?|hrs?|h)\b", re.I),
+    "pound": re.compile(r"(\d+(?:\.\d+)?)\s*(?:pounds?|lbs?)\b", re.I),
+}
+_MINUTES_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(?:minutes?|mins?)\b", re.I)
+# Words after a number that make it a size, rating or duration rather than a count ('45 MFD', '5 ton', '2 pole')
+_NON_COUNT_WORDS = (
+    "mfd", "uf", "ton", "tons", "inch", "inches", "in", "pole", "v", "vac", "volt", "volts", "amp", "amps", "hp",
+    "btu", "btuh", "seer", "w", "watt", "watts", "psi", "ft", "feet", "foot", "mm", "cm", "gal", "gallon", "gallons",
+    "hour", "hours", "hr", "hrs", "h", "minute", "minutes", "min", "mins", "pound", "pounds", "lb", "lbs",
+)
+_COUNT_PATTERNS = (
+    re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(?:x|×)\s+", re.I),       # "2x ...", "2 x ..."
+    re.compile(r"\b(?:x|×)\s*(\d+(?:\.\d+)?)\s*$", re.I),         # "... x2"
+    re.compile(r"\bqty\.?:?\s*(\d+(?:\.\d+)?)\b", re.I),           # "qty 2", "(qty: 2)"
+    # "2 filters", "Replaced 2 contactors" (not "R-22 ...", "45 MFD ..." or "5 ton ...")
+    re.compile(rf"(?<![\w.\-/])(\d+)\s+(?!(?:{'|'.join(_NON_COUNT_WORDS)})\b)(?=[a-z])", re.I),
+)
+HOUR_QUANTITY_STEP = Decimal("0.01") # Hours from minutes are rounded to this ("1 hr 20 min" -> 1.33)
+_STOPWORDS = {"a", "an", "the", "of", "and", "for", "with", "on", "to", "in", "per", "up", "e", "g"}
+_TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*") # Same token shape as utils/lexical_index.py
+# Words that describe the work, the visit or the quantity rather than the item; ignored when checking that
+# a rate explains the rest of a line item
+_FILLER_TERMS = {"replace", "install", "add", "new", "swap", "supply", "provide", "charge", "service", "call",
+                 "visit", "hour", "pound", "qty", "x"}
+# Words in rate names that don't identify the rate; left out of the name coverage score
+_GENERIC_RATE_TERMS = {"standard", "rate", "fee"}
+_SYNONYMS = {"hr": "hour", "hrs": "hour", "lb": "pound", "lbs": "pound",
+             "replacement": "replace", "replaced": "replace", "installed": "install", "added": "add",
+             "swapped": "swap", "supplied": "supply", "provided": "provide", "recharge": "charge",
+             "recharged": "charge", "charged": "charge"}
+
+def to_money(value):
+    """Rounds a Decimal to cents (half-up)."""
+    return Decimal(value).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+def _normalize_term(term):
+    if term in _SYNONYMS:
+        return _SYNONYMS[term]
+    if len(term) > 5 and term.endswith("ly"):
+        term = term[:-2]
+    elif len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        term = term[:-1]
+    return _SYNONYMS.get(term, term)
+
+def term_groups(text):
+    """One group per token: the joined compound, then its parts ('R-410A' -> ('r410a', '410a', 'r')),
+    lightly stemmed, without stopwords or bare numbers (quantities)."""
+    groups = []
+    for token in _TERM_PATTERN.findall(text.lower()):
+        parts = re.split(r"[-_./]", token)
+        if (len(parts) == 1 and token in _STOPWORDS) or all(part.isdigit() for part in parts):
+            continue
+        joined = _normalize_term("".join(parts))
+        part_terms = {_normalize_term(part) for part in parts if part not in _STOPWORDS} - {joined}
+        groups.append((joined, *sorted(part_terms)))
+    return groups
+
+def normalize_line_item(description):
+    """Line item text as matched against rate names: quantities become their unit word ('2 hrs' -> 'hour',
+    '1.5 lbs' -> 'pound') and counts are dropped ('x2', 'qty 2', '2 filters')."""
+    text = description
+    for unit, pattern in _UNIT_QUANTITY_PATTERNS.items():
+        text = pattern.sub(f" {unit} ", text)
+    text = _MINUTES_PATTERN.sub(" hour ", text)
+    for pattern in _COUNT_PATTERNS:
+        text = pattern.sub(" ", text)
+    return " ".join(text.split())
+
+@dataclass
+class Rate:
+    name: str
+    price: Decimal
+    unit: str = "each"      # "each", "hour", "pound" or "system"
+    category: str = ""
+    note: str = ""
+    quoted: bool = False    # "Quoted per job": price is a minimum, not a fixed rate
+    core_groups: list = field(default_factory=list, repr=False)   # Terms of the name before any "(...)"
+    detail_groups: list = field(default_factory=list, repr=False) # Terms inside "(...)"
+
+    @property
+    def terms(self):
+        return {term for group in self.core_groups + self.detail_groups for term in group}
+
+def parse_rate_table(text):
+    """Parses rate sheet text into a list of Rates."""
+    rates, category = [], ""
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("##"):
+            continue
+        if line.startswith("#"):
+            category = line.lstrip("#").strip()
+            continue
+        if line.startswith("-"):
+            if rates:
+                rates[-1].note = f"{rates[-1].note} {line.lstrip('- ').strip()}".strip()
+            continue
+        match = _RATE_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        rest = match.group("rest")
+        unit = next((unit for unit, pattern in _UNIT_PATTERNS if pattern.search(rest)), "each")
+        try:
+            price = Decimal(match.group("price").replace(",", ""))
+        except InvalidOperation:
+            continue
+        name = match.group("name").strip()
+        core, _, detail = name.partition("(")
+        rates.append(Rate(
+            name=name, price=price, unit=unit, category=category, note=rest.strip(),
+            quoted="quoted" in rest.lower(), core_groups=term_groups(core), detail_groups=term_groups(detail)
+        ))
+    return rates
+
+class RateTable:
+    """Parsed rates plus the term statistics used by the fuzzy matcher."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        document_frequency = {}
+        for rate in rates:
+            for term in rate.terms:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        n = max(len(rates), 1)
+        self.idf = {term: math.log(1 + n / df) for term, df in document_frequency.items()}
+        self.min_idf = math.log(1 + n / n) # Weight of terms no rate name uses (e.g. a unit word)
+        self._rate_terms = [rate.terms for rate in rates]
+
+    def _group_weight(self, group):
+        return max(self.idf.get(term, 0.0) for term in group)
+
+    def _group_match(self, group, terms):
+        """1.0 if the whole token (or all of its parts) is present, else the share of its parts that are."""
+        joined, *parts = group
+        if joined in terms:
+            return 1.0
+        return sum(1 for part in parts if part in terms) / len(parts) if parts else 0.0
+
+    def match(self, description):
+        """Returns (Rate, score) for the best-matching rate, or (None, best score) if it is below
+        MATCH_THRESHOLD or ambiguous.
+
+        The line item is normalized first (normalize_line_item). Score: IDF-weighted share of the rate's
+        core name terms found in the line item (0.6), plus the share of the line item's other words that the
+        rate's name explains (0.25), plus string similarity (0.15). Name details in "(...)" that the item
+        mentions count towards the core share, as does the rate's unit ('3 lbs' for a per-pound rate).
+        A rate that explains less than half of the line item's words is not a match ('Thermostat wiring
+        repair' is not a thermostat), and an item that matches two differently priced rates about equally
+        ('Refrigerant recharge 3 lbs': R-410A or R-22?) is not priced automatically."""
+        text = normalize_line_item(description).lower()
+        groups = term_groups(text)
+        terms = {term for group in groups for term in group}
+        item_groups = [group for group in groups if group[0] not in _FILLER_TERMS]
+        if not terms & self.idf.keys() or not item_groups:
+            return None, 0.0
+        scored = []
+        for rate, rate_terms in zip(self.rates, self._rate_terms):
+            if not rate_terms & terms:
+                continue
+            explained = sum(1 for group in item_groups if rate_terms.intersection(group)) / len(item_groups)
+            if explained < 0.5:
+                continue
+            name_groups = [group for group in rate.core_groups if group[0] not in _GENERIC_RATE_TERMS] + \
+                [group for group in rate.detail_groups if self._group_match(group, terms)]
+            if rate.unit in terms:
+                name_groups.append((rate.unit,))
+            weights = [max(self._group_weight(group), self.min_idf) for group in name_groups]
+            coverage = sum(weight * self._group_match(group, terms) for weight, group in zip(weights, name_groups)) / \
+                (sum(weights) or 1.0)
+            similarity = difflib.SequenceMatcher(None, text, rate.name.lower()).ratio()
+            scored.append((0.6 * coverage + 0.25 * explained + 0.15 * similarity, rate))
+        if not scored:
+            return None, 0.0
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        best_score, best = scored[0]
+        if best_score < MATCH_THRESHOLD or any(
+                best_score - score < MATCH_AMBIGUITY_MARGIN and rate.price != best.price for score, rate in scored[1:]):
+            return None, round(best_score, 3)
+        return best, round(best_score, 3)
+
+    def as_prompt_text(self):
+        """Compact rate list for LLM prompts (unmatched-item estimates)."""
+        return "\n".join(f"- {rate.name}: ${rate.price} ({rate.unit})" for rate in self.rates)
+
+_rate_table_lock = threading.Lock()
+_rate_table_cache = {} # directory -> (file signature, RateTable)
+
+def load_rate_table(directory=BILLING_INFO_DIR):
+    """Returns the RateTable parsed from the .txt rate sheets in `directory` (re-parsed only when they change)."""
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".txt")) \
+        if os.path.isdir(directory) else []
+    signature = tuple((path, os.path.getmtime(path), os.path.getsize(path)) for path in paths)
+    with _rate_table_lock:
+        cached = _rate_table_cache.get(directory)
+        if cached and cached[0] == signature:
+            return cached[1]
+        rates = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                rates.extend(parse_rate_table(f.read()))
+        table = RateTable(rates)
+        _rate_table_cache[directory] = (signature, table)
+        return table
+
+# --- Line Items ---
+def parse_quantity(description, unit="each"):
+    """Quantity for a line item, as a Decimal (default 1). Unit-specific forms ('1.5 lbs', '2 hours',
+    '1 hr 30 min') win; numbers that are sizes or ratings ('45 MFD', '5 ton') are not counts."""
+    if unit == "hour":
+        hours = _UNIT_QUANTITY_PATTERNS["hour"].search(description)
+        minutes = _MINUTES_PATTERN.search(description)
+        if hours or minutes:
+            total = (Decimal(hours.group(1)) if hours else Decimal(0)) + \
+                (Decimal(minutes.group(1)) / 60 if minutes else Decimal(0))
+            return total.quantize(HOUR_QUANTITY_STEP, rounding=ROUND_HALF_UP).normalize()
+    pattern = _UNIT_QUANTITY_PATTERNS.get(unit)
+    if pattern and unit != "hour":
+        match = pattern.search(description)
+        if match:
+            return Decimal(match.group(1))
+    for pattern in _COUNT_PATTERNS:
+        match = pattern.search(description)
+        if match:
+            return Decimal(match.group(1))
+    return Decimal(1)
+
+@dataclass
+class PricedLine:
+    description: str
+    quantity: Decimal
+    unit_price: Decimal = None  # None: not priced (unmatched or quoted item)
+    rate_name: str = ""
+    unit: str = "each"
+    source: str = "rate_table"  # "rate_table", "llm_estimate", "quote" (quoted-per-job rate) or "unmatched"
+    match_score: float = 0.0
+
+    @property
+    def total(self):
+        return to_money(self.quantity * self.unit_price) if self.unit_price is not None else None
+
+def price_line_items(line_items, rate_table=None):
+    """Prices line items from the rate table; unmatched and quoted-per-job items are left without a price."""
+    rate_table = rate_table or load_rate_table()
+    lines = []
+    for description in line_items:
+        rate, score = rate_table.match(description)
+        if rate is None:
+            lines.append(PricedLine(description, parse_quantity(description), source="unmatched", match_score=score))
+            continue
+        if rate.quoted:
+            lines.append(PricedLine(description, parse_quantity(description), rate_name=rate.name, unit=rate.unit,
+                                    source="quote", match_score=score))
+            continue
+        lines.append(PricedLine(description, parse_quantity(description, rate.unit), rate.price, rate.name,
+                                rate.unit, "rate_table", score))
+    return lines
+
+def describe_lines(lines):
+    """JSON-friendly priced lines (money as strings, e.g. '127.50')."""
+    return [{
+        "description": line.description, "quantity": format_quantity(line.quantity),
+        "unit_price": str(line.unit_price) if line.unit_price is not None else None,
+        "total": str(line.total) if line.total is not None else None,
+        "rate": line.rate_name or None, "unit": line.unit, "source": line.source, "match_score": line.match_score,
+    } for line in lines]
+
+def compute_totals(lines, tax_rate=TAX_RATE):
+    """Subtotal, tax and total of the priced lines (unpriced lines are excluded), in exact cents."""
+    subtotal = sum((line.total for line in lines if line.total is not None), Decimal("0.00"))
+    tax = to_money(subtotal * tax_rate)
+    return {"subtotal": to_money(subtotal), "tax_rate": tax_rate, "tax": tax, "total": to_money(subtotal + tax)}
+
+# --- LLM Estimates (unmatched items only) ---
+def build_estimate_prompt(lines, rate_table=None):
+    """Prompt asking the LLM for unit prices of the unmatched lines, as a JSON object (None if there are none)."""
+    unmatched = [line for line in lines if line.source == "unmatched"]
+    if not unmatched:
+        return None
+    rate_table = rate_table or load_rate_table()
+    items = "\n".join(f"- {line.description}" for line in unmatched)
+    return f"""
+    You are a billing assistant for an AC repair company. Estimate a reasonable unit price in USD for each
+    line item below, consistent with the company's standard rates.
+
+    **Standard Rates:**
+    {rate_table.as_prompt_text()}
+
+    **Line Items to Price:**
+    {items}
+
+    Respond with only a JSON object mapping each line item (exactly as written) to its unit price as a number,
+    e.g. {{"Replaced blower motor": 450.00}}.
+    """
+
+def apply_estimates(lines, response_text):
+    """Fills unmatched lines from the LLM's JSON answer; lines it did not price stay unpriced. Returns the count applied."""
+    match = re.search(r"\{.*\}", response_text or "", re.S)
+    if not match:
+        return 0
+    try:
+        estimates = json.loads(match.group(0))
+    except ValueError:
+        return 0
+    applied = 0
+    for line in lines:
+        if line.source != "unmatched" or line.description not in estimates:
+            continue
+        try:
+            price = to_money(Decimal(str(estimates[line.description])))
+        except (InvalidOperation, ValueError, TypeError):
+            continue
+        if price >= 0:
+            line.unit_price, line.source = price, "llm_estimate"
+            applied += 1
+    return applied
+
+# --- Rendering ---
+def format_quantity(quantity):
+    return f"{quantity.normalize():f}"
+
+def render_invoice(company, invoice_num, invoice_date, job_date, customer_name, customer_address, lines, totals, notes=""):
+    """Renders the invoice as markdown (dates are datetime.date objects)."""
+    rows = []
+    for line in lines:
+        label = line.description + (" *(estimate)*" if line.source == "llm_estimate" else "")
+        if line.unit_price is None:
+            price_text = "Quote required" if line.source == "quote" else "TBD"
+            rows.append(f"| {label} | {format_quantity(line.quantity)} | {price_text} | - |")
+        else:
+            rows.append(f"| {label} | {format_quantity(line.quantity)} | ${line.unit_price:,.2f} | ${line.total:,.2f} |")
+    tax_percent = f"{(totals['tax_rate'] * 100).normalize():f}%"
+    unpriced = sum(1 for line in lines if line.unit_price is None)
+    return "\n".join([
+        "# INVOICE",
+        "",
+        f"**{company['name']}**  ",
+        f"{company['address']}  ",
+        f"Phone: {company['phone']} | {company['email']}",
+        "",
+        "---",
+        "**BILL TO:**  ",
+        f"{customer_name}  ",
+        f"{customer_address}",
+        "",
+        f"**Invoice #:** {invoice_num}  ",
+        f"**Date:** {invoice_date.strftime('%Y-%m-%d')}  ",
+        f"**Date of Service:** {job_date.strftime('%Y-%m-%d')}",
+        "",
+        "---",
+        "",
+        "| Description | Qty | Unit Price | Total |",
+        "|---|---|---|---|",
+        *rows,
+        "",
+        "---",
+        f"**Subtotal:** ${totals['subtotal']:,.2f}  ",
+        f"**Sales Tax ({tax_percent}):** ${totals['tax']:,.2f}  ",
+        f"**TOTAL DUE:** **${totals['total']:,.2f}**",
+        *(["", f"*{unpriced} item(s) still need a price and are not included in the total.*"] if unpriced else []),
+        "---",
+        "",
+        "**Notes:**  ",
+        notes or "",
+        "",
+        "*Thank you for your business! Payment is due upon receipt.*",
+    ])
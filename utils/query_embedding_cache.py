@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import heapq
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from .response_cache import normalize_prompt
+
+# --- Query Embedding Cache ---
+# Search queries are embedded on every retrieval (RAG chains, retrieve_context, hybrid search),
+# and the same symptom phrases are asked all day. Query vectors are cached per
+# (embedding model, normalized query) in a bounded LRU that is shared across sessions and
+# persisted to a local JSON file. A query log (counts per normalized query) drives the startup
+# warm-up, which pre-embeds the most frequent historical queries that are not cached yet.
+# Retention: queries are customer text. The log keeps at most QUERY_LOG_MAX_ENTRIES queries and
+# drops any not asked for QUERY_LOG_RETENTION_DAYS; cached vectors are keyed by the normalized
+# query and bounded by QUERY_EMBEDDING_CACHE_MAX_ENTRIES (LRU). Deleting the cache file purges both.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_EMBEDDING_CACHE_PATH = os.path.join(PROJECT_ROOT, "cache", "query_embeddings.json")
+DEFAULT_MAX_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", "2000"))
+DEFAULT_MAX_LOGGED_QUERIES = int(os.getenv("QUERY_LOG_MAX_ENTRIES", "5000"))
+DEFAULT_LOG_RETENTION_DAYS = float(os.getenv("QUERY_LOG_RETENTION_DAYS", "30"))
+QUERY_LOG_PRUNE_FRACTION = 0.1 # A full log is pruned to 90% of its cap, not by one query per insert
+DEFAULT_WARMUP_TOP_N = int(os.getenv("QUERY_CACHE_WARMUP_TOP_N", "50"))
+SAVE_INTERVAL_SECONDS = 30
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query embeddings with a query-frequency log and JSON persistence."""
+
+    def __init__(self, path=QUERY_EMBEDDING_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_logged_queries=DEFAULT_MAX_LOGGED_QUERIES, log_retention_days=DEFAULT_LOG_RETENTION_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_logged_queries = max_logged_queries
+        self.log_retention_seconds = log_retention_days * 24 * 3600
+        self._entries = OrderedDict() # "model\nnormalized query" -> vector, least recently used first
+        self._query_log = {}          # normalized query -> {"text": str, "count": int, "last": float}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "warmed": 0}
+        self.load()
+
+    # --- Lookup / Store ---
+    @staticmethod
+    def _key(model_name, text):
+        return f"{model_name}\n{normalize_prompt(text)}"
+
+    def get(self, model_name, text):
+        """Returns the cached vector or None."""
+        key = self._key(model_name, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return vector
+
+    def put(self, model_name, text, vector):
+        key = self._key(model_name, text)
+        with self._lock:
+            self._entries[key] = list(vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._dirty = True
+        self.maybe_save()
+
+    def contains(self, model_name, text):
+        with self._lock:
+            return self._key(model_name, text) in self._entries
+
+    # --- Query Log ---
+    def record_query(self, text):
+        """Counts a query for the warm-up ranking."""
+        normalized = normalize_prompt(text)
+        if not normalized:
+            return
+        now = time.time()
+        with self._lock:
+            logged = self._query_log.setdefault(normalized, {"text": text, "count": 0})
+            logged["count"] += 1
+            logged["last"] = now
+            if len(self._query_log) > self.max_logged_queries:
+                self._prune_query_log(now)
+            self._dirty = True
+
+    def _is_retained(self, logged, now):
+        return now - logged.get("last", 0) < self.log_retention_seconds
+
+    def _drop_expired_queries(self, now):
+        for stale in [q for q, logged in self._query_log.items() if not self._is_retained(logged, now)]:
+            del self._query_log[stale]
+
+    def _prune_query_log(self, now):
+        """Drops expired queries, then the least frequent (then oldest) down to 90% of the cap."""
+        self._drop_expired_queries(now)
+        target = int(self.max_logged_queries * (1 - QUERY_LOG_PRUNE_FRACTION))
+        if len(self._query_log) > target:
+            excess = heapq.nsmallest(len(self._query_log) - target, self._query_log.items(),
+                                     key=lambda item: (item[1]["count"], item[1]["last"]))
+            for stale, _ in excess:
+                del self._query_log[stale]
+
+    def top_queries(self, n):
+        """Returns the original text of the `n` most frequent logged queries."""
+        with self._lock:
+            ranked = sorted(self._query_log.values(), key=lambda logged: (-logged["count"], -logged["last"]))
+            return [logged["text"] for logged in ranked[:n]]
+
+    def record_warmed(self, count):
+        with self._lock:
+            self.counters["warmed"] += count
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {**self.counters, "entries": len(self._entries), "logged_queries": len(self._query_log),
+                    "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.save()
+
+    # --- Persistence ---
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Query embedding cache: could not load {self.path} ({e}); starting empty.")
+            return
+        with self._lock:
+            for key, vector in stored.get("entries", [])[-self.max_entries:]:
+                self._entries[key] = vector
+            self._query_log.update(stored.get("query_log", {}))
+            self._drop_expired_queries(time.time())
+            if len(self._query_log) > self.max_logged_queries:
+                self._prune_query_log(time.time())
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            snapshot = {"entries": [[key, vector] for key, vector in self._entries.items()],
+                        "query_log": {q: logged for q, logged in self._query_log.items() if self._is_retained(logged, now)}}
+            self._dirty = False
+            self._last_save = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def maybe_save(self):
+        """Saves at most every SAVE_INTERVAL_SECONDS (and always at process exit)."""
+        if time.time() - self._last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+# --- Process-wide Instance ---
+_query_embedding_cache = None
+_query_embedding_cache_lock = threading.Lock()
+
+def get_query_embedding_cache():
+    """Returns the process-wide QueryEmbeddingCache, creating it on first use."""
+    global _query_embedding_cache
+    with _query_embedding_cache_lock:
+        if _query_embedding_cache is None:
+            _query_embedding_cache = QueryEmbeddingCache()
+            atexit.register(_query_embedding_cache.save)
+        return _query_embedding_cache
+
+# --- Embeddings Wrapper ---
+class QueryCachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves embed_query() from the query cache; documents pass through."""
+
+    def __init__(self, underlying, model_name, cache=None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache or get_query_embedding_cache()
+
+    def embed_documents(self, texts):
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.cache.record_query(text)
+        vector = self.cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self.cache.put(self.model_name, text, vector)
+        return vector
+
+def warm_query_cache(embeddings, top_n=DEFAULT_WARMUP_TOP_N, max_workers=4):
+    """Pre-embeds the `top_n` most frequent logged queries that are not cached for this model.
+
+    `embeddings` is a QueryCachedEmbeddings. Returns the number of queries embedded."""
+    cache = embeddings.cache
+    missing = [text for text in cache.top_queries(top_n) if not cache.contains(embeddings.model_name, text)]
+    if not missing:
+        return 0
+
+    def warm(text):
+        try:
+            cache.put(embeddings.model_name, text, embeddings.underlying.embed_query(text))
+            return 1
+        except Exception as e:
+            print(f"Query cache warm-up: could not embed '{text[:40]}' ({e})")
+            return 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        warmed = sum(executor.map(warm, missing))
+    cache.record_warmed(warmed)
+    cache.save()
+    return warmed
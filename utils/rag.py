@@ -1,13 +1,37 @@
+from .bootstrap import ensure_sqlite
+ensure_sqlite() # ChromaDB needs a recent sqlite3 driver; must run before chromadb is imported
+
 import streamlit as st
 import os
 import shutil # For potentially removing directories
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import threading # Guards the process-wide RAG registry
+from concurrent.futures import ThreadPoolExecutor
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
+import chromadb
 from langchain.chains import RetrievalQA
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.documents import Document
 import google.generativeai as genai # Need this for checking API key config
+from .embedding_cache import get_cached_embeddings
+from .query_embedding_cache import QueryCachedEmbeddings, warm_query_cache, DEFAULT_WARMUP_TOP_N
+from .gemini import get_pooled_client, count_tokens, is_gemini_configured
+from .doc_pipeline import iter_file_chunks, get_default_loader_workers
+from .ingest import ingest_chunks, vector_store_batch_writer, IngestCheckpoint
+from .lexical_index import BM25Index, LEXICAL_INDEX_FILENAME, identifier_terms, tokenize, reciprocal_rank_fusion
+from .retrievers import FunctionRetriever, PipelineRetriever
+from .context_processing import merge_adjacent_chunks, pack_context, estimate_tokens, DEFAULT_CONTEXT_TOKEN_BUDGET
+from .rerank import rerank, RERANKERS, DEFAULT_RERANKER, DEFAULT_RERANK_FETCH_K
+from .storage_layout import (
+    get_storage_layout, get_vector_backend, get_collection_name, get_per_context_directory, get_consolidated_context_directory,
+    list_per_context_stores, list_collection_names, LAYOUT_CONSOLIDATED, BACKEND_NUMPY, CONSOLIDATED_CHROMA_DIR, CONSOLIDATED_CONTEXTS_DIR
+)
+from .numpy_store import NumpyVectorStore
+from .index_manifest import (
+    get_manifest_path, load_manifest, save_manifest, new_manifest, scan_files, diff_manifest, make_chunk_ids,
+    get_index_version, bump_index_version
+)
+from .answer_cache import get_answer_cache, make_answer_key, ANSWER_CACHE_ENABLED
 
 # --- RAG Configuration ---
 # Define base directories relative to the project root
@@ -16,13 +40,122 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 BASE_DOC_DIR = os.path.join(PROJECT_ROOT, "rag_documents")
 BASE_VECTOR_STORE_DIR = os.path.join(PROJECT_ROOT, "vector_store")
 
+EMBEDDING_MODEL_NAME = "models/embedding-001" # Recommended Gemini embedding model
+
 # --- Ensure Base Directories Exist ---
 os.makedirs(BASE_DOC_DIR, exist_ok=True)
 os.makedirs(BASE_VECTOR_STORE_DIR, exist_ok=True)
 
+def get_embeddings():
+    """Returns the pooled Gemini embeddings client.
+
+    Document embeddings are backed by the on-disk embedding cache, query embeddings by the
+    shared query embedding cache."""
+    return get_pooled_client(
+        "cached_embeddings",
+        lambda model: QueryCachedEmbeddings(
+            get_cached_embeddings(GoogleGenerativeAIEmbeddings(model=model), model), model
+        ),
+        model=EMBEDDING_MODEL_NAME
+    )
+
+_query_warmup_started = False
+_query_warmup_lock = threading.Lock()
+
+def start_query_cache_warmup(top_n=DEFAULT_WARMUP_TOP_N):
+    """Pre-embeds the most frequent historical search queries in a background thread (once per process)."""
+    global _query_warmup_started
+    with _query_warmup_lock:
+        if _query_warmup_started or top_n <= 0:
+            return
+        _query_warmup_started = True
+
+    def warm():
+        try:
+            warmed = warm_query_cache(get_embeddings(), top_n=top_n)
+            print(f"Query embedding cache warm-up: embedded {warmed} frequent queries.") # Log to console
+        except Exception as e:
+            print(f"Query embedding cache warm-up failed: {e}")
+
+    threading.Thread(target=warm, name="query-cache-warmup", daemon=True).start()
+
+def get_chat_model(model_name="gemini-1.5-flash", temperature=0.1):
+    """Returns the pooled LangChain chat model for a model name + temperature."""
+    return get_pooled_client(
+        "chat_model",
+        ChatGoogleGenerativeAI,
+        model=model_name, temperature=temperature, convert_system_message_to_human=True
+    )
+
+# --- Storage Layout and Vector Backend (see utils/storage_layout.py) ---
+def is_consolidated_layout():
+    return get_storage_layout() == LAYOUT_CONSOLIDATED
+
+def uses_numpy_backend():
+    return get_vector_backend() == BACKEND_NUMPY
+
+def uses_shared_chroma_client():
+    """True if contexts are collections of the consolidated Chroma client."""
+    return is_consolidated_layout() and not uses_numpy_backend()
+
+def get_persist_directory(rag_id):
+    """Returns the directory for a RAG context's index files.
+
+    In the per-context layout this is the context's Chroma (or NumPy) store directory; in the consolidated
+    layout Chroma data lives in the shared store and this directory holds the manifest/BM25/checkpoint files."""
+    if is_consolidated_layout():
+        return get_consolidated_context_directory(rag_id)
+    return get_per_context_directory(rag_id, get_vector_backend())
+
+def get_chroma_client():
+    """Returns the process-wide Chroma client of the consolidated store."""
+    os.makedirs(CONSOLIDATED_CHROMA_DIR, exist_ok=True)
+    return get_pooled_client("chroma_client", chromadb.PersistentClient, path=CONSOLIDATED_CHROMA_DIR)
+
+def open_vector_store(rag_id, embeddings):
+    """Opens (creating if needed) the vector store of a context with the configured backend and layout."""
+    if uses_numpy_backend():
+        return NumpyVectorStore(get_persist_directory(rag_id), embedding_function=embeddings)
+    if is_consolidated_layout():
+        return Chroma(client=get_chroma_client(), collection_name=get_collection_name(rag_id), embedding_function=embeddings)
+    return Chroma(persist_directory=get_persist_directory(rag_id), embedding_function=embeddings)
+
+def vector_store_exists(rag_id):
+    """Checks whether a vector store has been created for a RAG context."""
+    if uses_numpy_backend():
+        return NumpyVectorStore.exists(get_persist_directory(rag_id))
+    if is_consolidated_layout():
+        return get_collection_name(rag_id) in list_collection_names(get_chroma_client())
+    persist_directory = get_persist_directory(rag_id)
+    return os.path.exists(persist_directory) and os.path.isdir(persist_directory)
+
+def list_indexed_contexts():
+    """Returns the rag_ids that have a vector store in the configured layout."""
+    if is_consolidated_layout():
+        if not os.path.isdir(CONSOLIDATED_CONTEXTS_DIR):
+            return []
+        return sorted(rag_id for rag_id in os.listdir(CONSOLIDATED_CONTEXTS_DIR) if vector_store_exists(rag_id))
+    return list_per_context_stores(get_vector_backend())
+
+def delete_vector_store(rag_id):
+    """Permanently removes a context's vector store and index files. Call invalidate_rag_context() first."""
+    if uses_shared_chroma_client() and vector_store_exists(rag_id):
+        get_chroma_client().delete_collection(get_collection_name(rag_id))
+    persist_directory = get_persist_directory(rag_id)
+    if os.path.exists(persist_directory):
+        shutil.rmtree(persist_directory)
+    mark_index_changed(rag_id)
+
+def mark_index_changed(rag_id):
+    """Bumps the context's persistent index version, so answers cached from the old index are not reused.
+
+    Index writes call this before and after writing: answers cached mid-write are dropped as well."""
+    return bump_index_version(BASE_VECTOR_STORE_DIR, rag_id)
+
 # Function to check if Gemini API is configured (needed for embeddings)
 def check_gemini_configured_for_rag():
-    if st.session_state.get('gemini_configured', False):
+    if is_gemini_configured() or st.session_state.get('gemini_configured', False):
+        # (The process-wide flag also covers background indexing jobs, which have no session)
         return True
     # Attempt configuration if not done yet (e.g., if accessing RAG manager before other tools)
     from .gemini import configure_gemini # Use relative import
@@ -32,174 +165,504 @@ def check_gemini_configured_for_rag():
         st.error("Gemini API Key must be configured for RAG functionality (Embeddings).")
         return False
 
-# --- Document Loading ---
-def load_documents(rag_id="default"):
-    """Loads documents from a specific subdirectory within rag_documents."""
-    doc_path = os.path.join(BASE_DOC_DIR, rag_id)
-    if not os.path.exists(doc_path) or not os.path.isdir(doc_path):
-        st.warning(f"Document directory for context '{rag_id}' not found: {doc_path}")
-        return []
+# --- Embeddings and Vector Store ---
+def clear_index_files(rag_id):
+    """Removes a context's file manifest and keyword index before a rebuild.
 
-    loaded_docs = []
-    st.write(f"Scanning for documents in: `{doc_path}`") # Debug info
-    files_found = os.listdir(doc_path)
-    if not files_found:
-        st.info(f"No files found in the '{rag_id}' document folder.")
-        return []
+    Until the rebuild saves new ones, incremental updates fall back to a full index instead of
+    trusting a manifest that describes chunks the store no longer has."""
+    persist_directory = get_persist_directory(rag_id)
+    for path in (get_manifest_path(persist_directory), get_lexical_index_path(rag_id)):
+        if os.path.exists(path):
+            os.remove(path)
 
-    for filename in files_found:
-        filepath = os.path.join(doc_path, filename)
-        if os.path.isfile(filepath):
-            file_ext = os.path.splitext(filename)[1].lower()
-            try:
-                if file_ext == '.pdf':
-                    loader = PyPDFLoader(filepath)
-                    loaded_docs.extend(loader.load())
-                elif file_ext == '.txt':
-                    loader = TextLoader(filepath, encoding='utf-8', autodetect_encoding=True)
-                    loaded_docs.extend(loader.load())
-                # Add elif for other supported extensions here (e.g., .csv, .docx)
-                # Requires installing additional libraries (e.g., `unstructured`, `python-docx`)
-                # elif file_ext == '.docx':
-                #     from langchain_community.document_loaders import UnstructuredWordDocumentLoader
-                #     loader = UnstructuredWordDocumentLoader(filepath)
-                #     loaded_docs.extend(loader.load())
-                else:
-                    st.warning(f"  Skipping unsupported file type: {filename}")
-            except Exception as e:
-                st.error(f"Error loading file '{filename}': {e}")
+def drop_existing_store(rag_id, embeddings):
+    """Empties an existing store (and its manifest/keyword index) so chunks of removed files don't linger in a rebuilt index."""
+    clear_index_files(rag_id)
+    if not vector_store_exists(rag_id):
+        return
+    try:
+        open_vector_store(rag_id, embeddings).delete_collection()
+    except Exception:
+        if not uses_shared_chroma_client():
+            shutil.rmtree(get_persist_directory(rag_id), ignore_errors=True)
 
-    if loaded_docs:
-         st.success(f"Successfully loaded {len(loaded_docs)} document(s) from '{rag_id}'.")
-    elif files_found : # Check if files existed but none were loadable/supported
-         st.warning(f"Found files in '{rag_id}' but none were loaded (check file types and errors).")
+# --- Progress Reporting ---
+# The indexing pipeline reports through a callable `report(level, message="", **details)`, so it can run
+# inside a Streamlit script run (streamlit_reporter, the default) or as a background job (utils/index_jobs.py).
+# Levels: "write", "info", "warning", "error", "success" (messages), "progress" (a status line updated in
+# place), "stage" (a pipeline stage starts; details["stage"]) and "metrics" (counters in details only).
+def streamlit_reporter():
+    """Returns a reporter that shows messages with st.* in the current script run."""
+    status = None
 
-    return loaded_docs
+    def report(level, message="", **details):
+        nonlocal status
+        if level == "progress":
+            if status is None:
+                status = st.empty()
+            status.write(message)
+        elif level not in ("stage", "metrics"):
+            getattr(st, level)(message)
+    return report
 
-# --- Text Splitting ---
-def split_documents(documents, chunk_size=1000, chunk_overlap=150):
-    """Splits loaded documents into smaller chunks."""
-    if not documents:
-        return []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        add_start_index=True, # Helpful for locating source text
-        is_separator_regex=False,
+def console_reporter(level, message="", **details):
+    """Reporter for code without a script run (registry builds on worker threads): messages go to the console."""
+    if level not in ("stage", "metrics", "progress") and message:
+        print(f"[{level}] {message}")
+
+# --- Streaming Indexing Pipeline ---
+def ingest_into_store(vector_store, chunks_with_ids, checkpoint=None, report=None):
+    """Runs (Document, chunk_id) pairs through the batched, rate-limited embedding stage into the vector store."""
+    report = report or streamlit_reporter()
+
+    def on_progress(stats):
+        report("progress",
+               f"Embedded {stats.written} chunk(s) in {stats.batches} batch(es)"
+               f"{f', {stats.skipped} resumed from checkpoint' if stats.skipped else ''}"
+               f"{f', {stats.retries} rate-limit retries' if stats.retries else ''}...",
+               chunks_written=stats.written, chunks_skipped=stats.skipped, batches=stats.batches, retries=stats.retries)
+
+    stats = ingest_chunks(
+        chunks_with_ids,
+        embed_documents=vector_store.embeddings.embed_documents,
+        write_batch=vector_store_batch_writer(vector_store),
+        checkpoint=checkpoint,
+        on_progress=on_progress,
     )
+    on_progress(stats)
+    return stats
+
+def iter_file_chunks_with_ids(rag_id, filenames, file_entries, max_workers=None, report=None):
+    """Yields (Document, chunk_id) pairs for files loaded/split on the process pool.
+
+    Files that fail to load are reported as errors and skipped. The chunk IDs of each indexed
+    file are recorded in `file_entries[filename]["chunk_ids"]`."""
+    report = report or streamlit_reporter()
+    doc_path = os.path.join(BASE_DOC_DIR, rag_id)
+    filepaths = [os.path.join(doc_path, filename) for filename in filenames]
+    files_done = 0
+    for filename, chunks, error in iter_file_chunks(filepaths, max_workers=max_workers):
+        files_done += 1
+        report("metrics", files_done=files_done, files_total=len(filepaths))
+        if error:
+            report("error", f"Error loading file '{filename}': {error}")
+            continue
+        if chunks is None:
+            report("warning", f"  Skipping unsupported file type: {filename}")
+            continue
+        chunk_ids = make_chunk_ids(filename, file_entries[filename]["sha256"], len(chunks))
+        file_entries[filename]["chunk_ids"] = chunk_ids
+        yield from zip(chunks, chunk_ids)
+
+def index_files_streaming(vector_store, rag_id, filenames, file_entries, max_workers=None, report=None):
+    """Loads/splits files on the process pool and streams their chunks into `vector_store` in bounded batches.
+
+    Progress is checkpointed in the store directory, so an interrupted run resumes where it stopped.
+    Returns the number of chunks in the indexed files (written now or resumed from the checkpoint)."""
+    report = report or streamlit_reporter()
+    checkpoint = IngestCheckpoint(get_persist_directory(rag_id))
+    chunks_with_ids = iter_file_chunks_with_ids(rag_id, filenames, file_entries, max_workers=max_workers, report=report)
+    return ingest_into_store(vector_store, chunks_with_ids, checkpoint, report=report).total
+
+def rebuild_vector_store(rag_id="default", max_workers=None, report=None):
+    """Rebuilds a context's vector store from all of its documents using the parallel pipeline.
+
+    Progress goes to `report` (see streamlit_reporter); by default it is shown on the page."""
+    report = report or streamlit_reporter()
+    if not check_gemini_configured_for_rag():
+        return None
+
+    persist_directory = get_persist_directory(rag_id)
+    doc_path = os.path.join(BASE_DOC_DIR, rag_id)
+    report("stage", stage="scan")
+    file_entries = scan_files(doc_path)
+    if not file_entries:
+        report("warning", f"No files found in the '{rag_id}' document folder. Cannot create/recreate vector store.")
+        return None
+
     try:
-        splits = text_splitter.split_documents(documents)
-        st.write(f"Split {len(documents)} documents into {len(splits)} chunks.")
-        return splits
+        mark_index_changed(rag_id)
+        embeddings = get_embeddings()
+        resuming = IngestCheckpoint(persist_directory).exists()
+        if resuming:
+            # A previous run was interrupted: keep its chunks and resume from the checkpoint
+            report("info", f"Resuming interrupted indexing run for '{rag_id}' from its checkpoint.")
+            clear_index_files(rag_id)
+        else:
+            drop_existing_store(rag_id, embeddings)
+        os.makedirs(persist_directory, exist_ok=True)
+        vector_store = open_vector_store(rag_id, embeddings)
+
+        report("stage", stage="load_split_embed")
+        workers = max_workers or get_default_loader_workers()
+        report("write", f"Loading and splitting {len(file_entries)} file(s) with up to {workers} worker process(es)...")
+        total_chunks = index_files_streaming(vector_store, rag_id, list(file_entries), file_entries, max_workers=workers, report=report)
+        if total_chunks == 0:
+            report("error", f"No chunks were produced for '{rag_id}'. Check the document folder and file types.")
+            return None
+
+        report("stage", stage="manifest")
+        manifest = new_manifest(rag_id, EMBEDDING_MODEL_NAME)
+        manifest["files"] = {f: entry for f, entry in file_entries.items() if "chunk_ids" in entry}
+        if resuming:
+            # Chunks kept from the interrupted run may belong to files removed or changed since
+            indexed_ids = {chunk_id for entry in manifest["files"].values() for chunk_id in entry["chunk_ids"]}
+            stale_ids = [chunk_id for chunk_id in vector_store.get(include=[])["ids"] if chunk_id not in indexed_ids]
+            if stale_ids:
+                vector_store.delete(ids=stale_ids)
+                report("write", f"Removed {len(stale_ids)} outdated chunk(s) left by the interrupted run.")
+        save_manifest(persist_directory, manifest)
+        IngestCheckpoint(persist_directory).clear()
+        report("stage", stage="keyword_index")
+        build_lexical_index(rag_id, vector_store, report=report)
+        report("success", f"Successfully indexed {total_chunks} chunk(s) from {len(manifest['files'])} file(s) for '{rag_id}'.")
+        return vector_store
     except Exception as e:
-        st.error(f"Error splitting documents: {e}")
-        return []
+        report("error", f"Fatal error creating vector store for '{rag_id}': {e}")
+        report("info", "Progress so far has been checkpointed. Re-run indexing to resume where it stopped.")
+        return None
+    finally:
+        mark_index_changed(rag_id)
 
+# --- Lexical (BM25) Index ---
+def get_lexical_index_path(rag_id):
+    """The BM25 index is stored next to the context's Chroma files."""
+    return os.path.join(get_persist_directory(rag_id), LEXICAL_INDEX_FILENAME)
 
-# --- Embeddings and Vector Store ---
-def create_or_load_vector_store(splits, rag_id="default", force_recreate=False):
-    """Creates a Chroma vector store or loads an existing one for a specific RAG context."""
+def build_lexical_index(rag_id, vector_store, report=None):
+    """(Re)builds a context's BM25 index from the chunks stored in its vector store.
+
+    Reading the stored chunks (no embedding calls) keeps it in sync after full and incremental indexing."""
+    try:
+        stored = vector_store.get(include=["documents", "metadatas"])
+        lexical_index = BM25Index()
+        lexical_index.add(stored["ids"], stored["documents"], stored["metadatas"])
+        lexical_index.save(get_lexical_index_path(rag_id))
+        return lexical_index
+    except Exception as e:
+        (report or streamlit_reporter())("warning", f"Could not build the keyword (BM25) index for '{rag_id}': {e}. Search will use vectors only.")
+        return None
+
+# --- Incremental Indexing ---
+def update_vector_store_incremental(rag_id="default", filenames=None, report=None):
+    """Updates a context's vector store from its file manifest instead of rebuilding it.
+
+    Only new/modified files are loaded, split and embedded; chunks of modified/removed files are
+    deleted by ID. If `filenames` is given, only those files are checked (e.g., fresh uploads).
+    Falls back to a full re-index if the store or its manifest does not exist yet, or if an earlier
+    indexing run was interrupted (its checkpoint exists): the full run resumes from the checkpoint.
+    Progress goes to `report` (see streamlit_reporter); by default it is shown on the page."""
+    report = report or streamlit_reporter()
     if not check_gemini_configured_for_rag():
         return None
 
-    # Define the specific persistent directory for this RAG context
-    persist_directory = os.path.join(BASE_VECTOR_STORE_DIR, f"{rag_id}_chroma")
-    embedding_model_name = "models/embedding-001" # Recommended Gemini embedding model
+    persist_directory = get_persist_directory(rag_id)
+    doc_path = os.path.join(BASE_DOC_DIR, rag_id)
+    manifest = load_manifest(persist_directory) if vector_store_exists(rag_id) else None
+    if manifest is None or manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        report("info", f"No index manifest found for '{rag_id}'. Running a full index instead.")
+        return rebuild_vector_store(rag_id=rag_id, report=report)
+    if IngestCheckpoint(persist_directory).exists():
+        report("info", f"An earlier indexing run for '{rag_id}' did not finish. Resuming it as a full index.")
+        return rebuild_vector_store(rag_id=rag_id, report=report)
+
+    report("stage", stage="scan")
+    current_entries = scan_files(doc_path, filenames=filenames, previous_entries=manifest["files"])
+    added, changed, removed = diff_manifest(manifest["files"], current_entries, filenames=filenames)
+    vector_store = get_vector_store(rag_id)
+    if vector_store is None:
+        return None
+    if not (added or changed or removed):
+        report("info", f"Knowledge base '{rag_id}' is already up to date.")
+        return vector_store
+    report("write", f"Changes for '{rag_id}': {len(added)} new, {len(changed)} modified, {len(removed)} removed file(s).")
 
     try:
-        embeddings = GoogleGenerativeAIEmbeddings(model=embedding_model_name)
+        mark_index_changed(rag_id)
+        stale_ids = []
+        for filename in changed + removed:
+            stale_ids.extend(manifest["files"][filename].get("chunk_ids", []))
+        if stale_ids:
+            vector_store.delete(ids=stale_ids)
+            report("write", f"Removed {len(stale_ids)} outdated chunk(s).")
+        for filename in removed:
+            del manifest["files"][filename]
+
+        to_index = added + changed
+        if to_index:
+            new_entries = {filename: current_entries[filename] for filename in to_index}
+            report("stage", stage="load_split_embed")
+            index_files_streaming(vector_store, rag_id, to_index, new_entries, report=report)
+            for filename, entry in new_entries.items():
+                if "chunk_ids" in entry:
+                    manifest["files"][filename] = entry
+                else:
+                    # Nothing indexed for this file (load error); leave it out so it is retried
+                    manifest["files"].pop(filename, None)
+
+        # Unchanged files may still have a new mtime; keep it so they aren't re-hashed next time
+        for filename, entry in current_entries.items():
+            if filename in manifest["files"]:
+                manifest["files"][filename].update(size=entry["size"], mtime=entry["mtime"])
+        save_manifest(persist_directory, manifest)
+        IngestCheckpoint(persist_directory).clear()
+        report("stage", stage="keyword_index")
+        build_lexical_index(rag_id, vector_store, report=report)
+        report("success", f"Incrementally updated vector store for '{rag_id}'.")
+        return vector_store
     except Exception as e:
-        st.error(f"Error initializing GoogleGenerativeAIEmbeddings ({embedding_model_name}): {e}")
+        report("error", f"Error during incremental update of '{rag_id}': {e}. A full re-index is recommended.")
         return None
+    finally:
+        mark_index_changed(rag_id)
 
-    vector_store = None
-    # Check if the directory exists and we are not forcing recreation
-    if os.path.exists(persist_directory) and os.path.isdir(persist_directory) and not force_recreate:
-        try:
-            st.write(f"Attempting to load existing vector store for '{rag_id}' from: `{persist_directory}`")
-            vector_store = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=embeddings
-            )
-            # Perform a quick check to see if loading worked (e.g., count items)
-            # This can fail if the store is corrupted or incompatible
-            # count = vector_store._collection.count() # Accessing internal API, might change
-            # st.success(f"Successfully loaded vector store for '{rag_id}' with approx. {count} items.")
-            st.success(f"Successfully loaded vector store for '{rag_id}'.")
-        except Exception as e:
-            st.error(f"Error loading existing vector store from '{persist_directory}': {e}. Will attempt to recreate.")
-            st.info("This might happen if the vector store files are corrupted or incompatible. Removing old store...")
-            try:
-                shutil.rmtree(persist_directory) # Remove corrupted/old store
-                st.info("Old vector store directory removed.")
-            except Exception as remove_err:
-                st.error(f"Could not remove old vector store directory: {remove_err}. Manual deletion might be required: {persist_directory}")
-            force_recreate = True # Force recreation after failed load
-
-    # Create new store if it doesn't exist, load failed, or force_recreate is True
-    if vector_store is None or force_recreate:
-        if not splits:
-            st.warning(f"No document splits provided for '{rag_id}'. Cannot create/recreate vector store.")
-            # If forcing recreate but no splits, ensure the old directory is gone if it exists
-            if force_recreate and os.path.exists(persist_directory):
-                try:
-                     shutil.rmtree(persist_directory)
-                except Exception as remove_err:
-                     st.error(f"Could not remove directory during failed recreate: {remove_err}")
+# --- Shared RAG Registry ---
+# Opening a vector store (Chroma's SQLite + HNSW files) and building the embedding/LLM
+# clients is expensive, so each context is opened once per process and shared by every
+# Streamlit session instead of being rebuilt into each session's st.session_state.
+# Every context has a generation counter: a re-index or delete bumps it through
+# invalidate_rag_context(), so all sessions pick up a fresh store/chain on their next access.
+# _registry_lock only guards the dicts below; the slow opens/builds run under a per-context lock,
+# so one context being opened doesn't block the others. A result built while the context was
+# invalidated is returned to its caller but not published.
+# These functions also run on index-job and API worker threads: they write no st.* output
+# (callers show their own message when they get None).
+_registry_lock = threading.RLock()
+_context_locks = {}          # rag_id -> RLock serializing opens/builds for that context
+_context_generations = {}    # rag_id -> generation counter
+_vector_store_registry = {}  # rag_id -> (generation, vector_store)
+_lexical_index_registry = {} # rag_id -> (generation, BM25Index or None)
+_rag_chain_registry = {}     # (rag_id, chain options...) -> (generation, qa_chain)
+
+def _get_context_lock(rag_id):
+    with _registry_lock:
+        return _context_locks.setdefault(rag_id, threading.RLock())
+
+def _get_cached(registry, key, rag_id):
+    """Returns (current generation of the context, registry entry of that generation or None)."""
+    with _registry_lock:
+        generation = _context_generations.get(rag_id, 0)
+        cached = registry.get(key)
+        return generation, (cached if cached and cached[0] == generation else None)
+
+def _publish(registry, key, rag_id, generation, value):
+    """Caches `value` unless the context was invalidated since `generation` was read."""
+    with _registry_lock:
+        if _context_generations.get(rag_id, 0) == generation:
+            registry[key] = (generation, value)
+
+def get_context_generation(rag_id):
+    """Returns the current generation counter for a RAG context."""
+    with _registry_lock:
+        return _context_generations.get(rag_id, 0)
+
+def invalidate_rag_context(rag_id):
+    """Drops the shared vector store and chains for a context and bumps its generation.
+
+    Call this after re-indexing or deleting a context so every session reloads it."""
+    with _registry_lock:
+        _context_generations[rag_id] = _context_generations.get(rag_id, 0) + 1
+        _vector_store_registry.pop(rag_id, None)
+        _lexical_index_registry.pop(rag_id, None)
+        for key in [key for key in _rag_chain_registry if key[0] == rag_id]:
+            del _rag_chain_registry[key]
+        return _context_generations[rag_id]
+
+def get_vector_store(rag_id="default"):
+    """Returns the process-wide vector store for a context, opening it on first use (None if not indexed)."""
+    with _get_context_lock(rag_id):
+        generation, cached = _get_cached(_vector_store_registry, rag_id, rag_id)
+        if cached:
+            return cached[1]
+        if not vector_store_exists(rag_id):
             return None
+        vector_store = open_vector_store(rag_id, get_embeddings())
+        _publish(_vector_store_registry, rag_id, rag_id, generation, vector_store)
+        return vector_store
+
+def get_lexical_index(rag_id="default"):
+    """Returns the process-wide BM25 index for a context (built from the vector store if missing)."""
+    with _get_context_lock(rag_id):
+        generation, cached = _get_cached(_lexical_index_registry, rag_id, rag_id)
+        if cached:
+            return cached[1]
 
+        lexical_index = None
+        index_path = get_lexical_index_path(rag_id)
         try:
-            st.write(f"Creating {'new' if not force_recreate else 'replacement'} vector store for '{rag_id}' at: `{persist_directory}`")
-            os.makedirs(persist_directory, exist_ok=True) # Ensure directory exists before writing
-            vector_store = Chroma.from_documents(
-                documents=splits,
-                embedding=embeddings,
-                persist_directory=persist_directory # This saves the embeddings
-            )
-            # vector_store.persist() # Persist explicitly (Chroma usually does this on creation with persist_directory)
-            st.success(f"Successfully created and persisted vector store for '{rag_id}'.")
+            if os.path.exists(index_path):
+                lexical_index = BM25Index.load(index_path)
+            elif vector_store_exists(rag_id):
+                # Stores indexed before BM25 support: build it once from the stored chunks
+                vector_store = get_vector_store(rag_id)
+                lexical_index = build_lexical_index(rag_id, vector_store, report=console_reporter) if vector_store else None
         except Exception as e:
-            st.error(f"Fatal error creating vector store for '{rag_id}': {e}")
-            # Clean up potentially partially created directory on failure
-            if os.path.exists(persist_directory):
-                 try:
-                      shutil.rmtree(persist_directory)
-                 except Exception: pass # Ignore cleanup error
-            return None
+            print(f"Could not load BM25 index for '{rag_id}': {e}") # Log to console; vector search still works
+        _publish(_lexical_index_registry, rag_id, rag_id, generation, lexical_index)
+        return lexical_index
+
+def get_rag_chain(rag_id="default", **chain_options):
+    """Returns the shared RAG chain for a context, building it on first use or after invalidation.
+
+    `chain_options` are passed to setup_rag_chain(); each distinct combination is cached separately.
+    Returns None if the context isn't indexed or the chain can't be built (details go to the console)."""
+    key = (rag_id,) + tuple(sorted(chain_options.items()))
+    with _get_context_lock(rag_id):
+        generation, cached = _get_cached(_rag_chain_registry, key, rag_id)
+        if cached:
+            return cached[1]
+
+        qa_chain = setup_rag_chain(rag_id=rag_id, **chain_options)
+        # Failed setups are not cached, so the next access retries (e.g., after indexing)
+        if qa_chain is not None:
+            _publish(_rag_chain_registry, key, rag_id, generation, qa_chain)
+        return qa_chain
+
+# --- Hybrid Retrieval ---
+# Scores from different searches are on different scales: vector relevance in [0, 1], unbounded
+# BM25 scores and small RRF sums (~0.03). Lexical and hybrid results record theirs in the
+# Document's 'score_type' metadata (absent = relevance), so format_context labels them correctly.
+SCORE_TYPE_RELEVANCE = "relevance"
+SCORE_TYPE_BM25 = "bm25"
+SCORE_TYPE_RRF = "rrf"
+SCORE_TYPE_LABELS = {SCORE_TYPE_RELEVANCE: "relevance", SCORE_TYPE_BM25: "keyword score", SCORE_TYPE_RRF: "rank-fusion score"}
 
-    return vector_store
+def _chunk_key(doc):
+    """Identifies a chunk across vector and lexical results."""
+    return (doc.metadata.get('source'), doc.metadata.get('page'), doc.metadata.get('start_index'), doc.page_content[:64])
+
+def is_exact_token_query(query, lexical_index):
+    """True if the query is mostly identifiers (part numbers, error codes) that the lexical index knows."""
+    identifiers = identifier_terms(query)
+    if not identifiers or not all(lexical_index.has_term(term) for term in identifiers):
+        return False
+    # Compare against whole query tokens, e.g. "E10" or "error E10" -> yes, "why does the unit show E10 at night" -> no
+    query_tokens = [t for t in tokenize(query) if t not in identifiers and not any(t in i.split('-') for i in identifiers)]
+    return len(identifiers) >= len(query_tokens)
+
+def lexical_search(rag_id, query, k=4):
+    """BM25-only search: returns (Document, bm25_score) pairs without any embedding call.
+
+    Each Document gets its own copy of the chunk metadata (with 'score_type': "bm25"), so callers can
+    tag it without touching the cached index."""
+    lexical_index = get_lexical_index(rag_id)
+    if lexical_index is None:
+        return []
+    return [
+        (Document(page_content=lexical_index.docs[chunk_id]["text"],
+                  metadata={**lexical_index.docs[chunk_id]["metadata"], 'score_type': SCORE_TYPE_BM25}), score)
+        for chunk_id, score in lexical_index.search(query, k)
+    ]
+
+def hybrid_search(rag_id, query, k=4, fetch_k=None):
+    """BM25 + vector search fused with reciprocal rank fusion. Returns (Document, fused_score) pairs.
+
+    Exact-token queries (e.g. 'CAP-DR-4505-440', 'E10') are answered from the lexical index alone,
+    skipping the query-embedding round-trip. The Documents' 'score_type' metadata says which score
+    each pair carries: "rrf" when fused, "bm25" for lexical-only answers, absent (relevance) for vector-only."""
+    fetch_k = fetch_k or k * 3
+    lexical_index = get_lexical_index(rag_id)
+    lexical_hits = lexical_search(rag_id, query, fetch_k) if lexical_index else []
+    if lexical_hits and is_exact_token_query(query, lexical_index):
+        return lexical_hits[:k]
+
+    vector_hits = retrieve_context(rag_id, query, fetch_k)
+    if not lexical_hits:
+        return vector_hits[:k]
+
+    docs_by_key = {}
+    for doc, _ in vector_hits + lexical_hits:
+        docs_by_key.setdefault(_chunk_key(doc), doc)
+    fused = reciprocal_rank_fusion([
+        [_chunk_key(doc) for doc, _ in vector_hits],
+        [_chunk_key(doc) for doc, _ in lexical_hits],
+    ])
+    return [(Document(page_content=docs_by_key[key].page_content,
+                      metadata={**docs_by_key[key].metadata, 'score_type': SCORE_TYPE_RRF}), score)
+            for key, score in fused[:k]]
 
 # --- RAG Querying ---
-def setup_rag_chain(rag_id="default", model_name="gemini-1.5-flash", temperature=0.1, k_results=4):
-    """Sets up the Langchain RAG chain for querying a specific context."""
+DEFAULT_TOKEN_COUNTER = os.getenv("RAG_TOKEN_COUNTER", "local") # "local" estimate or "gemini" count_tokens API
+
+def get_token_counter(kind=DEFAULT_TOKEN_COUNTER, model_name="gemini-1.5-flash"):
+    """Returns a text -> token count function: a local estimate, or the model's tokenizer (falls back to the estimate on error)."""
+    if kind != "gemini":
+        return estimate_tokens
+
+    def count(text):
+        try:
+            return count_tokens(text, model_name)
+        except Exception as e:
+            print(f"Token counting via Gemini failed, using local estimate: {e}")
+            return estimate_tokens(text)
+    return count
+
+def get_reranker(kind=DEFAULT_RERANKER):
+    """Returns the pooled reranker for `kind` ("lexical", "cross-encoder"), or None for "none"."""
+    if not kind or kind == "none":
+        return None
+    if kind not in RERANKERS:
+        raise ValueError(f"Unknown reranker '{kind}'. Options: none, {', '.join(RERANKERS)}.")
+    return get_pooled_client("reranker", lambda kind: RERANKERS[kind](), kind=kind)
+
+def setup_rag_chain(rag_id="default", model_name="gemini-1.5-flash", temperature=0.1, k_results=4, search_type="hybrid",
+                    fetch_k=20, lambda_mult=0.5, score_threshold=0.5, merge_adjacent=True,
+                    context_token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, token_counter=DEFAULT_TOKEN_COUNTER,
+                    reranker=DEFAULT_RERANKER, rerank_fetch_k=DEFAULT_RERANK_FETCH_K):
+    """Sets up the Langchain RAG chain for querying a specific context.
+
+    search_type:
+      - "hybrid": BM25 + vector with rank fusion (vector-only if the context has no keyword index)
+      - "similarity": vector similarity
+      - "mmr": maximal marginal relevance over the `fetch_k` most similar chunks (`lambda_mult`: 1 = relevance only)
+      - "similarity_score_threshold": up to k chunks with relevance >= `score_threshold`
+    reranker ("none", "lexical", "cross-encoder"): retrieve `rerank_fetch_k` candidates, rerank them locally
+    and keep the best `k_results` (see utils/rerank.py).
+    merge_adjacent merges retrieved chunks that overlap in the same file/page (see merge_adjacent_chunks).
+    context_token_budget caps the retrieved context in the prompt (None = no cap); tokens are counted with
+    `token_counter` ("local" estimate or "gemini" tokenizer API, see get_token_counter).
+    Writes no st.* output (it runs on worker threads too); returns None on failure.
+    Prefer get_rag_chain(), which shares the chain across sessions."""
     if not check_gemini_configured_for_rag():
         return None
 
-    persist_directory = os.path.join(BASE_VECTOR_STORE_DIR, f"{rag_id}_chroma")
-    if not os.path.exists(persist_directory) or not os.path.isdir(persist_directory):
-        st.warning(f"Vector store for RAG context '{rag_id}' not found at `{persist_directory}`. Please index documents first using 'Manage Knowledge Base'.")
+    if not vector_store_exists(rag_id):
+        print(f"Vector store for RAG context '{rag_id}' not found at '{get_persist_directory(rag_id)}'.") # Log to console
         return None
 
     try:
-        embedding_model_name = "models/embedding-001"
-        embeddings = GoogleGenerativeAIEmbeddings(model=embedding_model_name)
-
-        st.write(f"Loading vector store for '{rag_id}' to create RAG chain...")
-        vector_store = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embeddings
-        )
-        st.write("Vector store loaded.")
+        vector_store = get_vector_store(rag_id)
+        if vector_store is None:
+            return None
 
         # Initialize the LLM for the chain
-        llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature, convert_system_message_to_human=True)
+        llm = get_chat_model(model_name, temperature)
+
+        # Configure retriever (over-fetch when a reranker picks the final k)
+        scorer = get_reranker(reranker)
+        retrieval_k = max(rerank_fetch_k, k_results) if scorer else k_results
+        if search_type == "hybrid":
+            retriever = FunctionRetriever(search_fn=lambda query: [doc for doc, _ in hybrid_search(rag_id, query, k=retrieval_k)])
+        else:
+            search_kwargs = {"k": retrieval_k} # Number of documents to retrieve
+            if search_type == "mmr":
+                search_kwargs.update(fetch_k=max(fetch_k, retrieval_k), lambda_mult=lambda_mult)
+            elif search_type == "similarity_score_threshold":
+                search_kwargs["score_threshold"] = score_threshold
+            retriever = vector_store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
 
-        # Configure retriever
-        retriever = vector_store.as_retriever(
-             search_type="similarity", # Other options: "mmr", "similarity_score_threshold"
-             search_kwargs={"k": k_results} # Number of documents to retrieve
-             )
+        # Post-retrieval steps between the retriever and the prompt
+        postprocessors = []
+        if scorer:
+            postprocessors.append(lambda query, docs: rerank(query, docs, scorer, top_n=k_results))
+        if merge_adjacent:
+            postprocessors.append(lambda query, docs: merge_adjacent_chunks(docs))
+        if context_token_budget:
+            counter = get_token_counter(token_counter, model_name)
+            postprocessors.append(lambda query, docs: pack_context(docs, context_token_budget, count_tokens=counter))
+        if postprocessors:
+            retriever = PipelineRetriever(base_retriever=retriever, postprocessors=postprocessors)
 
         # Create the QA chain (using RetrievalQA for simplicity)
         # Chain types: "stuff", "map_reduce", "refine", "map_rerank"
@@ -211,22 +674,141 @@ def setup_rag_chain(rag_id="default", model_name="gemini-1.5-flash", temperature
             return_source_documents=True, # Return the documents used for the answer
             # chain_type_kwargs={"prompt": YOUR_CUSTOM_PROMPT} # Optional: customize prompt
         )
-        st.success(f"RAG chain ready for context '{rag_id}'.")
+        # Identifies the chain's configuration for the answer cache in query_rag()
+        qa_chain.metadata = {
+            "rag_id": rag_id, "model_name": model_name, "k_results": k_results,
+            "options_key": repr((temperature, search_type, fetch_k, lambda_mult, score_threshold, merge_adjacent,
+                                 context_token_budget, token_counter, reranker, rerank_fetch_k)),
+        }
         return qa_chain
 
     except Exception as e:
-        st.error(f"Error setting up RAG chain for context '{rag_id}': {e}")
-        # Log detailed error for debugging
-        # import traceback
-        # st.error(traceback.format_exc())
+        print(f"Error setting up RAG chain for context '{rag_id}': {e}") # Log to console; callers report the failure
+        return None
+
+# --- Retrieval-Only Fast Path ---
+# For callers that put retrieved text into their own prompt (invoice pricing, parts suggestions),
+# running the full RetrievalQA chain would cost an extra LLM round-trip. These helpers return the
+# top-k chunks directly, so the caller makes a single generation call.
+# The retrieval helpers below also run off the script thread (API workers, indexing jobs, inside
+# the chain's retriever), so errors go to `report` (console by default); Streamlit callers pass
+# streamlit_reporter() to show them on the page.
+def open_context_store(rag_id="default", report=console_reporter):
+    """Ensures Gemini is configured and returns the shared vector store for a context (None if not indexed or on error)."""
+    if not check_gemini_configured_for_rag():
+        return None
+    try:
+        return get_vector_store(rag_id)
+    except Exception as e:
+        report("error", f"Error loading vector store for context '{rag_id}': {e}")
         return None
 
-def query_rag(qa_chain, query):
-    """Queries the RAG chain and returns the result and source documents."""
+def retrieve_context(rag_id, query, k=4, report=console_reporter):
+    """Returns the top-k chunks for `query` as (Document, relevance_score) pairs, without calling the LLM.
+
+    Scores are in [0, 1], higher is more relevant. Returns [] if the context isn't indexed or on error."""
+    vector_store = get_vector_store(rag_id)
+    if vector_store is None:
+        return []
+    try:
+        return vector_store.similarity_search_with_relevance_scores(query, k=k)
+    except Exception as e:
+        report("error", f"Error retrieving context from '{rag_id}': {e}")
+        return []
+
+def format_context(results, max_chars_per_chunk=None):
+    """Formats (Document, score) pairs as a prompt-ready context block with source labels.
+
+    Each score is labeled by the Document's 'score_type' metadata (relevance, keyword score or
+    rank-fusion score). Chunks that appear more than once (e.g. from several lookups) are included only once."""
+    blocks, seen = [], set()
+    for doc, score in results:
+        dedupe_key = (doc.metadata.get('source'), doc.metadata.get('start_index'), doc.page_content[:200])
+        if dedupe_key in seen:
+            continue
+        seen.add(dedupe_key)
+        label = os.path.basename(doc.metadata.get('source', 'unknown source'))
+        if doc.metadata.get('rag_context'):
+            label = f"{doc.metadata['rag_context']}: {label}"
+        if doc.metadata.get('page') is not None:
+            label += f", page {doc.metadata['page'] + 1}"
+        text = doc.page_content
+        if max_chars_per_chunk and len(text) > max_chars_per_chunk:
+            text = text[:max_chars_per_chunk] + "..."
+        score_label = SCORE_TYPE_LABELS.get(doc.metadata.get('score_type'), SCORE_TYPE_LABELS[SCORE_TYPE_RELEVANCE])
+        score_format = ".3f" if doc.metadata.get('score_type') == SCORE_TYPE_RRF else ".2f" # RRF sums are ~0.03
+        blocks.append(f"[Source: {label} | {score_label} {score:{score_format}}]\n{text}")
+    return "\n\n".join(blocks)
+
+# --- Federated Search ---
+def _search_store_by_vector(rag_id, vector_store, query_embedding, k):
+    """Searches one store with a precomputed query vector. Returns (rag_id, [(Document, relevance)], error)."""
+    try:
+        # Convert Chroma distances with the store's own distance -> [0, 1] relevance mapping (the same one
+        # similarity_search_with_relevance_scores uses), so scores are comparable across stores
+        relevance_fn = vector_store._select_relevance_score_fn()
+        hits = vector_store.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
+        return rag_id, [(doc, relevance_fn(distance)) for doc, distance in hits], None
+    except Exception as e:
+        return rag_id, [], e
+
+def federated_search(query, k=6, rag_ids=None, k_per_context=None, max_workers=None, report=console_reporter):
+    """Searches all indexed contexts (or `rag_ids`) at once and returns the merged top-k (Document, score) pairs.
+
+    The query is embedded once and the stores are searched in parallel threads, so latency is that of
+    the slowest store rather than the sum. Each Document's metadata gets a 'rag_context' tag.
+    Embedding errors and skipped stores go to `report` (on the calling thread)."""
+    if not check_gemini_configured_for_rag():
+        return []
+    rag_ids = rag_ids if rag_ids is not None else list_indexed_contexts()
+    stores = [(rag_id, store) for rag_id in rag_ids if (store := get_vector_store(rag_id)) is not None]
+    if not stores:
+        return []
+
+    try:
+        query_embedding = get_embeddings().embed_query(query)
+    except Exception as e:
+        report("error", f"Error embedding the search query: {e}")
+        return []
+
+    k_per_context = k_per_context or k
+    with ThreadPoolExecutor(max_workers=max_workers or len(stores)) as executor:
+        outcomes = list(executor.map(
+            lambda item: _search_store_by_vector(item[0], item[1], query_embedding, k_per_context), stores
+        ))
+
+    merged = []
+    for rag_id, hits, error in outcomes:
+        if error:
+            report("warning", f"Search in '{rag_id}' failed and was skipped: {error}")
+            continue
+        for doc, score in hits:
+            # Tag a copy: the store may hand out metadata dicts it shares with its cache or index
+            merged.append((Document(page_content=doc.page_content, metadata={**doc.metadata, 'rag_context': rag_id}), score))
+    merged.sort(key=lambda pair: pair[1], reverse=True)
+    return merged[:k]
+
+def query_rag(qa_chain, query, use_cache=ANSWER_CACHE_ENABLED):
+    """Queries the RAG chain and returns the result and source documents.
+
+    Answers are cached per (context, index version, normalized query, model, k, chain options) for chains
+    built by setup_rag_chain(); a repeat question is answered without any embedding or LLM call."""
     if not qa_chain:
         st.error("RAG chain is not initialized.")
         return "Error: RAG system not available.", []
 
+    chain_info = getattr(qa_chain, "metadata", None) or {}
+    cache_key = None
+    if use_cache and chain_info.get("rag_id"):
+        rag_id = chain_info["rag_id"]
+        index_version = get_index_version(BASE_VECTOR_STORE_DIR, rag_id)
+        cache_key = make_answer_key(rag_id, index_version, query, chain_info["model_name"],
+                                    chain_info["k_results"], chain_info["options_key"])
+        cached = get_answer_cache().get(cache_key, rag_id, index_version)
+        if cached is not None:
+            answer, sources = cached
+            return answer, [Document(page_content=s["page_content"], metadata=s["metadata"]) for s in sources]
+
     try:
         with st.spinner("Searching knowledge base and generating answer..."):
             # Input must be a dictionary with the key "query" for RetrievalQA
@@ -238,6 +820,9 @@ def query_rag(qa_chain, query):
         # Post-processing or validation can happen here
         if not answer.strip():
              answer = "The AI generated an empty response, possibly due to filtering or lack of relevant information in the retrieved documents."
+        elif cache_key:
+            get_answer_cache().put(cache_key, rag_id, index_version, answer,
+                                   [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in source_docs])
 
         return answer, source_docs
     except Exception as e:
@@ -0,0 +1,76 @@
+import time
+import random
+import threading
+
+# --- Rate Limiting & Backoff Helpers ---
+# Shared by the embedding ingestion stage and batch LLM workloads so they stay inside
+# Gemini's per-minute quotas instead of failing partway through a run.
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate_per_minute` acquisitions per minute with bursts up to `capacity`."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = max(rate_per_minute, 1e-9) / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 60.0)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+
+    def try_acquire(self, tokens=1):
+        """Takes `tokens` if available right now. Returns True on success."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` are available, then takes them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate_per_second
+            time.sleep(wait_seconds)
+
+def is_rate_limit_error(error):
+    """Checks whether an error (or the error it wraps) is a quota / rate-limit error (HTTP 429)."""
+    while error is not None:
+        if type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+            return True
+        message = str(error)
+        if "429" in message or "ResourceExhausted" in message or "quota" in message.lower():
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def retry_with_backoff(fn, *args, max_retries=6, base_delay=1.0, max_delay=60.0,
+                       is_retryable=is_rate_limit_error, on_retry=None, **kwargs):
+    """Calls fn(*args, **kwargs), retrying retryable errors with exponential backoff.
+
+    `on_retry(attempt, delay, error)` is called before each retry. Non-retryable errors, and the
+    last error once retries are exhausted, are raised to the caller."""
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if on_retry:
+                on_retry(attempt + 1, delay, e)
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,126 @@
+import os
+import math
+import time
+import threading
+from collections import Counter, deque
+from .lexical_index import tokenize
+from .context_processing import estimate_tokens
+
+# --- Reranking ---
+# Optional stage between the retriever and the prompt: retrieve more candidates than needed
+# (e.g. 20), score them against the query with a local scorer, keep the best few (e.g. 4).
+# Scorers implement `score(query, texts) -> list[float]` (higher = more relevant); `batch_size`
+# controls how many texts are scored per call (None = all candidates in one call).
+# Each rerank is timed and recorded in `rerank_stats` with the candidate/kept token estimates
+# (rerank_stats.summary()), so the added milliseconds can be weighed against the prompt tokens saved.
+DEFAULT_RERANKER = os.getenv("RAG_RERANKER", "none") # "none", "lexical" or "cross-encoder"
+DEFAULT_RERANK_FETCH_K = int(os.getenv("RAG_RERANK_FETCH_K", "20"))
+DEFAULT_CROSS_ENCODER_MODEL = os.getenv("RAG_CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+class LexicalOverlapReranker:
+    """CPU-only scorer: BM25 over the candidate set, plus query-term coverage and bigram (phrase) overlap."""
+
+    batch_size = None # Term statistics are computed over all candidates at once
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query, texts):
+        query_tokens = tokenize(query)
+        query_terms = set(query_tokens)
+        if not query_terms or not texts:
+            return [0.0] * len(texts)
+        doc_terms = [tokenize(text) for text in texts]
+        doc_tfs = [Counter(terms) for terms in doc_terms]
+        avg_length = sum(len(terms) for terms in doc_terms) / len(doc_terms) or 1.0
+        n = len(texts)
+        idf = {}
+        for t in query_terms:
+            df = sum(1 for tf in doc_tfs if t in tf)
+            idf[t] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        idf_total = sum(idf.values()) or 1.0
+        query_bigrams = set(zip(query_tokens, query_tokens[1:]))
+
+        bm25_scores, coverage, phrase = [], [], []
+        for terms, tf in zip(doc_terms, doc_tfs):
+            norm = self.k1 * (1 - self.b + self.b * len(terms) / avg_length)
+            bm25_scores.append(sum(idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in query_terms if t in tf))
+            coverage.append(sum(idf[t] for t in query_terms if t in tf) / idf_total)
+            if query_bigrams:
+                phrase.append(len(query_bigrams & set(zip(terms, terms[1:]))) / len(query_bigrams))
+            else:
+                phrase.append(0.0)
+        top_bm25 = max(bm25_scores) or 1.0
+        return [0.6 * s / top_bm25 + 0.25 * c + 0.15 * p for s, c, p in zip(bm25_scores, coverage, phrase)]
+
+class CrossEncoderReranker:
+    """Scores (query, text) pairs with a sentence-transformers cross-encoder (optional dependency)."""
+
+    def __init__(self, model_name=DEFAULT_CROSS_ENCODER_MODEL, batch_size=16):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("The cross-encoder reranker needs `pip install sentence-transformers`.") from e
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def score(self, query, texts):
+        return [float(s) for s in self.model.predict([(query, text) for text in texts], batch_size=self.batch_size)]
+
+RERANKERS = {
+    "lexical": LexicalOverlapReranker,
+    "cross-encoder": CrossEncoderReranker,
+}
+
+# --- Timing Stats ---
+class RerankStats:
+    """Process-wide log of recent rerank timings and token savings."""
+
+    def __init__(self, max_records=500):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, **record):
+        with self._lock:
+            self._records.append(record)
+
+    def summary(self):
+        with self._lock:
+            records = list(self._records)
+        if not records:
+            return {"queries": 0}
+        timings = sorted(r["ms"] for r in records)
+        return {
+            "queries": len(records),
+            "mean_ms": sum(timings) / len(timings),
+            "p95_ms": timings[max(0, int(len(timings) * 0.95) - 1)],
+            "mean_candidate_tokens": sum(r["candidate_tokens"] for r in records) / len(records),
+            "mean_kept_tokens": sum(r["kept_tokens"] for r in records) / len(records),
+        }
+
+rerank_stats = RerankStats()
+
+def rerank(query, docs, reranker, top_n=4):
+    """Returns the `top_n` docs by reranker score (ties keep retrieval order) as new Documents whose metadata
+    has a 'rerank_score' (the input Documents, and any metadata dicts they share with an index, are not modified)."""
+    if not docs:
+        return docs
+    start = time.perf_counter()
+    texts = [doc.page_content for doc in docs]
+    batch_size = getattr(reranker, "batch_size", None) or len(texts)
+    scores = []
+    for offset in range(0, len(texts), batch_size):
+        scores.extend(reranker.score(query, texts[offset:offset + batch_size]))
+    ranked = sorted(range(len(docs)), key=lambda i: -scores[i])[:top_n]
+    kept = [
+        type(docs[i])(page_content=docs[i].page_content, metadata={**docs[i].metadata, 'rerank_score': round(scores[i], 4)})
+        for i in ranked
+    ]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    candidate_tokens = sum(estimate_tokens(text) for text in texts)
+    kept_tokens = sum(estimate_tokens(doc.page_content) for doc in kept)
+    rerank_stats.record(ms=elapsed_ms, candidates=len(docs), kept=len(kept),
+                        candidate_tokens=candidate_tokens, kept_tokens=kept_tokens, reranker=type(reranker).__name__)
+    return kept
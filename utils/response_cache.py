@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Response Cache ---
+# Opt-in cache for utils.gemini.generate_response, matched exactly on (normalized match text, model,
+# generation config); callers pass a short match text (the user's question, a unit profile) when the
+# prompt wraps it in a long fixed template.
+# NOTE: There is no semantic (embedding-similarity) tier: the cached inputs are structured profiles
+# and opening questions where texts differing in one number or word ("age: 10 years" vs "age: 15
+# years") embed almost identically but need different answers.
+# Entries expire after `ttl_seconds`, the cache is an LRU bounded by an approximate memory budget,
+# and it is persisted to a local JSON file so warm entries survive restarts.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESPONSE_CACHE_PATH = os.path.join(PROJECT_ROOT, "cache", "response_cache.json")
+DEFAULT_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DEFAULT_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SAVE_INTERVAL_SECONDS = 30
+
+def normalize_prompt(text):
+    """Collapses whitespace and case so trivially different prompts share a cache entry."""
+    return re.sub(r"\s+", " ", text or "").strip().casefold()
+
+def make_config_key(model_name, generation_config):
+    """Returns a stable string for the model + generation parameters that affect the output."""
+    return json.dumps({"model": model_name, **{k: v for k, v in sorted(generation_config.items()) if v is not None}}, sort_keys=True)
+
+class ResponseCache:
+    """Thread-safe exact-match LRU response cache with TTLs and JSON persistence."""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> entry dict, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self.load()
+
+    # --- Lookup / Store ---
+    def _exact_key(self, match_text, config_key):
+        return hashlib.sha256(f"{config_key}\n{normalize_prompt(match_text)}".encode("utf-8")).hexdigest()
+
+    def get(self, match_text, config_key):
+        """Returns the cached response for (match_text, config_key), or None on a miss."""
+        key = self._exact_key(match_text, config_key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._is_live(entry, now):
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry["response"]
+            self._purge_expired(now)
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, match_text, config_key, response):
+        """Stores a response."""
+        key = self._exact_key(match_text, config_key)
+        entry = {"config_key": config_key, "response": response, "created": time.time()}
+        entry["size"] = self._entry_size(entry)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)["size"]
+            self._entries[key] = entry
+            self._bytes += entry["size"]
+            self._evict()
+            self._dirty = True
+        self.maybe_save()
+
+    # --- Housekeeping ---
+    def _is_live(self, entry, now):
+        return now - entry["created"] < self.ttl_seconds
+
+    def _purge_expired(self, now):
+        for key in [k for k, entry in self._entries.items() if not self._is_live(entry, now)]:
+            self._bytes -= self._entries.pop(key)["size"]
+            self.counters["expirations"] += 1
+            self._dirty = True
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry["size"]
+            self.counters["evictions"] += 1
+
+    @staticmethod
+    def _entry_size(entry):
+        # Rough in-memory footprint: text as UTF-8 plus a fixed per-entry overhead
+        return len(entry["response"].encode("utf-8")) + len(entry["config_key"]) + 256
+
+    def stats(self):
+        """Returns hit/miss counters plus current size."""
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {**self.counters, "entries": len(self._entries), "bytes": self._bytes,
+                    "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._dirty = True
+        self.save()
+
+    # --- Persistence ---
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Response cache: could not load {self.path} ({e}); starting empty.")
+            return
+        now = time.time()
+        with self._lock:
+            for key, entry in stored.get("entries", []):
+                if self._is_live(entry, now):
+                    entry.pop("embedding", None) # Written by older versions (semantic tier)
+                    entry["size"] = self._entry_size(entry)
+                    self._entries[key] = entry
+                    self._bytes += entry["size"]
+            self._evict()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {"entries": [[key, entry] for key, entry in self._entries.items()]}
+            self._dirty = False
+            self._last_save = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def maybe_save(self):
+        """Saves at most every SAVE_INTERVAL_SECONDS (and always at process exit)."""
+        if time.time() - self._last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+# --- Process-wide Instance ---
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide ResponseCache, creating it on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+            atexit.register(_response_cache.save)
+        return _response_cache
@@ -0,0 +1,30 @@
+from typing import Callable, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# --- Custom Retrievers ---
+# Thin adapters so retrieval logic written as plain functions in utils/rag.py can be plugged
+# into LangChain chains (RetrievalQA) through the standard retriever interface.
+
+class FunctionRetriever(BaseRetriever):
+    """Adapts a search function `query -> list[Document]` to LangChain's retriever interface."""
+
+    search_fn: Callable[[str], List[Document]]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_fn(query)
+
+class PipelineRetriever(BaseRetriever):
+    """Runs a base retriever, then post-processing steps `fn(query, docs) -> docs` in order.
+
+    Used for steps between retrieval and the prompt (e.g., merging adjacent chunks)."""
+
+    base_retriever: BaseRetriever
+    postprocessors: List[Callable[[str, List[Document]], List[Document]]] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        for postprocess in self.postprocessors:
+            docs = postprocess(query, docs)
+        return docs
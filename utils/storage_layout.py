@@ -0,0 +1,67 @@
+import os
+import re
+
+# --- Vector Store Storage Layout ---
+# "per_context" (default): one Chroma persist directory per context, `vector_store/<rag_id>_chroma`.
+# "consolidated": every context is a collection inside a single Chroma client at
+#   `vector_store/consolidated/chroma`, so one SQLite database and one client serve all contexts.
+#   Each context's index files (manifest, BM25 index, ingest checkpoint) live in
+#   `vector_store/consolidated/contexts/<rag_id>`.
+# Select with the RAG_STORAGE_LAYOUT environment variable; convert existing per-context stores with
+# `python -m utils.migrate_vector_store`.
+#
+# The vector backend is selected with RAG_VECTOR_BACKEND: "chroma" (default) or "numpy"
+# (utils/numpy_store.py). Per-context NumPy stores live in `vector_store/<rag_id>_numpy`; in the
+# consolidated layout they live in the context's `contexts/<rag_id>` directory.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_VECTOR_STORE_DIR = os.path.join(PROJECT_ROOT, "vector_store")
+
+LAYOUT_PER_CONTEXT = "per_context"
+LAYOUT_CONSOLIDATED = "consolidated"
+CONSOLIDATED_DIR = os.path.join(BASE_VECTOR_STORE_DIR, "consolidated")
+CONSOLIDATED_CHROMA_DIR = os.path.join(CONSOLIDATED_DIR, "chroma")
+CONSOLIDATED_CONTEXTS_DIR = os.path.join(CONSOLIDATED_DIR, "contexts")
+BACKEND_CHROMA = "chroma"
+BACKEND_NUMPY = "numpy"
+PER_CONTEXT_COLLECTION_NAME = "langchain" # LangChain's default collection name in per-context stores
+
+def get_storage_layout():
+    """Returns the configured layout ('per_context' or 'consolidated')."""
+    layout = os.getenv("RAG_STORAGE_LAYOUT", LAYOUT_PER_CONTEXT).strip().lower()
+    if layout not in (LAYOUT_PER_CONTEXT, LAYOUT_CONSOLIDATED):
+        raise ValueError(f"Unknown RAG_STORAGE_LAYOUT '{layout}'. Use '{LAYOUT_PER_CONTEXT}' or '{LAYOUT_CONSOLIDATED}'.")
+    return layout
+
+def get_vector_backend():
+    """Returns the configured vector backend ('chroma' or 'numpy')."""
+    backend = os.getenv("RAG_VECTOR_BACKEND", BACKEND_CHROMA).strip().lower()
+    if backend not in (BACKEND_CHROMA, BACKEND_NUMPY):
+        raise ValueError(f"Unknown RAG_VECTOR_BACKEND '{backend}'. Use '{BACKEND_CHROMA}' or '{BACKEND_NUMPY}'.")
+    return backend
+
+def get_per_context_directory(rag_id, backend=BACKEND_CHROMA):
+    return os.path.join(BASE_VECTOR_STORE_DIR, f"{rag_id}_{backend}")
+
+def get_consolidated_context_directory(rag_id):
+    return os.path.join(CONSOLIDATED_CONTEXTS_DIR, rag_id)
+
+def get_collection_name(rag_id):
+    """Returns the Chroma collection name for a context in the consolidated store.
+
+    Chroma names must be 3-63 characters of [a-zA-Z0-9._-], starting and ending alphanumeric."""
+    name = re.sub(r"[^a-zA-Z0-9._-]", "_", f"ctx_{rag_id}")[:63]
+    return name if name[-1].isalnum() else name[:62] + "0"
+
+def list_per_context_stores(backend=BACKEND_CHROMA):
+    """Returns the rag_ids that have a per-context store directory for `backend`."""
+    if not os.path.isdir(BASE_VECTOR_STORE_DIR):
+        return []
+    suffix = f"_{backend}"
+    return sorted(
+        name[:-len(suffix)] for name in os.listdir(BASE_VECTOR_STORE_DIR)
+        if name.endswith(suffix) and os.path.isdir(os.path.join(BASE_VECTOR_STORE_DIR, name))
+    )
+
+def list_collection_names(client):
+    """Collection names of a Chroma client (list_collections() returns names or objects depending on version)."""
+    return [getattr(collection, "name", collection) for collection in client.list_collections()]